@@ -0,0 +1,258 @@
+"""Headless benchmarks for the LabelSP hot paths
+
+Synthetic PNG and GeoTIFF images are generated once, then every scenario
+runs in a fresh interpreter on Qt's offscreen platform, so peak memory is
+measured per scenario and nothing is warmed up by an earlier one:
+
+    load_png, load_geotiff   ImageViewer.load_image of a --image-size square image
+    add_bulk                 N points added as one undoable batch
+    add_clicks               1000 single-point adds on top of N existing points
+    select_drag              a 60-step select-mode drag over N points, repainting each step
+    paint_overview           30 repaints of N points zoomed out to the whole image
+    import_csv, import_xlsx  import_from_csv / import_from_xlsx of N points
+    export_xlsx              export_to_xlsx of N points
+
+    python benchmarks/bench_hotpaths.py --points 1000,100000 --save-baseline base.json
+    python benchmarks/bench_hotpaths.py --points 1000,100000 --baseline base.json
+
+Reports the median time and the peak RSS over --runs runs. With --baseline,
+exits with status 1 when a scenario got slower or bigger than the stored
+numbers by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+POINT_SCENARIOS = ("add_bulk", "add_clicks", "select_drag", "paint_overview", "import_csv", "import_xlsx",
+                   "export_xlsx")
+IMAGE_SCENARIOS = ("load_png", "load_geotiff")
+CLICKS = 1000
+DRAG_STEPS = 60
+FRAMES = 30
+# Memory below this is noise from the allocator, not a regression
+MEMORY_SLACK_MB = 16.0
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec on Linux and would report the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_fixtures(fixture_dir, image_size, point_counts):
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+
+    sys.path.insert(0, ROOT)
+    from labelsp_core.export import write_csv, write_xlsx
+
+    # Smooth gradients plus noise compress like real imagery, not like flat colour
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:image_size, 0:image_size]
+    pixels = np.stack([x * 255 // image_size, y * 255 // image_size, (x + y) * 127 // image_size])
+    pixels = (pixels + rng.integers(0, 32, pixels.shape)).clip(0, 255).astype(np.uint8)
+
+    profile = dict(driver="GTiff", width=image_size, height=image_size, count=3, dtype="uint8",
+                   crs="EPSG:32650", transform=from_origin(500000.0, 4000000.0, 0.5, 0.5),
+                   tiled=True, compress="deflate")
+    with rasterio.open(os.path.join(fixture_dir, "image.tif"), "w", **profile) as ds:
+        ds.write(pixels)
+    png = dict(profile, driver="PNG", crs=None, transform=None)
+    for key in ("tiled", "compress"):
+        png.pop(key)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(os.path.join(fixture_dir, "image.png"), "w", **png) as ds:
+            ds.write(pixels)
+
+    for count in point_counts:
+        xy = rng.uniform(0, image_size, (count, 2))
+        columns = [xy[:, 0], xy[:, 1]]
+        write_csv(os.path.join(fixture_dir, f"points_{count}.csv"), ["X", "Y"], columns)
+        write_xlsx(os.path.join(fixture_dir, f"points_{count}.xlsx"), ["X", "Y"], columns)
+
+
+def child(scenario, count, fixture_dir):
+    sys.path.insert(0, ROOT)
+    import numpy as np
+    from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+    from PyQt5.QtGui import QMouseEvent
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+
+    app = QApplication(sys.argv)
+    import labelsp
+
+    # Keep dialogs from blocking: keep the selection, do not quit early
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.No)
+    window = labelsp.ImageAnnotationTool()
+    window.resize(1400, 1000)
+    window.show()
+    app.processEvents()
+    viewer = window.image_viewer
+
+    image_path = os.path.join(fixture_dir, "image.tif" if scenario == "load_geotiff" else "image.png")
+    if scenario not in IMAGE_SCENARIOS:
+        viewer.load_image(image_path)
+        app.processEvents()
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(0, viewer.image_width or 1, (count, 2))
+    if scenario in ("add_clicks", "select_drag", "paint_overview", "export_xlsx"):
+        viewer.history.add_points(xy)
+        app.processEvents()
+
+    def send(kind, pos, button=Qt.LeftButton):
+        buttons = Qt.NoButton if kind == QEvent.MouseButtonRelease else button
+        QApplication.sendEvent(viewer.viewport(), QMouseEvent(kind, pos, button, buttons, Qt.NoModifier))
+
+    out_path = os.path.join(tempfile.gettempdir(), f"labelsp_bench_{os.getpid()}.xlsx")
+    start = time.perf_counter()
+    if scenario in IMAGE_SCENARIOS:
+        viewer.load_image(image_path)
+        app.processEvents()
+    elif scenario == "add_bulk":
+        viewer.history.add_points(xy)
+        app.processEvents()
+    elif scenario == "add_clicks":
+        clicks = rng.uniform(0, viewer.image_width, (CLICKS, 2))
+        for x, y in clicks.tolist():
+            viewer.add_annotation_point(QPointF(x, y))
+        app.processEvents()
+    elif scenario == "select_drag":
+        viewer.set_select_mode()
+        size = viewer.viewport().size()
+        send(QEvent.MouseButtonPress, QPoint(10, 10))
+        for step in range(1, DRAG_STEPS + 1):
+            send(QEvent.MouseMove, QPoint(10 + (size.width() - 20) * step // DRAG_STEPS,
+                                          10 + (size.height() - 20) * step // DRAG_STEPS))
+            app.processEvents()
+        send(QEvent.MouseButtonRelease, QPoint(size.width() - 10, size.height() - 10))
+        app.processEvents()
+    elif scenario == "paint_overview":
+        viewer.reset_zoom()
+        for _ in range(FRAMES):
+            viewer.viewport().repaint()
+    elif scenario == "import_csv":
+        window.import_from_csv(os.path.join(fixture_dir, f"points_{count}.csv"))
+        app.processEvents()
+    elif scenario == "import_xlsx":
+        window.import_from_xlsx(os.path.join(fixture_dir, f"points_{count}.xlsx"))
+        app.processEvents()
+    elif scenario == "export_xlsx":
+        window.export_to_xlsx(out_path)
+    elapsed = time.perf_counter() - start
+
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    print(json.dumps({"ms": 1000 * elapsed, "peak_rss_mb": peak_rss_mb(), "points": len(viewer.store)}))
+    # Skip the exit prompt and the journal flush, neither is being measured
+    os._exit(0)
+
+
+def run_child(env, scenario, count, fixture_dir):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scenario, str(count), fixture_dir],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    failed = False
+    for key, result in sorted(results.items()):
+        base = baseline.get("results", {}).get(key)
+        if base is None:
+            continue
+        notes = []
+        if result["ms"] > base["ms"] * (1 + tolerance):
+            notes.append(f"time {base['ms']:.1f} -> {result['ms']:.1f} ms")
+        if result["peak_rss_mb"] is not None and base.get("peak_rss_mb") is not None and \
+                result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance) + MEMORY_SLACK_MB:
+            notes.append(f"memory {base['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+        if notes:
+            print(f"REGRESSION {key}: {', '.join(notes)}")
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", default="1000,100000,1000000",
+                        help="comma separated point counts for the point scenarios")
+    parser.add_argument("--image-size", type=int, default=4000, help="side of the synthetic images in pixels")
+    parser.add_argument("--scenarios", default=",".join(IMAGE_SCENARIOS + POINT_SCENARIOS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE,
+                        help="compare against a stored baseline (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="store the results as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown/growth")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        scenario, count, fixture_dir = args.child
+        child(scenario, int(count), fixture_dir)
+        return 0
+
+    point_counts = [int(value) for value in args.points.split(",") if value]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(IMAGE_SCENARIOS + POINT_SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixture_dir = os.path.join(work_dir, "fixtures")
+        os.makedirs(fixture_dir)
+        print(f"generating {args.image_size}px images and point files...", file=sys.stderr)
+        make_fixtures(fixture_dir, args.image_size, point_counts)
+
+        env = dict(os.environ)
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # Empty settings, so the "reopen last file" prompt does not block the run
+        env["XDG_CONFIG_HOME"] = os.path.join(work_dir, "config")
+
+        for scenario in scenarios:
+            counts = [0] if scenario in IMAGE_SCENARIOS else point_counts
+            for count in counts:
+                key = scenario if scenario in IMAGE_SCENARIOS else f"{scenario}/{count}"
+                runs = [run_child(env, scenario, count, fixture_dir) for _ in range(args.runs)]
+                peaks = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+                results[key] = {"ms": statistics.median(r["ms"] for r in runs),
+                                "peak_rss_mb": max(peaks) if peaks else None}
+                peak = f"{results[key]['peak_rss_mb']:8.0f} MB" if peaks else "       n/a"
+                print(f"{key:>22}: median {results[key]['ms']:10.1f} ms  peak {peak}")
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed = compare(results, json.load(f), args.tolerance)
+        print("FAIL" if failed else "OK: no regressions against " + os.path.basename(args.baseline))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "image_size": args.image_size, "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Cold-start benchmark for the LabelSP main window
+
+Every run starts a fresh interpreter that imports labelsp, builds the main
+window and waits for the event loop to go idle, i.e. the moment the window
+can react to input. The wall time from process launch to that point is
+reported together with the import and window construction phases.
+
+    python benchmarks/bench_startup.py --runs 5 --budget-ms 1000
+
+Exits with status 1 when the median exceeds the budget or when a heavy
+module that should be loaded lazily was imported during startup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("rasterio", "pyproj", "openpyxl", "pyarrow")
+
+
+def child():
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    import labelsp
+    imported = time.perf_counter()
+
+    app = QApplication(sys.argv)
+    window = labelsp.ImageAnnotationTool()
+    window.show()
+    built = time.perf_counter()
+
+    def ready():
+        print(json.dumps({
+            "import_ms": 1000 * (imported - start),
+            "window_ms": 1000 * (built - imported),
+            "ready_ms": 1000 * (time.perf_counter() - start),
+            "lazy_loaded": [name for name in LAZY_MODULES if name in sys.modules],
+        }))
+        app.quit()
+
+    QTimer.singleShot(0, ready)
+    app.exec_()
+
+
+def run_once(env):
+    launched = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    # Includes interpreter start-up, which the in-process timers cannot see
+    result["wall_ms"] = 1000 * (time.perf_counter() - launched)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000.0,
+                        help="maximum median wall time from launch to an idle event loop")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return 0
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        env = dict(os.environ)
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # Empty settings, so the "reopen last file" prompt does not block the run
+        env["XDG_CONFIG_HOME"] = config_dir
+        results = [run_once(env) for _ in range(args.runs)]
+
+    for key in ("wall_ms", "import_ms", "window_ms", "ready_ms"):
+        values = [r[key] for r in results]
+        print(f"{key:>10}: median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+
+    failed = False
+    lazy_loaded = sorted({name for r in results for name in r["lazy_loaded"]})
+    if lazy_loaded:
+        print(f"FAIL: imported during startup: {', '.join(lazy_loaded)}")
+        failed = True
+    median = statistics.median(r["wall_ms"] for r in results)
+    if median > args.budget_ms:
+        print(f"FAIL: median {median:.1f} ms over budget {args.budget_ms:.1f} ms")
+        failed = True
+    if not failed:
+        print(f"OK: median {median:.1f} ms within budget {args.budget_ms:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
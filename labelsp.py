@@ -1,47 +1,38 @@
 import os
 import sys
-import csv
+import re
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QFileDialog, QLabel, QMessageBox, QGroupBox,
-                             QFrame, QProgressDialog, QSplashScreen)
-from PyQt5.QtGui import (QPixmap, QImage, QPainter, QColor, QPen, QCursor, QFont)
-from PyQt5.QtCore import (Qt, QPoint, QPointF, QRectF, QTimer, QSettings)
-from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsItem
+                             QFrame, QProgressDialog, QSplashScreen, QShortcut, QDialog,
+                             QDialogButtonBox, QFormLayout, QSpinBox, QDoubleSpinBox, QCheckBox,
+                             QComboBox)
+from PyQt5.QtGui import (QPixmap, QImage, QImageReader, QPainter, QColor, QPen, QCursor, QFont,
+                         QKeySequence, QPainterPath, QTransform)
+from PyQt5.QtCore import (Qt, QPoint, QPointF, QRectF, QTimer, QSettings, QObject, QRunnable,
+                          QThread, QThreadPool, pyqtSignal, QDataStream, QByteArray, QEvent)
+from PyQt5.QtWidgets import (QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsItem,
+                             QGraphicsRectItem, QStyleOptionGraphicsItem)
 
 # Shaozetong produced
-try:
-    import openpyxl
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    import rasterio
-    from rasterio.transform import Affine
-    from rasterio.crs import CRS
-    import pyproj
-except ImportError:
-    print("Installing required modules...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "openpyxl", "rasterio", "pyproj"])
-    import openpyxl
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    import rasterio
-    from rasterio.transform import Affine
-    from rasterio.crs import CRS
-    import pyproj
-
-if hasattr(Qt, 'AA_EnableHighDpiScaling'):
-    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
-if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
-    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
-
-app = QApplication(sys.argv)
-
-# Show splash screen
-splash_pix = QPixmap('1.jpg') if os.path.exists('1.jpg') else QPixmap(400, 300)
-splash_pix = splash_pix.scaled(800, 600, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
-splash.show()
-QTimer.singleShot(3000, splash.close)  # Display for 3 seconds
+import numpy as np
+
+from labelsp_core.density import DensityGrid
+from labelsp_core.detect import DEFAULT_RADIUS, DEFAULT_SENSITIVITY, propose_points
+from labelsp_core.export import annotation_table, has_arrow, write_table, write_xlsx
+from labelsp_core.geo import parse_crs, pixels_to_lonlat, utm_crs, wgs84_transformer
+from labelsp_core.history import History
+from labelsp_core.imageinfo import read_image_info, read_image_infos
+from labelsp_core.importers import find_geo_columns, read_boxes, read_geo_boxes, read_headers
+from labelsp_core.journal import Journal, journal_path, read_journal
+from labelsp_core.mosaic import MOSAIC_SUFFIX, plan_mosaic
+from labelsp_core.profiling import profiler
+from labelsp_core.project import PROJECT_SUFFIX, Project
+from labelsp_core.pyramid import MIN_PIXELS, PyramidCache, PyramidSource, base_level, build_pyramid
+from labelsp_core.store import AnnotationStore
+from labelsp_core.tiles import TileSource, TILED_PIXEL_THRESHOLD, DEFAULT_PERCENTILES, read_level, to_display
+from labelsp_core.vector import VECTOR_EXTENSIONS, write_vector
+from labelsp_core.yolo import DEFAULT_BOX_SIZE, points_to_yolo, write_yolo
 
 class CrosshairItem(QGraphicsItem):
     def __init__(self, parent=None):
@@ -65,31 +56,1031 @@ class CrosshairItem(QGraphicsItem):
         self.setPos(pos)
         self.cross_pos = pos
 
-class AnnotationPoint(QGraphicsItem):
-    def __init__(self, pos, parent=None):
+def crosses_path(xy, radius):
+    """Build one QPainterPath with a '+' marker at every row of xy"""
+    count = len(xy)
+    # Serialized QPainterPath: element count, (type, x, y) per element, fill rule
+    elements = np.empty(4 * count, dtype=[('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+    elements['type'] = np.tile(np.array([0, 1, 0, 1], dtype='>i4'), count)  # moveTo, lineTo
+    x, y = xy[:, 0], xy[:, 1]
+    elements['x'] = np.stack([x - radius, x + radius, x, x], axis=1).ravel()
+    elements['y'] = np.stack([y, y, y - radius, y + radius], axis=1).ravel()
+    data = (np.array([4 * count], dtype='>i4').tobytes() + elements.tobytes() +
+            np.array([0], dtype='>i4').tobytes())
+    path = QPainterPath()
+    QDataStream(QByteArray(data)) >> path
+    return path
+
+
+def boxes_path(xy, wh):
+    """Build one QPainterPath with the outline of a w x h box around every row of xy"""
+    count = len(xy)
+    elements = np.empty(5 * count, dtype=[('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+    elements['type'] = np.tile(np.array([0, 1, 1, 1, 1], dtype='>i4'), count)
+    x0, y0 = xy[:, 0] - wh[:, 0] / 2, xy[:, 1] - wh[:, 1] / 2
+    x1, y1 = x0 + wh[:, 0], y0 + wh[:, 1]
+    elements['x'] = np.stack([x0, x1, x1, x0, x0], axis=1).ravel()
+    elements['y'] = np.stack([y0, y0, y1, y1, y0], axis=1).ravel()
+    data = (np.array([5 * count], dtype='>i4').tobytes() + elements.tobytes() +
+            np.array([0], dtype='>i4').tobytes())
+    path = QPainterPath()
+    QDataStream(QByteArray(data)) >> path
+    return path
+
+def heat_lut():
+    """256 RGBA colours from transparent, through translucent yellow, to opaque red"""
+    t = np.linspace(0.0, 1.0, 255)
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    lut[1:, 0] = 255
+    lut[1:, 1] = np.round(255 * (1 - t))
+    lut[1:, 3] = np.round(90 + 150 * t)
+    return lut
+
+
+HEAT_LUT = heat_lut()
+
+
+def heat_image(counts):
+    """QImage of a count grid, log-scaled so sparse cells stay visible"""
+    values = np.log1p(counts.astype(np.float32))
+    peak = float(values.max())
+    if peak > 0:
+        values *= 254 / peak
+    # Any non-empty cell gets at least the faintest colour
+    level = np.where(counts > 0, np.ceil(values).clip(1, 255), 0).astype(np.uint8)
+    return array_to_qimage(HEAT_LUT[level])
+
+class AnnotationLayerItem(QGraphicsItem):
+    """Draws every point of an AnnotationStore in a single paint call
+
+    Points with a box size also get their box outline drawn. Zoomed out
+    below DENSITY_SCALE (screen pixels per image pixel) with more than
+    DENSITY_MIN_POINTS points, the markers would only overlap into a blob,
+    so a heatmap of per-cell counts is drawn instead. The counts follow
+    every store change incrementally, and the heatmap costs the same
+    however many points there are.
+    """
+
+    RADIUS = 5
+    DENSITY_SCALE = 0.5
+    DENSITY_MIN_POINTS = 2000
+    # Smallest heatmap cell on screen, in pixels
+    DENSITY_CELL_PX = 4
+
+    def __init__(self, store, parent=None):
         super().__init__(parent)
-        self.setPos(pos)
+        self.store = store
         self.setZValue(100)
         self.pen = QPen(QColor(255, 0, 0), 1)
         self.pen.setCosmetic(True)
-        self.is_selected = False
-        
+        self.selected_pen = QPen(QColor(0, 0, 255), 1)
+        self.selected_pen.setCosmetic(True)
+        self.bounds = QRectF()
+        self.density = DensityGrid()
+        # Heatmap images by density level, dropped whenever the counts change
+        self.heat_images = {}
+        self.showing_density = False
+        # Have option.exposedRect cover only the dirty area, so partial
+        # updates only rebuild the markers inside it
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        store.listeners.append(self._on_store_changed)
+
     def boundingRect(self):
-        return QRectF(-5, -5, 10, 10)
-        
+        return self.bounds
+
+    def margin(self):
+        """How far a marker or box reaches past its point"""
+        return max(self.RADIUS, self.store.max_half)
+
+    def set_bounds(self, rect):
+        """Fit the layer to the image rect, which also lays out the density grid"""
+        self.prepareGeometryChange()
+        margin = self.margin()
+        self.bounds = rect.adjusted(-margin, -margin, margin, margin)
+        self.density.reset(rect.width(), rect.height())
+        self.density.add(self.store.xy)
+        self.heat_images.clear()
+
+    def _update_density(self, event, records):
+        """Apply a store change to the counts, True if the heatmap needs a full repaint"""
+        dense = self.density.total > self.DENSITY_MIN_POINTS
+        if event == "add":
+            self.density.add(records["xy"])
+        elif event == "remove":
+            self.density.remove(records["xy"])
+        elif event == "clear":
+            self.density.clear()
+        else:
+            return False
+        self.heat_images.clear()
+        # The heatmap is scaled by its densest cell, so any count change can
+        # recolour all of it; crossing the point threshold switches modes
+        return self.showing_density or dense != (self.density.total > self.DENSITY_MIN_POINTS)
+
+    def _on_store_changed(self, event, records):
+        if records is not None and not len(records["xy"]):
+            return
+        if self._update_density(event, records) or records is None:
+            self.update()
+            return
+        # Only repaint around the points that changed
+        xy = records["xy"]
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        extent = QRectF(QPointF(low[0], low[1]), QPointF(high[0], high[1]))
+        margin = self.RADIUS
+        if np.isfinite(records["wh"]).any():
+            margin = max(margin, float(np.nanmax(records["wh"])) / 2)
+        extent = extent.adjusted(-margin, -margin, margin, margin)
+        # Imported points may lie outside the image
+        if event == "add" and not self.bounds.contains(extent):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(extent)
+        self.update(extent)
+
     def paint(self, painter, option, widget):
-        if self.is_selected:
-            painter.setPen(QPen(QColor(0, 0, 255), 1))
+        with profiler.span("paint points"):
+            self._paint(painter, option)
+
+    def _paint(self, painter, option):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        self.showing_density = scale < self.DENSITY_SCALE and self.density.total > self.DENSITY_MIN_POINTS
+        if self.showing_density:
+            self._paint_density(painter, scale)
+            return
+        margin = self.margin()
+        exposed = option.exposedRect.adjusted(-margin, -margin, margin, margin)
+        rows = self.store.query_rect(exposed.left(), exposed.top(), exposed.right(), exposed.bottom())
+        if not len(rows):
+            return
+        xy = self.store.xy[rows]
+        wh = self.store.wh[rows]
+        selected = self.store.selected[rows]
+        boxed = np.isfinite(wh).all(axis=1)
+        # Axis-aligned 1px strokes gain nothing from antialiasing but cost ~2x
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        for pen, rows in ((self.pen, ~selected), (self.selected_pen, selected)):
+            if not rows.any():
+                continue
+            painter.setPen(pen)
+            painter.drawPath(crosses_path(xy[rows], self.RADIUS))
+            if boxed[rows].any():
+                painter.drawPath(boxes_path(xy[rows & boxed], wh[rows & boxed]))
+
+    def _paint_density(self, painter, scale):
+        level = self.density.level_for(scale, self.DENSITY_CELL_PX)
+        image = self.heat_images.get(level)
+        if image is None:
+            with profiler.span("density image"):
+                image = self.heat_images[level] = heat_image(self.density.level(level))
+        size = self.density.cell_size(level)
+        painter.drawImage(QRectF(0, 0, image.width() * size, image.height() * size), image)
+        # A small selection still shows point by point on top
+        selection = self.store.selection
+        if 0 < len(selection) <= self.DENSITY_MIN_POINTS:
+            painter.setRenderHint(QPainter.Antialiasing, False)
+            painter.setPen(self.selected_pen)
+            painter.drawPath(crosses_path(self.store.xy[selection], self.RADIUS / scale))
+
+def array_to_qimage(data):
+    """Wrap an (h, w[, bands]) uint8 array in a QImage that owns its pixels"""
+    data = np.ascontiguousarray(data)
+    height, width = data.shape[:2]
+    channels = 1 if data.ndim == 2 else data.shape[2]
+    if channels == 1:
+        fmt = QImage.Format_Grayscale8
+    elif channels == 3:
+        fmt = QImage.Format_RGB888
+    else:
+        fmt = QImage.Format_RGBA8888
+    return QImage(data.data, width, height, data.strides[0], fmt).copy()
+
+def qimage_to_array(image):
+    """Copy a QImage into an (h, w, 3) RGB or (h, w, 4) RGBA uint8 array"""
+    if image.hasAlphaChannel():
+        image, channels = image.convertToFormat(QImage.Format_RGBA8888), 4
+    else:
+        image, channels = image.convertToFormat(QImage.Format_RGB888), 3
+    ptr = image.constBits()
+    ptr.setsize(image.byteCount())
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width() * channels].reshape(image.height(), image.width(), channels).copy()
+
+class TileSignals(QObject):
+    tile_ready = pyqtSignal(object, object, int)
+
+class TileReadTask(QRunnable):
+    def __init__(self, source, key, signals, is_wanted, generation=0):
+        super().__init__()
+        self.source = source
+        self.key = key
+        self.signals = signals
+        self.is_wanted = is_wanted
+        self.generation = generation
+
+    def run(self):
+        image = None
+        # Skip tiles that scrolled out of view while queued
+        if self.is_wanted(self.key):
+            try:
+                with profiler.span("read tile"):
+                    image = array_to_qimage(self.source.read_tile(*self.key))
+            except Exception as e:
+                print(f"Warning: Could not read tile {self.key}: {str(e)}")
+        self.signals.tile_ready.emit(self.key, image, self.generation)
+
+class TiledRasterItem(QGraphicsItem):
+    """Draws a large raster from tiles read on demand at the current zoom level"""
+
+    CACHE_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, source, overview=None, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.setZValue(0)
+        self.tiles = OrderedDict()
+        self.cache_bytes = 0
+        self.pending = set()
+        self.wanted = set()
+        self.signals = TileSignals()
+        self.signals.tile_ready.connect(self._on_tile_ready)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max(2, min(4, QThreadPool.globalInstance().maxThreadCount())))
+        # Bumped whenever the band selection or stretch changes, so tiles
+        # still in flight with the old look are dropped
+        self.generation = 0
+        # Without this option.exposedRect is the whole raster, and every tile
+        # of the current level would be requested instead of the visible ones
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+        # The coarsest level is a single tile that backs every other level
+        self.overview_key = (source.max_level, 0, 0)
+        if overview is not None:
+            self.tiles[self.overview_key] = overview
+            self.cache_bytes += overview.byteCount()
         else:
-            painter.setPen(self.pen)
-        painter.drawLine(QPointF(-5, 0), QPointF(5, 0))
-        painter.drawLine(QPointF(0, -5), QPointF(0, 5))
-        
-    def setSelected(self, selected):
-        self.is_selected = selected
+            self._request(self.overview_key)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.source.width, self.source.height)
+
+    def paint(self, painter, option, widget):
+        with profiler.span("paint tiles"):
+            self._paint(painter, option)
+
+    def _paint(self, painter, option):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self.source.level_for_scale(scale)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+
+        keys = self.source.tiles_in_rect(level, exposed.left(), exposed.top(),
+                                         exposed.right(), exposed.bottom())
+        self.wanted = set(keys)
+        self.wanted.add(self.overview_key)
+
+        for key in keys:
+            image = self.tiles.get(key)
+            if image is not None:
+                self.tiles.move_to_end(key)
+                x, y, w, h = self.source.tile_rect(*key)
+                painter.drawImage(QRectF(x, y, w, h), image, QRectF(image.rect()))
+            else:
+                self._request(key)
+                self._draw_fallback(painter, key)
+
+    def _draw_fallback(self, painter, key):
+        # Fill the gap with the closest coarser tile that is already cached
+        level, tx, ty = key
+        x, y, w, h = self.source.tile_rect(*key)
+        for coarse in range(level + 1, self.source.max_level + 1):
+            span = self.source.tile_span(coarse)
+            coarse_key = (coarse, int(x // span), int(y // span))
+            image = self.tiles.get(coarse_key)
+            if image is None:
+                continue
+            cx, cy, _, _ = self.source.tile_rect(*coarse_key)
+            factor = 2 ** coarse
+            source_rect = QRectF((x - cx) / factor, (y - cy) / factor, w / factor, h / factor)
+            painter.drawImage(QRectF(x, y, w, h), image, source_rect)
+            return
+
+    def _request(self, key):
+        if key in self.pending or key in self.tiles:
+            return
+        self.pending.add(key)
+        self.pool.start(TileReadTask(self.source, key, self.signals, self._is_wanted, self.generation))
+
+    def _is_wanted(self, key):
+        return key in self.wanted or key == self.overview_key
+
+    def _on_tile_ready(self, key, image, generation):
+        if generation != self.generation:
+            return
+        self.pending.discard(key)
+        if image is None:
+            return
+        self.tiles[key] = image
+        self.cache_bytes += image.byteCount()
+        # Evict least recently drawn tiles, but never the overview tile
+        while self.cache_bytes > self.CACHE_BYTES and len(self.tiles) > 1:
+            old_key, old_image = self.tiles.popitem(last=False)
+            if old_key == self.overview_key:
+                self.tiles[old_key] = old_image
+                continue
+            self.cache_bytes -= old_image.byteCount()
+        x, y, w, h = self.source.tile_rect(*key)
+        self.update(QRectF(x, y, w, h))
+
+    def set_display(self, bands, percentiles=None):
+        """Switch bands/stretch and re-read tiles, returns the new overview tile"""
+        self.source.set_display(bands, percentiles)
+        self.generation += 1
+        self.pool.clear()
+        self.pending.clear()
+        self.tiles.clear()
+        # The overview is a single decimated read, fetching it right away
+        # avoids a blank frame until the first tile arrives
+        overview = array_to_qimage(self.source.read_tile(*self.overview_key))
+        self.tiles[self.overview_key] = overview
+        self.cache_bytes = overview.byteCount()
         self.update()
+        return overview
+
+    def close(self):
+        self.wanted = set()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.source.close()
+
+class RasterOpenSignals(QObject):
+    opened = pyqtSignal(int, object, object)
+    failed = pyqtSignal(int, str)
+
+class RasterOpenTask(QRunnable):
+    """Opens one raster of a mosaic and reads its overview tile"""
+
+    def __init__(self, index, raster, crs, signals):
+        super().__init__()
+        self.index = index
+        self.raster = raster
+        self.crs = crs
+        self.signals = signals
+
+    def run(self):
+        try:
+            with profiler.span("open raster"):
+                source = TileSource(self.raster.path, crs=self.crs if self.raster.warp else None)
+                overview = array_to_qimage(source.read_tile(source.max_level, 0, 0))
+        except Exception as e:
+            self.signals.failed.emit(self.index, str(e))
+            return
+        self.signals.opened.emit(self.index, source, overview)
+
+class MosaicItem(QGraphicsItem):
+    """Draws the rasters of a Mosaic, opening only those that come into view
+
+    Each raster becomes a TiledRasterItem child, scaled and moved onto the
+    mosaic grid, once it intersects an exposed area; until then only its
+    outline is drawn. When more than MAX_OPEN are open, rasters that left
+    the view are closed again, least recently drawn first.
+    """
+
+    MAX_OPEN = 12
+
+    def __init__(self, mosaic, parent=None):
+        super().__init__(parent)
+        self.mosaic = mosaic
+        self.items = OrderedDict()
+        self.opening = set()
+        self.closed = False
+        self.pen = QPen(QColor(128, 128, 128), 1)
+        self.pen.setCosmetic(True)
+        self.signals = RasterOpenSignals()
+        self.signals.opened.connect(self._on_opened)
+        self.signals.failed.connect(self._on_failed)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    @property
+    def cache_bytes(self):
+        return sum(item.cache_bytes for item in self.items.values())
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.mosaic.width, self.mosaic.height)
+
+    def paint(self, painter, option, widget):
+        exposed = option.exposedRect
+        painter.setPen(self.pen)
+        for index in self.mosaic.rasters_in_rect(exposed.left(), exposed.top(), exposed.right(), exposed.bottom()):
+            index = int(index)
+            if index in self.items:
+                self.items.move_to_end(index)
+                continue
+            painter.drawRect(QRectF(*self.mosaic.rasters[index].rect))
+            if index not in self.opening:
+                self.opening.add(index)
+                self.pool.start(RasterOpenTask(index, self.mosaic.rasters[index], self.mosaic.crs, self.signals))
+
+    def _on_opened(self, index, source, overview):
+        self.opening.discard(index)
+        if self.closed or index in self.items:
+            source.close()
+            return
+        x, y, w, h = self.mosaic.rasters[index].rect
+        item = TiledRasterItem(source, overview, parent=self)
+        item.setTransform(QTransform.fromTranslate(x, y).scale(w / source.width, h / source.height))
+        if self.mosaic.rasters[index].warp:
+            # Reprojected rasters have empty corners, keep them under their neighbours
+            item.setZValue(-1)
+        self.items[index] = item
+        self._close_hidden()
+
+    def _on_failed(self, index, message):
+        # Stays in opening, so a broken file is not retried on every paint
+        print(f"Warning: Could not open {self.mosaic.rasters[index].path}: {message}")
+
+    def _visible_indices(self):
+        visible = set()
+        scene = self.scene()
+        for view in scene.views() if scene is not None else ():
+            rect = view.mapToScene(view.viewport().rect()).boundingRect()
+            visible.update(int(i) for i in self.mosaic.rasters_in_rect(rect.left(), rect.top(),
+                                                                       rect.right(), rect.bottom()))
+        return visible
+
+    def _close_hidden(self):
+        if len(self.items) <= self.MAX_OPEN:
+            return
+        visible = self._visible_indices()
+        for index in list(self.items):
+            if len(self.items) <= self.MAX_OPEN:
+                break
+            if index in visible:
+                continue
+            item = self.items.pop(index)
+            item.setParentItem(None)
+            if item.scene() is not None:
+                item.scene().removeItem(item)
+            item.close()
+
+    def close(self):
+        self.closed = True
+        self.pool.clear()
+        self.pool.waitForDone()
+        for item in self.items.values():
+            item.close()
+        self.items.clear()
+
+class TaskCancelled(Exception):
+    pass
+
+class BackgroundTask(QThread):
+    """Runs fn(*args, progress=...) off the GUI thread
+
+    fn reports progress through the callback, which raises TaskCancelled once
+    cancel() has been called, so work stops at the next checkpoint.
+    """
+    progress_changed = pyqtSignal(int, str)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, fn, *args, parent=None):
+        super().__init__(parent)
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+    def run(self):
+        try:
+            with profiler.span(getattr(self.fn, "__name__", "task")):
+                result = self.fn(*self.args, progress=self.report)
+        except TaskCancelled:
+            return
+        except Exception as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+            return
+        if not self.cancelled:
+            self.succeeded.emit(result)
+
+    def report(self, percent, message=""):
+        if self.cancelled:
+            raise TaskCancelled()
+        self.progress_changed.emit(int(percent), message)
+
+    def cancel(self):
+        self.cancelled = True
+
+class ProposalTask(QThread):
+    """Runs the tiled point detector and streams each tile's points back"""
+    points_found = pyqtSignal(object)
+    progress_changed = pyqtSignal(int, int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, radius, polarity, sensitivity, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.radius = radius
+        self.polarity = polarity
+        self.sensitivity = sensitivity
+        self.cancelled = False
+
+    def run(self):
+        try:
+            with profiler.span("propose points"):
+                for done, total, xy in propose_points(self.path, self.radius, self.polarity, self.sensitivity,
+                                                      cancelled=lambda: self.cancelled):
+                    if self.cancelled:
+                        return
+                    if len(xy):
+                        self.points_found.emit(xy)
+                    self.progress_changed.emit(done, total)
+        except Exception as e:
+            if not self.cancelled:
+                self.failed.emit(str(e))
+
+    def cancel(self):
+        self.cancelled = True
+
+class LoadedImage:
+    """Everything read_image prepares for ImageViewer.show_loaded_image"""
+
+    def __init__(self, path):
+        self.path = path
+        self.image = None
+        self.tile_source = None
+        self.overview = None
+        self.width = 0
+        self.height = 0
+        self.transform = None
+        self.crs = None
+        self.transformer = None
+        # Key and cached pyramid of the file, see labelsp_core.pyramid
+        self.cache_key = None
+        self.pyramid = None
+
+def _no_progress(percent, message=""):
+    pass
+
+def read_image(image_path, pyramids=None, progress=None):
+    """Decode an image and set up its georeferencing, safe to call off the GUI thread
+
+    With a PyramidCache, an image cached on an earlier open is shown from
+    its pyramid instead of being decoded again.
+    """
+    report = progress or _no_progress
+    if not os.path.exists(image_path):
+        raise FileNotFoundError("图像文件未找到!")
+
+    loaded = LoadedImage(image_path)
+    try:
+        report(0, "正在读取图像信息...")
+        if pyramids is not None:
+            with profiler.span("pyramid lookup"):
+                loaded.cache_key, loaded.pyramid = pyramids.lookup(image_path)
+        dataset = None
+        # For TIFF files, try to read geospatial info
+        if image_path.lower().endswith(('.tif', '.tiff')):
+            # rasterio/pyproj take a while to import, so only pay for them once a TIFF is opened
+            import rasterio
+
+            try:
+                dataset = rasterio.open(image_path)
+                loaded.transform = dataset.transform
+                loaded.crs = dataset.crs
+            except Exception as e:
+                print(f"Warning: Could not read geospatial info from TIFF: {str(e)}")
+
+        try:
+            report(10, "正在建立坐标转换...")
+            # Create coordinate transformer if CRS is not WGS84
+            if loaded.crs and not loaded.crs.is_geographic:
+                try:
+                    with profiler.span("georeference"):
+                        loaded.transformer = wgs84_transformer(loaded.crs)
+                except Exception as e:
+                    print(f"Warning: Could not create coordinate transformer: {str(e)}")
+
+            if dataset is not None and _needs_tiles(dataset):
+                # Too large to decode at once, or in need of band selection and
+                # a contrast stretch: read visible tiles on demand instead
+                report(20, "正在读取概览...")
+                with profiler.span("decode overview"):
+                    loaded.tile_source = TileSource(image_path, pyramid=loaded.pyramid)
+                    loaded.overview = array_to_qimage(
+                        loaded.tile_source.read_tile(loaded.tile_source.max_level, 0, 0))
+                loaded.width = loaded.tile_source.width
+                loaded.height = loaded.tile_source.height
+            elif loaded.pyramid is not None and loaded.pyramid.display is None and loaded.pyramid.has_level(0):
+                # Decoded before: tiles come straight from the cached pyramid
+                report(20, "正在读取缓存...")
+                with profiler.span("decode overview"):
+                    loaded.tile_source = PyramidSource(image_path, loaded.pyramid)
+                    loaded.overview = array_to_qimage(
+                        loaded.tile_source.read_tile(loaded.tile_source.max_level, 0, 0))
+                loaded.width = loaded.tile_source.width
+                loaded.height = loaded.tile_source.height
+            elif dataset is not None and _can_read_strips(dataset):
+                with profiler.span("decode"):
+                    loaded.image = _read_strips(dataset, report)
+            else:
+                report(20, "正在解码图像...")
+                with profiler.span("decode"):
+                    loaded.image = QImageReader(image_path).read()
+        finally:
+            if dataset is not None:
+                dataset.close()
+
+        if loaded.image is not None:
+            if loaded.image.isNull():
+                raise ValueError("加载图像失败!")
+            report(90, "正在准备显示...")
+            # Convert here so QPixmap.fromImage on the GUI thread is a plain copy
+            with profiler.span("convert"):
+                if loaded.image.hasAlphaChannel():
+                    loaded.image = loaded.image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+                else:
+                    loaded.image = loaded.image.convertToFormat(QImage.Format_RGB32)
+            loaded.width = loaded.image.width()
+            loaded.height = loaded.image.height()
+        report(100, "加载完成")
+    except Exception:
+        if loaded.tile_source is not None:
+            loaded.tile_source.close()
+        raise
+    return loaded
+
+def _needs_tiles(dataset):
+    from rasterio.enums import ColorInterp
+
+    if dataset.width * dataset.height > TILED_PIXEL_THRESHOLD:
+        return True
+    # 16-bit, float and multispectral rasters have no direct 8-bit
+    # representation; palette images are left to Qt's TIFF reader
+    if dataset.dtypes[0] == 'uint8' and dataset.count in (1, 3, 4):
+        return False
+    return ColorInterp.palette not in dataset.colorinterp
+
+def _can_read_strips(dataset):
+    from rasterio.enums import ColorInterp
+
+    # Palette and other exotic layouts are left to Qt's TIFF reader
+    if dataset.dtypes[0] != 'uint8' or dataset.count not in (1, 3, 4):
+        return False
+    return ColorInterp.palette not in dataset.colorinterp
+
+def _read_strips(dataset, report, strip_rows=512):
+    # Decode straight into the QImage buffer, a strip at a time, so progress and
+    # cancellation work on large files
+    from rasterio.windows import Window
+
+    bands = TileSource._default_bands(dataset)
+    formats = {1: QImage.Format_Grayscale8, 3: QImage.Format_RGB888, 4: QImage.Format_RGBA8888}
+    image = QImage(dataset.width, dataset.height, formats[len(bands)])
+    ptr = image.bits()
+    ptr.setsize(image.byteCount())
+    rows = np.frombuffer(ptr, dtype=np.uint8).reshape(dataset.height, image.bytesPerLine())
+    pixels = rows[:, :dataset.width * len(bands)].reshape(dataset.height, dataset.width, len(bands))
+
+    for row in range(0, dataset.height, strip_rows):
+        report(20 + 70 * row / dataset.height, "正在解码图像...")
+        height = min(strip_rows, dataset.height - row)
+        data = dataset.read(bands, window=Window(0, row, dataset.width, height))
+        pixels[row:row + height] = to_display(data)
+    return image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+class ImageCache:
+    """LRU cache of LoadedImage objects bounded by decoded pixel memory"""
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    @staticmethod
+    def _size(loaded):
+        image = loaded.image if loaded.image is not None else loaded.overview
+        return image.byteCount() if image is not None else 0
+
+    def get(self, path):
+        loaded = self.entries.get(path)
+        if loaded is not None:
+            self.entries.move_to_end(path)
+        return loaded
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def put(self, loaded, keep=None):
+        old = self.entries.pop(loaded.path, None)
+        if old is not None:
+            self.total_bytes -= self._size(old)
+        self.entries[loaded.path] = loaded
+        self.total_bytes += self._size(loaded)
+        # Never evict the newest entry or the image currently on screen
+        for path in list(self.entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if path in (loaded.path, keep):
+                continue
+            evicted = self.entries.pop(path)
+            self.total_bytes -= self._size(evicted)
+            if evicted.tile_source is not None:
+                evicted.tile_source.close()
+
+    def set_overview(self, path, overview):
+        """Swap the overview of a tiled entry after its bands or stretch changed"""
+        loaded = self.entries.get(path)
+        if loaded is None:
+            return
+        self.total_bytes -= self._size(loaded)
+        loaded.overview = overview
+        self.total_bytes += self._size(loaded)
+
+class DisplayDialog(QDialog):
+    """Band composite and percentile stretch of a tiled raster"""
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("波段与拉伸")
+        layout = QFormLayout(self)
+
+        bands = list(source.bands[:3])
+        if len(bands) < 3:
+            # Grey: only the red slot is used
+            bands += [0] * (3 - len(bands))
+        self.band_boxes = []
+        for name, band in zip(("红 (灰度)", "绿", "蓝"), bands):
+            box = QSpinBox()
+            box.setRange(0 if self.band_boxes else 1, source.count)
+            box.setSpecialValueText("不使用")
+            box.setValue(band)
+            layout.addRow(f"{name}波段:", box)
+            self.band_boxes.append(box)
+
+        self.stretch_box = QCheckBox("百分比拉伸")
+        self.stretch_box.setChecked(source.percentiles is not None)
+        layout.addRow(self.stretch_box)
+        low, high = source.percentiles or DEFAULT_PERCENTILES
+        self.low_box = QDoubleSpinBox()
+        self.high_box = QDoubleSpinBox()
+        for box, value in ((self.low_box, low), (self.high_box, high)):
+            box.setRange(0.0, 100.0)
+            box.setSingleStep(0.5)
+            box.setSuffix(" %")
+            box.setValue(value)
+        layout.addRow("下限:", self.low_box)
+        layout.addRow("上限:", self.high_box)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def bands(self):
+        red, green, blue = (box.value() for box in self.band_boxes)
+        if not green or not blue:
+            return [red]
+        return [red, green, blue]
+
+    def percentiles(self):
+        if not self.stretch_box.isChecked():
+            return None
+        low, high = sorted((self.low_box.value(), self.high_box.value()))
+        return low, high
+
+class ProposeDialog(QDialog):
+    """Parameters of the automatic point proposals"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("自动提议")
+        layout = QFormLayout(self)
+        self.radius_box = QSpinBox()
+        self.radius_box.setRange(1, 100)
+        self.radius_box.setSuffix(" 像素")
+        self.radius_box.setValue(DEFAULT_RADIUS)
+        layout.addRow("目标半径:", self.radius_box)
+        self.polarity_box = QComboBox()
+        self.polarity_box.addItem("亮目标", "bright")
+        self.polarity_box.addItem("暗目标", "dark")
+        layout.addRow("目标类型:", self.polarity_box)
+        self.sensitivity_box = QDoubleSpinBox()
+        self.sensitivity_box.setRange(1.0, 20.0)
+        self.sensitivity_box.setSingleStep(0.5)
+        self.sensitivity_box.setValue(DEFAULT_SENSITIVITY)
+        self.sensitivity_box.setToolTip("数值越大, 提议越少越可靠")
+        layout.addRow("对比度阈值:", self.sensitivity_box)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def parameters(self):
+        return self.radius_box.value(), self.polarity_box.currentData(), self.sensitivity_box.value()
+
+class CrsDialog(QDialog):
+    """Target coordinate system of a vector export"""
+
+    def __init__(self, choices, current=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("目标坐标系")
+        layout = QFormLayout(self)
+        self.crs_box = QComboBox()
+        self.crs_box.setEditable(True)
+        for text, value in choices:
+            self.crs_box.addItem(text, value)
+        if current:
+            self.crs_box.setEditText(current)
+        self.crs_box.setToolTip("可选择或输入 EPSG:xxxx、proj 字符串或 WKT")
+        layout.addRow("坐标系:", self.crs_box)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def crs_text(self):
+        # Listed entries carry their CRS as data, typed ones are used as is
+        index = self.crs_box.findText(self.crs_box.currentText())
+        if index >= 0 and self.crs_box.itemData(index):
+            return self.crs_box.itemData(index)
+        return self.crs_box.currentText().strip()
+
+    def accept(self):
+        try:
+            parse_crs(self.crs_text())
+        except ValueError as e:
+            QMessageBox.warning(self, "错误", str(e))
+            return
+        super().accept()
+
+class GeoImportDialog(CrsDialog):
+    """Columns and coordinate system of a point file imported onto a GeoTIFF"""
+
+    def __init__(self, headers, detected, choices, current=None, parent=None):
+        super().__init__(choices, current, parent)
+        self.setWindowTitle("导入坐标")
+        layout = self.layout()
+        self.mode_box = QComboBox()
+        self.mode_box.addItem("像素坐标 (前两列)", False)
+        self.mode_box.addItem("地理/投影坐标", True)
+        self.x_box = QComboBox()
+        self.y_box = QComboBox()
+        for box in (self.x_box, self.y_box):
+            box.addItems([header or f"第{i + 1}列" for i, header in enumerate(headers)])
+        layout.insertRow(0, "坐标类型:", self.mode_box)
+        layout.insertRow(1, "X / 经度列:", self.x_box)
+        layout.insertRow(2, "Y / 纬度列:", self.y_box)
+        if detected is not None:
+            self.x_box.setCurrentIndex(detected[0])
+            self.y_box.setCurrentIndex(detected[1])
+            self.mode_box.setCurrentIndex(1)
+        elif len(headers) > 1:
+            self.y_box.setCurrentIndex(1)
+        self.mode_box.currentIndexChanged.connect(self._update_enabled)
+        self._update_enabled()
+
+    def _update_enabled(self):
+        geo = self.is_geo()
+        for box in (self.x_box, self.y_box, self.crs_box):
+            box.setEnabled(geo)
+
+    def is_geo(self):
+        return bool(self.mode_box.currentData())
+
+    def columns(self):
+        return self.x_box.currentIndex(), self.y_box.currentIndex()
+
+    def accept(self):
+        if self.is_geo():
+            super().accept()
+        else:
+            QDialog.accept(self)
+
+class PrefetchSignals(QObject):
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class PrefetchTask(QRunnable):
+    def __init__(self, path, signals, pyramids=None):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+        self.pyramids = pyramids
+
+    def run(self):
+        try:
+            with profiler.span("prefetch"):
+                loaded = read_image(self.path, self.pyramids)
+            self.signals.loaded.emit(loaded)
+        except Exception as e:
+            print(f"Warning: Could not prefetch {self.path}: {str(e)}")
+            self.signals.failed.emit(self.path)
+
+class PyramidSignals(QObject):
+    built = pyqtSignal(str, str)
+
+class PyramidTask(QRunnable):
+    """Builds the on-disk pyramid of a freshly decoded image
+
+    Plain images are cached from full resolution. Tiled rasters are cached
+    from the first level small enough to hold in memory, read with the
+    display they were opened with, so finer levels still come from the file.
+    """
+
+    def __init__(self, loaded, pyramids, signals):
+        super().__init__()
+        self.path = loaded.path
+        self.key = loaded.cache_key
+        self.image = loaded.image
+        self.width = loaded.width
+        self.height = loaded.height
+        self.pyramids = pyramids
+        self.signals = signals
+        self.cancelled = False
+        source = loaded.tile_source
+        # Captured on the GUI thread, the display may change while this runs
+        self.display = source.display if isinstance(source, TileSource) else None
+        self.display_key = source.display_key() if self.display is not None else None
+        self.stretch = source.stretch_values() if self.display is not None else None
+
+    def run(self):
+        try:
+            with profiler.span("build pyramid"):
+                built = self._build()
+        except Exception as e:
+            print(f"Warning: Could not cache {self.path}: {str(e)}")
+            return
+        if built:
+            self.signals.built.emit(self.path, self.key)
+
+    def _build(self):
+        if self.display is None:
+            base, first_level = qimage_to_array(self.image), 0
+        else:
+            source = TileSource(self.path)
+            try:
+                source.display = self.display
+                first_level = base_level(self.width, self.height, source.tile_size)
+                base = read_level(source, first_level, lambda: self.cancelled)
+            finally:
+                source.close()
+            if base is None:
+                return False
+        return build_pyramid(self.pyramids, self.key, base, first_level, self.width, self.height,
+                             display=self.display_key, stretch=self.stretch,
+                             cancelled=lambda: self.cancelled)
+
+    def cancel(self):
+        self.cancelled = True
+
+class ProfilerOverlay(QLabel):
+    """Live readout of the profiler in the corner of an ImageViewer
+
+    A child of the view rather than of its viewport, so scrolling the
+    viewport does not move it, and drawn by Qt on top of the scene.
+    """
+
+    def __init__(self, viewer):
+        super().__init__(viewer)
+        self.viewer = viewer
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet("QLabel { background-color: rgba(0, 0, 0, 160); color: #7CFC00; "
+                           "font-family: monospace; font-size: 11px; padding: 4px; }")
+        self.timer = QTimer(self)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_active(self, active):
+        self.setVisible(active)
+        if active:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        lines = [f"FPS {profiler.rate('paint'):5.1f}"]
+        for name, label in (("paint", "绘制"), ("mouse move", "鼠标移动"), ("mouse press", "鼠标按下")):
+            stats = profiler.stats(name)
+            if stats is not None:
+                lines.append(f"{label} p50 {stats['p50_ms']:.2f} / p95 {stats['p95_ms']:.2f} ms")
+        lines.append(f"标注点 {len(self.viewer.store)}")
+        lines.append(f"像素内存 {self.viewer.pixel_bytes() / 2 ** 20:.0f} MB")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+        viewport = self.viewer.viewport().geometry()
+        self.move(viewport.left() + 6, viewport.top() + 6)
+        self.raise_()
 
 class ImageViewer(QGraphicsView):
+    PROFILED_EVENTS = {QEvent.Paint: "paint", QEvent.MouseMove: "mouse move",
+                       QEvent.MouseButtonPress: "mouse press", QEvent.MouseButtonRelease: "mouse release",
+                       QEvent.Wheel: "wheel"}
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent = parent
@@ -98,6 +1089,12 @@ class ImageViewer(QGraphicsView):
 
         self.pixmap_item = QGraphicsPixmapItem()
         self.scene.addItem(self.pixmap_item)
+        # Huge rasters are drawn by a TiledRasterItem instead of pixmap_item
+        self.raster_item = None
+        # And mosaics of several GeoTIFFs by a MosaicItem
+        self.mosaic_item = None
+        self.image_width = 0
+        self.image_height = 0
 
         self.setRenderHint(QPainter.Antialiasing)
         self.setRenderHint(QPainter.SmoothPixmapTransform)
@@ -110,22 +1107,67 @@ class ImageViewer(QGraphicsView):
         self.crosshair.hide()
 
         self.scale_factor = 1.0
-        self.annotations = []
-        self.temp_annotations = []
+        self.store = AnnotationStore()
+        self.history = History(self.store)
+        self.annotation_layer = AnnotationLayerItem(self.store)
+        self.scene.addItem(self.annotation_layer)
         
         self.select_start = None
-        self.select_rect = None
+        # One rubber band item for the whole session, resized while dragging
+        self.select_rect = QGraphicsRectItem()
+        self.select_rect.setPen(QPen(Qt.blue, 1, Qt.DashLine))
+        self.select_rect.setZValue(1000)
+        self.select_rect.hide()
+        self.scene.addItem(self.select_rect)
         self.selecting = False
 
+        # Dual-point box mode: the first click's corner, and the box following the mouse
+        self.box_start = None
+        self.box_preview = QGraphicsRectItem()
+        box_pen = QPen(QColor(255, 0, 0), 1, Qt.DashLine)
+        box_pen.setCosmetic(True)
+        self.box_preview.setPen(box_pen)
+        self.box_preview.setZValue(1000)
+        self.box_preview.hide()
+        self.scene.addItem(self.box_preview)
+
         self.setMouseTracking(True)
         self.setAcceptDrops(True)
         
         # TIFF related attributes
         # Shaozetong produced
-        self.tif_file = None
         self.transform = None
         self.crs = None
         self.transformer = None
+        # (a, b, c, d, e, f) of transform, unpacked once per image for the readout
+        self.geo_affine = None
+
+        # The coordinate readout is refreshed at most once per frame, however
+        # fast the mouse reports events
+        self.pending_coord = None
+        self.coord_timer = QTimer(self)
+        self.coord_timer.setSingleShot(True)
+        self.coord_timer.setInterval(16)
+        self.coord_timer.timeout.connect(self.flush_coord_readout)
+
+        self.profiler_overlay = ProfilerOverlay(self)
+
+    def viewportEvent(self, event):
+        # Paint and mouse events all pass through here on their way to the handlers
+        name = self.PROFILED_EVENTS.get(event.type()) if profiler.enabled else None
+        if name is None:
+            return super().viewportEvent(event)
+        with profiler.span(name):
+            return super().viewportEvent(event)
+
+    def pixel_bytes(self):
+        """Memory held by the decoded pixels on screen"""
+        if self.raster_item is not None:
+            return self.raster_item.cache_bytes
+        if self.mosaic_item is not None:
+            return self.mosaic_item.cache_bytes
+        pixmap = self.pixmap_item.pixmap()
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -134,68 +1176,99 @@ class ImageViewer(QGraphicsView):
     def dropEvent(self, event):
         for url in event.mimeData().urls():
             file_path = url.toLocalFile()
-            if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')):
+            if file_path.lower().endswith(IMAGE_EXTENSIONS):
                 self.parent.load_image_with_progress(file_path)
                 break
 
     def load_image(self, image_path):
-        if not os.path.exists(image_path):
+        try:
+            loaded = read_image(image_path)
+        except FileNotFoundError:
             QMessageBox.warning(self, "警告", "图像文件未找到!")
             return False
-        
-        try:
-            progress = QProgressDialog("正在加载图片...", None, 0, 0, self)
-            progress.setWindowTitle("请稍候")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setCancelButton(None)
-            progress.show()
-            
-            QApplication.processEvents()
-            
-            # Reset TIFF attributes
-            self.tif_file = None
-            self.transform = None
-            self.crs = None
-            self.transformer = None
-            
-            # For TIFF files, try to read geospatial info
-            if image_path.lower().endswith(('.tif', '.tiff')):
-                try:
-                    self.tif_file = rasterio.open(image_path)
-                    self.transform = self.tif_file.transform
-                    self.crs = self.tif_file.crs
-                    
-                    # Create coordinate transformer if CRS is not WGS84
-                    if self.crs and not self.crs.is_geographic:
-                        try:
-                            wgs84 = CRS.from_epsg(4326)  # WGS84
-                            self.transformer = pyproj.Transformer.from_crs(self.crs, wgs84, always_xy=True)
-                        except Exception as e:
-                            print(f"Warning: Could not create coordinate transformer: {str(e)}")
-                except Exception as e:
-                    print(f"Warning: Could not read geospatial info from TIFF: {str(e)}")
-            
-            image = QImage(image_path)
-            if image.isNull():
-                progress.close()
-                QMessageBox.warning(self, "警告", "加载图像失败!")
-                return False
-            
-            self.pixmap_item.setPixmap(QPixmap.fromImage(image))
-            self.scene.setSceneRect(self.pixmap_item.boundingRect())
-            self.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
-            self.scale_factor = 1.0
-            self.annotations = []
-            self.temp_annotations = []
-            self.crosshair.show()
-            
-            progress.close()
-            return True
         except Exception as e:
-            if 'progress' in locals():
-                progress.close()
             QMessageBox.warning(self, "错误", f"加载图像失败: {str(e)}")
             return False
+        self.show_loaded_image(loaded)
+        return True
+
+    def show_loaded_image(self, loaded):
+        with profiler.span("scene insert"):
+            self._show_loaded_image(loaded)
+
+    def _show_loaded_image(self, loaded):
+        # Reset TIFF attributes
+        self.close_image()
+        self.transform = loaded.transform
+        self.crs = loaded.crs
+        self.transformer = loaded.transformer
+        if loaded.transform is not None:
+            self.geo_affine = tuple(loaded.transform)[:6]
+
+        if loaded.tile_source is not None:
+            self.raster_item = TiledRasterItem(loaded.tile_source, loaded.overview)
+            self.scene.addItem(self.raster_item)
+        else:
+            self.pixmap_item.setPixmap(QPixmap.fromImage(loaded.image))
+        self.image_width = loaded.width
+        self.image_height = loaded.height
+        self._reset_view()
+
+    def show_mosaic(self, mosaic):
+        """Show several GeoTIFFs on one grid, points in mosaic pixels (see labelsp_core.mosaic)"""
+        with profiler.span("scene insert"):
+            self.close_image()
+            self.transform = mosaic.transform
+            self.crs = mosaic.crs
+            self.geo_affine = tuple(mosaic.transform)[:6]
+            try:
+                self.transformer = wgs84_transformer(mosaic.crs)
+            except Exception as e:
+                print(f"Warning: Could not create coordinate transformer: {str(e)}")
+            self.mosaic_item = MosaicItem(mosaic)
+            self.scene.addItem(self.mosaic_item)
+            self.image_width = mosaic.width
+            self.image_height = mosaic.height
+            self._reset_view()
+
+    def _reset_view(self):
+        self.scene.setSceneRect(self.image_rect())
+        self.resetTransform()
+        self.fitInView(self.image_rect(), Qt.KeepAspectRatio)
+        self.scale_factor = 1.0
+        self.store.clear()
+        self.history.reset()
+        self.annotation_layer.set_bounds(self.image_rect())
+        self.crosshair.show()
+
+    def close_image(self):
+        if self.raster_item is not None:
+            self.scene.removeItem(self.raster_item)
+            self.raster_item.close()
+            self.raster_item = None
+        if self.mosaic_item is not None:
+            self.scene.removeItem(self.mosaic_item)
+            self.mosaic_item.close()
+            self.mosaic_item = None
+        self.pixmap_item.setPixmap(QPixmap())
+        self.image_width = 0
+        self.image_height = 0
+        self.transform = None
+        self.crs = None
+        self.transformer = None
+        self.geo_affine = None
+        self.pending_coord = None
+        self.coord_timer.stop()
+        self.cancel_box()
+
+    def has_image(self):
+        return self.image_width > 0 and self.image_height > 0
+
+    def image_rect(self):
+        return QRectF(0, 0, self.image_width, self.image_height)
+
+    def image_contains(self, scene_pos):
+        return self.has_image() and self.image_rect().contains(scene_pos)
 
 # Shaozetong produced
     def wheelEvent(self, event):
@@ -217,47 +1290,55 @@ class ImageViewer(QGraphicsView):
         scene_pos = self.mapToScene(event.pos())
         self.crosshair.updatePosition(scene_pos)
         
-        if self.pixmap_item.pixmap() and not self.pixmap_item.pixmap().isNull():
-            img_width = self.pixmap_item.pixmap().width()
-            img_height = self.pixmap_item.pixmap().height()
-            
-            x = scene_pos.x()
-            y = scene_pos.y()
-            normalized_x = x / img_width
-            normalized_y = y / img_height
-            
-            coord_text = f"X: {x:.1f}, Y: {y:.1f} (Norm: {normalized_x:.3f}, {normalized_y:.3f})"
-            
-            # Add lon/lat if available
-            if self.transform is not None:
-                try:
-                    lon, lat = self.pixel_to_coords(x, y)
-                    if self.transformer is not None:
-                        # Convert to WGS84 if not already
-                        lon, lat = self.transformer.transform(lon, lat)
-                    coord_text += f" | Lon: {lon:.6f}, Lat: {lat:.6f}"
-                except Exception as e:
-                    print(f"Error converting coordinates: {str(e)}")
-            
-            self.parent.update_coord_label(coord_text)
+        if self.has_image():
+            self.pending_coord = (scene_pos.x(), scene_pos.y())
+            if not self.coord_timer.isActive():
+                self.coord_timer.start()
         
         if self.selecting and self.mode == "select":
             end_pos = self.mapToScene(event.pos())
-            if self.select_rect:
-                self.scene.removeItem(self.select_rect)
-            
             rect = QRectF(self.select_start, end_pos).normalized()
-            self.select_rect = self.scene.addRect(rect, QPen(Qt.blue, 1, Qt.DashLine))
-            self.select_rect.setZValue(1000)
+            self.select_rect.setRect(rect)
+            self.select_rect.show()
             
-            for point in self.annotations + self.temp_annotations:
-                if rect.contains(point.pos()):
-                    point.setSelected(True)
-                else:
-                    point.setSelected(False)
+            self.update_selection(rect)
+        elif self.box_start is not None:
+            self.box_preview.setRect(QRectF(self.box_start, self.clamp_to_image(scene_pos)).normalized())
         
         super().mouseMoveEvent(event)
 
+    def flush_coord_readout(self):
+        if self.pending_coord is None or not self.has_image():
+            return
+        x, y = self.pending_coord
+        self.pending_coord = None
+        normalized_x = x / self.image_width
+        normalized_y = y / self.image_height
+        
+        coord_text = f"X: {x:.1f}, Y: {y:.1f} (Norm: {normalized_x:.3f}, {normalized_y:.3f})"
+        
+        # Add lon/lat if available
+        lonlat = self.lonlat_at(x, y)
+        if lonlat is not None:
+            coord_text += f" | Lon: {lonlat[0]:.6f}, Lat: {lonlat[1]:.6f}"
+        
+        self.parent.update_coord_label(coord_text)
+
+    def lonlat_at(self, x, y):
+        """Lon/lat of a single pixel position, None without georeferencing"""
+        if self.geo_affine is None:
+            return None
+        a, b, c, d, e, f = self.geo_affine
+        lon, lat = a * x + b * y + c, d * x + e * y + f
+        if self.transformer is not None:
+            try:
+                # Convert to WGS84 if not already
+                lon, lat = self.transformer.transform(lon, lat)
+            except Exception as e:
+                print(f"Error converting coordinates: {str(e)}")
+                return None
+        return lon, lat
+
     def pixel_to_coords(self, x, y):
         """Convert pixel coordinates to geographic coordinates"""
         if self.transform is None:
@@ -267,34 +1348,41 @@ class ImageViewer(QGraphicsView):
         lon, lat = self.transform * (x, y)
         return lon, lat
 
+    def pixels_to_lonlat(self, x, y):
+        """Convert arrays of pixel coordinates to lon/lat in one call"""
+        if self.transform is None:
+            raise ValueError("No geospatial transform available")
+        return pixels_to_lonlat(self.transform, self.transformer, x, y)
+
     def mousePressEvent(self, event):
         if self.mode == "click":
             if event.button() == Qt.RightButton or (event.button() == Qt.LeftButton and event.modifiers() == Qt.KeyboardModifier.NoModifier):
                 scene_pos = self.mapToScene(event.pos())
-                if self.pixmap_item.contains(scene_pos):
-                    point = AnnotationPoint(scene_pos)
-                    self.scene.addItem(point)
-                    self.temp_annotations.append(point)
+                if self.image_contains(scene_pos):
+                    self.add_annotation_point(scene_pos)
                     
                     # Get coordinates for status message
                     x, y = scene_pos.x(), scene_pos.y()
                     status_msg = f"添加标注点位置: {round(x, 1)}, {round(y, 1)}"
                     
-                    if self.transform is not None:
-                        try:
-                            lon, lat = self.pixel_to_coords(x, y)
-                            if self.transformer is not None:
-                                lon, lat = self.transformer.transform(lon, lat)
-                            status_msg += f" (Lon: {lon:.6f}, Lat: {lat:.6f})"
-                        except Exception as e:
-                            print(f"Error converting coordinates: {str(e)}")
+                    lonlat = self.lonlat_at(x, y)
+                    if lonlat is not None:
+                        status_msg += f" (Lon: {lonlat[0]:.6f}, Lat: {lonlat[1]:.6f})"
                     
                     self.parent.update_status_bar(status_msg)
         elif self.mode == "select" and event.button() == Qt.LeftButton:
             self.select_start = self.mapToScene(event.pos())
             self.selecting = True
-            for point in self.annotations + self.temp_annotations:
-                point.setSelected(False)
+            self.clear_selection()
+        elif self.mode == "box" and event.button() in (Qt.LeftButton, Qt.RightButton):
+            scene_pos = self.mapToScene(event.pos())
+            if self.box_start is not None:
+                self.finish_box(self.clamp_to_image(scene_pos))
+            elif self.image_contains(scene_pos):
+                self.box_start = scene_pos
+                self.box_preview.setRect(QRectF(scene_pos, scene_pos))
+                self.box_preview.show()
+                self.parent.update_status_bar("点击框的对角 (Esc 取消)")
         
         super().mousePressEvent(event)
 
@@ -302,36 +1390,25 @@ class ImageViewer(QGraphicsView):
     def mouseReleaseEvent(self, event):
         if self.selecting and self.mode == "select":
             self.selecting = False
-            if self.select_rect:
+            if self.select_rect.isVisible():
                 end_pos = self.mapToScene(event.pos())
                 select_rect = QRectF(self.select_start, end_pos).normalized()
                 
-                selected_points = []
-                for point in self.annotations + self.temp_annotations:
-                    if select_rect.contains(point.pos()):
-                        selected_points.append(point)
+                self.update_selection(select_rect)
+                selected_ids = self.store.selected_ids()
                 
-                if selected_points:
+                if len(selected_ids):
                     reply = QMessageBox.question(
                         self, "删除标注",
-                        f"删除选中的{len(selected_points)}个标注?",
+                        f"删除选中的{len(selected_ids)}个标注?",
                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
                     
                     if reply == QMessageBox.Yes:
-                        for point in selected_points:
-                            if point in self.annotations:
-                                self.annotations.remove(point)
-                            elif point in self.temp_annotations:
-                                self.temp_annotations.remove(point)
-                            self.scene.removeItem(point)
-                        self.parent.update_status_bar(f"已删除{len(selected_points)}个标注")
-                
-                if self.select_rect:
-                    self.scene.removeItem(self.select_rect)
-                    self.select_rect = None
+                        self.history.remove(selected_ids)
+                        self.parent.update_status_bar(f"已删除{len(selected_ids)}个标注")
                 
-                for point in self.annotations + self.temp_annotations:
-                    point.setSelected(False)
+                self.select_rect.hide()
+                self.clear_selection()
         
         super().mouseReleaseEvent(event)
 
@@ -339,53 +1416,86 @@ class ImageViewer(QGraphicsView):
         if self.mode == "click":
             if event.key() == Qt.Key_Space:
                 scene_pos = self.mapToScene(self.viewport().mapFromGlobal(QCursor.pos()))
-                if self.pixmap_item.contains(scene_pos):
-                    point = AnnotationPoint(scene_pos)
-                    self.scene.addItem(point)
-                    self.temp_annotations.append(point)
+                if self.image_contains(scene_pos):
+                    self.add_annotation_point(scene_pos)
                     
                     # Get coordinates for status message
                     x, y = scene_pos.x(), scene_pos.y()
                     status_msg = f"添加标注点位置: {round(x, 1)}, {round(y, 1)}"
                     
-                    if self.transform is not None:
-                        try:
-                            lon, lat = self.pixel_to_coords(x, y)
-                            if self.transformer is not None:
-                                lon, lat = self.transformer.transform(lon, lat)
-                            status_msg += f" (Lon: {lon:.6f}, Lat: {lat:.6f})"
-                        except Exception as e:
-                            print(f"Error converting coordinates: {str(e)}")
+                    lonlat = self.lonlat_at(x, y)
+                    if lonlat is not None:
+                        status_msg += f" (Lon: {lonlat[0]:.6f}, Lat: {lonlat[1]:.6f})"
                     
                     self.parent.update_status_bar(status_msg)
         elif event.key() == Qt.Key_Escape and self.mode == "select":
-            if self.select_rect:
-                self.scene.removeItem(self.select_rect)
-                self.select_rect = None
-            for point in self.annotations + self.temp_annotations:
-                point.setSelected(False)
+            self.select_rect.hide()
+            self.clear_selection()
             self.selecting = False
+        elif event.key() == Qt.Key_Escape and self.mode == "box":
+            self.cancel_box()
         
         super().keyPressEvent(event)
 
+    def add_annotation_point(self, pos, confirmed=False):
+        return self.history.add_point(pos.x(), pos.y(), confirmed)
+
+    def clamp_to_image(self, pos):
+        return QPointF(min(max(pos.x(), 0.0), float(self.image_width)),
+                       min(max(pos.y(), 0.0), float(self.image_height)))
+
+    def finish_box(self, pos):
+        """Pair the second click with the first into a box annotation"""
+        rect = QRectF(self.box_start, pos).normalized()
+        self.cancel_box()
+        if rect.width() < 1 or rect.height() < 1:
+            self.parent.update_status_bar("框太小, 已忽略")
+            return
+        center = rect.center()
+        self.history.add_points(np.array([[center.x(), center.y()]]),
+                                wh=np.array([[rect.width(), rect.height()]]))
+        self.parent.update_status_bar(f"添加标注框: 中心 {round(center.x(), 1)}, {round(center.y(), 1)} "
+                                      f"大小 {round(rect.width(), 1)} x {round(rect.height(), 1)}")
+
+    def cancel_box(self):
+        self.box_start = None
+        self.box_preview.hide()
+
+    def update_selection(self, rect):
+        # The store only flips points whose selected state actually changes
+        self.store.select_rect(rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def clear_selection(self):
+        self.store.clear_selection()
+
     def set_click_mode(self):
+        self.cancel_box()
         self.mode = "click"
         self.setDragMode(QGraphicsView.NoDrag)
         self.setCursor(Qt.CrossCursor)
         self.parent.update_status_bar("已切换到点击模式")
 
     def set_drag_mode(self):
+        self.cancel_box()
         self.mode = "drag"
         self.setDragMode(QGraphicsView.ScrollHandDrag)
         self.setCursor(Qt.OpenHandCursor)
         self.parent.update_status_bar("已切换到拖动模式")
         
     def set_select_mode(self):
+        self.cancel_box()
         self.mode = "select"
         self.setDragMode(QGraphicsView.NoDrag)
         self.setCursor(Qt.CrossCursor)
         self.parent.update_status_bar("已切换到选择模式")
 
+    def set_box_mode(self):
+        self.cancel_box()
+        self.mode = "box"
+        self.setDragMode(QGraphicsView.NoDrag)
+        self.setCursor(Qt.CrossCursor)
+        self.parent.update_status_bar("已切换到双点框模式: 依次点击框的两个对角")
+
     def zoom_in(self):
         self.scale(1.2, 1.2)
         self.scale_factor *= 1.2
@@ -396,59 +1506,104 @@ class ImageViewer(QGraphicsView):
 
     def reset_zoom(self):
         self.resetTransform()
-        self.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
+        self.fitInView(self.image_rect(), Qt.KeepAspectRatio)
         self.scale_factor = 1.0
+
+    def set_raster_display(self, bands, percentiles=None):
+        """Change bands/stretch of a tiled raster, returns its new overview"""
+        if self.raster_item is None:
+            return None
+        return self.raster_item.set_display(bands, percentiles)
 # Shaozetong produced
+    CHANGE_NAMES = {"add": "添加", "delete": "删除", "confirm": "确认", "clear": "清除", "import": "导入",
+                    "propose": "自动提议"}
+
     def undo_annotation(self):
-        if self.temp_annotations:
-            point = self.temp_annotations.pop()
-            self.scene.removeItem(point)
-            pos = point.pos()
-            self.parent.update_status_bar(f"移除标注点位置: {round(pos.x(), 1)}, {round(pos.y(), 1)}")
-        elif self.annotations:
-            point = self.annotations.pop()
-            self.scene.removeItem(point)
-            pos = point.pos()
-            self.parent.update_status_bar(f"移除标注点位置: {round(pos.x(), 1)}, {round(pos.y(), 1)}")
+        change = self.history.undo()
+        if change is not None:
+            self.parent.update_status_bar(f"已撤销{self.CHANGE_NAMES[change.label]}: {len(change)}个标注点")
         else:
             self.parent.update_status_bar("没有可撤销的标注")
 
+    def redo_annotation(self):
+        change = self.history.redo()
+        if change is not None:
+            self.parent.update_status_bar(f"已重做{self.CHANGE_NAMES[change.label]}: {len(change)}个标注点")
+        else:
+            self.parent.update_status_bar("没有可重做的操作")
+
     def confirm_annotations(self):
-        self.annotations.extend(self.temp_annotations)
-        self.temp_annotations = []
+        self.history.confirm_all()
         self.parent.update_status_bar("标注已确认")
 
     def clear_annotations(self):
-        for point in self.annotations + self.temp_annotations:
-            self.scene.removeItem(point)
-        self.annotations = []
-        self.temp_annotations = []
+        self.history.clear()
         self.parent.update_status_bar("所有标注已清除")
 
     def get_annotations(self):
-        return self.annotations + self.temp_annotations
+        """(n, 2) array of pixel positions, confirmed points first"""
+        return self.store.ordered_xy()
+
+    def get_boxes(self):
+        """(xy, wh) in the order of get_annotations, wh NaN for plain points"""
+        rows = self.store.ordered_rows()
+        return self.store.xy[rows], self.store.wh[rows]
+
+    def replace_annotations(self, xy, confirmed=True, wh=None):
+        # One bulk insert and one repaint, however many points there are,
+        # recorded as a single undo step
+        self.history.replace(xy, confirmed, wh=wh)
+
+    def snapshot_annotations(self):
+        return self.store.snapshot()
+
+    def restore_annotations(self, snapshot):
+        self.store.add_many(snapshot["xy"], snapshot["confirmed"], wh=snapshot.get("wh"))
 
     def get_normalized_annotations(self):
-        if not self.pixmap_item.pixmap().isNull():
-            img_width = self.pixmap_item.pixmap().width()
-            img_height = self.pixmap_item.pixmap().height()
-            
-            normalized = []
-            for point in self.get_annotations():
-                pos = point.pos()
-                x = pos.x() / img_width
-                y = pos.y() / img_height
-                normalized.append((x, y))
-            
-            return normalized
-        return []
+        if self.has_image():
+            return self.get_annotations() / np.array([self.image_width, self.image_height])
+        return np.empty((0, 2))
 
 class ImageAnnotationTool(QMainWindow):
     def __init__(self):
         super().__init__()
         
         self.settings = QSettings("ImageAnnotationTool", "ImageAnnotationTool")
+        self.active_task = None
+
+        # Dataset (folder) navigation
+        self.current_path = None
+        self.dataset_files = []
+        self.dataset_index = -1
+        self.image_cache = ImageCache()
+        self.prefetch_count = 3
+        self.prefetching = set()
+        self.prefetch_pool = QThreadPool()
+        self.prefetch_pool.setMaxThreadCount(2)
+        self.prefetch_signals = PrefetchSignals()
+        self.prefetch_signals.loaded.connect(self._on_prefetched)
+        self.prefetch_signals.failed.connect(self.prefetching.discard)
+        # Pyramids of large images on disk, built in the background on first open
+        self.pyramids = PyramidCache(max_bytes=self.settings.value("pyramid_cache_mb", 2048, type=int) * 1024 ** 2)
+        self.pyramid_pool = QThreadPool()
+        self.pyramid_pool.setMaxThreadCount(1)
+        self.pyramid_tasks = {}
+        self.pyramid_signals = PyramidSignals()
+        self.pyramid_signals.built.connect(self._on_pyramid_built)
+        # Annotations of images that are not on screen, keyed by path
+        self.stashed_annotations = {}
+        # Autosave of the current image's annotations, see open_journal
+        self.journal = None
+        self.retired_journals = {}
+        # Optional SQLite project holding the dataset's images and points
+        self.project = None
+        # Running detector, and the ids of the proposals it has delivered so far
+        self.proposal_task = None
+        self.proposal_ids = []
         self.init_ui()
+        # LABELSP_PROFILE=1 starts with profiling on, F12 toggles it
+        self.image_viewer.profiler_overlay.set_active(profiler.enabled)
         self.setWindowTitle("终极标注V3.0 LTS (支持地理坐标)")
         self.resize(1200, 800)
         
@@ -490,6 +1645,10 @@ class ImageAnnotationTool(QMainWindow):
         """)
         
 
+        # Ask once the window is on screen instead of blocking startup
+        QTimer.singleShot(0, self.offer_last_image)
+
+    def offer_last_image(self):
         last_file = self.settings.value("last_image", "")
         if last_file and os.path.exists(last_file):
             reply = QMessageBox.question(
@@ -552,6 +1711,46 @@ class ImageAnnotationTool(QMainWindow):
         self.open_button.clicked.connect(self.open_image)
         self.left_toolbar_layout.addWidget(self.open_button)
 
+        self.open_folder_button = QPushButton("打开文件夹")
+        self.open_folder_button.setStyleSheet(button_style)
+        self.open_folder_button.clicked.connect(self.open_folder)
+        self.left_toolbar_layout.addWidget(self.open_folder_button)
+
+        self.open_mosaic_button = QPushButton("打开拼接图")
+        self.open_mosaic_button.setStyleSheet(button_style)
+        self.open_mosaic_button.setToolTip("把文件夹中相邻的 GeoTIFF 按地理坐标拼在一起标注")
+        self.open_mosaic_button.clicked.connect(self.open_mosaic)
+        self.left_toolbar_layout.addWidget(self.open_mosaic_button)
+
+        self.new_project_button = QPushButton("新建项目")
+        self.new_project_button.setStyleSheet(button_style)
+        self.new_project_button.clicked.connect(self.new_project)
+        self.left_toolbar_layout.addWidget(self.new_project_button)
+
+        self.open_project_button = QPushButton("打开项目")
+        self.open_project_button.setStyleSheet(button_style)
+        self.open_project_button.clicked.connect(self.open_project)
+        self.left_toolbar_layout.addWidget(self.open_project_button)
+
+        self.prev_button = QPushButton("上一张 (A)")
+        self.prev_button.setStyleSheet(button_style)
+        self.prev_button.clicked.connect(self.prev_image)
+        self.left_toolbar_layout.addWidget(self.prev_button)
+
+        self.next_button = QPushButton("下一张 (D)")
+        self.next_button.setStyleSheet(button_style)
+        self.next_button.clicked.connect(self.next_image)
+        self.left_toolbar_layout.addWidget(self.next_button)
+
+        # Shortcuts rather than keyPressEvent, QGraphicsView eats PageUp/PageDown
+        for key in (Qt.Key_D, Qt.Key_PageDown):
+            QShortcut(QKeySequence(key), self, self.next_image)
+        for key in (Qt.Key_A, Qt.Key_PageUp):
+            QShortcut(QKeySequence(key), self, self.prev_image)
+        QShortcut(QKeySequence.Save, self, self.save_project)
+        QShortcut(QKeySequence(Qt.Key_F12), self, self.toggle_profiling)
+        QShortcut(QKeySequence(Qt.SHIFT + Qt.Key_F12), self, self.dump_profile_trace)
+
         self.import_button = QPushButton("导入标注")
         self.import_button.setStyleSheet(button_style)
         self.import_button.clicked.connect(self.import_annotations)
@@ -583,6 +1782,20 @@ class ImageAnnotationTool(QMainWindow):
         self.select_mode_button.clicked.connect(self.image_viewer.set_select_mode)
         self.left_toolbar_layout.addWidget(self.select_mode_button)
 
+        self.box_mode_button = QPushButton("双点框模式")
+        self.box_mode_button.setStyleSheet(button_style)
+        self.box_mode_button.clicked.connect(self.image_viewer.set_box_mode)
+        self.left_toolbar_layout.addWidget(self.box_mode_button)
+
+        # Size of the YOLO boxes of single points, boxes drawn in box mode keep their own
+        self.left_toolbar_layout.addWidget(QLabel("单点框大小 (YOLO)"))
+        self.box_size_box = QSpinBox()
+        self.box_size_box.setRange(1, 4096)
+        self.box_size_box.setSuffix(" px")
+        self.box_size_box.setValue(self.settings.value("box_size", int(DEFAULT_BOX_SIZE), type=int))
+        self.box_size_box.valueChanged.connect(lambda value: self.settings.setValue("box_size", value))
+        self.left_toolbar_layout.addWidget(self.box_size_box)
+
         separator = QFrame()
         separator.setFrameShape(QFrame.HLine)
         separator.setFrameShadow(QFrame.Sunken)
@@ -603,11 +1816,21 @@ class ImageAnnotationTool(QMainWindow):
         self.reset_zoom_button.clicked.connect(self.image_viewer.reset_zoom)
         self.left_toolbar_layout.addWidget(self.reset_zoom_button)
 
+        self.display_button = QPushButton("波段/拉伸")
+        self.display_button.setStyleSheet(button_style)
+        self.display_button.clicked.connect(self.adjust_display)
+        self.left_toolbar_layout.addWidget(self.display_button)
+
         separator = QFrame()
         separator.setFrameShape(QFrame.HLine)
         separator.setFrameShadow(QFrame.Sunken)
         self.left_toolbar_layout.addWidget(separator)
 
+        self.propose_button = QPushButton("自动提议")
+        self.propose_button.setStyleSheet(button_style)
+        self.propose_button.clicked.connect(self.toggle_proposals)
+        self.left_toolbar_layout.addWidget(self.propose_button)
+
         self.confirm_button = QPushButton("确认标注")
         self.confirm_button.setStyleSheet(button_style)
         self.confirm_button.clicked.connect(self.image_viewer.confirm_annotations)
@@ -617,6 +1840,16 @@ class ImageAnnotationTool(QMainWindow):
         self.clear_button.setStyleSheet(button_style)
         self.clear_button.clicked.connect(self.image_viewer.clear_annotations)
         self.left_toolbar_layout.addWidget(self.clear_button)
+
+        self.undo_button = QPushButton("撤销 (Ctrl+Z)")
+        self.undo_button.setStyleSheet(button_style)
+        self.undo_button.clicked.connect(self.image_viewer.undo_annotation)
+        self.left_toolbar_layout.addWidget(self.undo_button)
+
+        self.redo_button = QPushButton("重做 (Ctrl+Y)")
+        self.redo_button.setStyleSheet(button_style)
+        self.redo_button.clicked.connect(self.image_viewer.redo_annotation)
+        self.left_toolbar_layout.addWidget(self.redo_button)
 # Shaozetong produced
         self.left_toolbar_layout.addStretch()
 
@@ -627,33 +1860,340 @@ class ImageAnnotationTool(QMainWindow):
     def dropEvent(self, event):
         for url in event.mimeData().urls():
             file_path = url.toLocalFile()
-            if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')):
+            if file_path.lower().endswith(IMAGE_EXTENSIONS):
                 self.load_image_with_progress(file_path)
                 break
 
-    def load_image_with_progress(self, file_path):
-        progress = QProgressDialog("正在加载图片...", None, 0, 0, self)
+    def start_task(self, title, fn, *args, on_success=None, error_prefix=""):
+        """Run fn on a BackgroundTask behind a cancellable progress dialog"""
+        if self.active_task is not None:
+            self.active_task.cancel()
+
+        progress = QProgressDialog(title, "取消", 0, 100, self)
         progress.setWindowTitle("请稍候")
         progress.setWindowModality(Qt.WindowModal)
-        progress.setCancelButton(None)
-        progress.show()
-        
-        QApplication.processEvents()
+        progress.setMinimumDuration(300)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.setValue(0)
+
+        task = BackgroundTask(fn, *args, parent=self)
+        self.active_task = task
+
+        def on_progress(percent, message):
+            if message:
+                progress.setLabelText(message)
+            progress.setValue(percent)
+
+        def on_canceled():
+            task.cancel()
+            self.update_status_bar("已取消")
+
+        def on_succeeded(result):
+            if on_success is not None and not task.cancelled:
+                on_success(result)
+
+        def on_failed(message):
+            QMessageBox.warning(self, "错误", f"{error_prefix}{message}")
+
+        def on_finished():
+            # Closing the dialog emits canceled(), which must not reach the task
+            progress.canceled.disconnect(on_canceled)
+            progress.close()
+            if self.active_task is task:
+                self.active_task = None
+            task.deleteLater()
+
+        task.progress_changed.connect(on_progress)
+        task.succeeded.connect(on_succeeded)
+        task.failed.connect(on_failed)
+        task.finished.connect(on_finished)
+        progress.canceled.connect(on_canceled)
+        task.start()
+        return task
+
+    def load_image_with_progress(self, file_path):
+        cached = self.image_cache.get(file_path)
+        if cached is not None:
+            self._on_image_loaded(cached)
+            return
+        self.start_task("正在加载图片...", read_image, file_path, self.pyramids,
+                        on_success=self._on_image_loaded)
+
+    def leave_current_image(self):
+        """Stash, save and stop journaling the points of the image being replaced"""
+        # Proposals belong to the image they were detected on
+        self.stop_proposals()
+        if self.current_path is not None:
+            snapshot = self.image_viewer.snapshot_annotations()
+            if len(snapshot["ids"]):
+                self.stashed_annotations[self.current_path] = snapshot
+            else:
+                self.stashed_annotations.pop(self.current_path, None)
+            self.save_to_project(self.current_path, snapshot)
+            self.close_journal()
+
+    def _on_image_loaded(self, loaded):
+        self.leave_current_image()
+        self.image_cache.put(loaded)
+        self.image_viewer.show_loaded_image(loaded)
+        self.current_path = loaded.path
+        self.cache_pyramid(loaded)
+        stashed = self.stashed_annotations.pop(loaded.path, None)
+        if stashed is not None:
+            self.image_viewer.restore_annotations(stashed)
+        recovered = self.open_journal(loaded.path, recover=stashed is None)
+        from_project = 0
+        if stashed is None and not recovered:
+            from_project = self.load_from_project(loaded.path)
+
+        file_path = loaded.path
+        if file_path in self.dataset_files:
+            self.dataset_index = self.dataset_files.index(file_path)
+            self.prefetch_around(self.dataset_index)
+            self.update_status_bar(f"已加载: {os.path.basename(file_path)} "
+                                   f"({self.dataset_index + 1}/{len(self.dataset_files)})")
+        else:
+            self.update_status_bar(f"已加载: {os.path.basename(file_path)}")
+        self.settings.setValue("last_image", file_path)
         
-        QTimer.singleShot(100, lambda: self._load_image_after_delay(file_path, progress))
+# Shaozetong produced
+        if file_path.lower().endswith(('.tif', '.tiff')) and self.image_viewer.transform is not None:
+            crs_info = str(self.image_viewer.crs) if self.image_viewer.crs else "未知"
+            self.update_status_bar(f"已加载: {os.path.basename(file_path)} (CRS: {crs_info})")
+        if recovered:
+            self.update_status_bar(f"{self.status_label.text()} | 已恢复 {recovered} 个标注点")
+        elif from_project:
+            self.update_status_bar(f"{self.status_label.text()} | 项目中有 {from_project} 个标注点")
+
+    def open_journal(self, image_path, recover=True):
+        """Start journaling the viewer's points, after replaying an earlier journal
+
+        Returns the number of recovered points. The journal lives next to the
+        image and is rewritten from the current points on open, so it never
+        has to match ids from an earlier session.
+        """
+        path = journal_path(image_path)
+        # A journal of this image may still be flushing from a previous visit
+        retired = self.retired_journals.pop(path, None)
+        if retired is not None:
+            retired.wait()
+
+        recovered = 0
+        if recover and os.path.exists(path):
+            try:
+                records = read_journal(path)[0]
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read annotation journal: {str(e)}")
+            else:
+                recovered = len(records["ids"])
+                if recovered:
+                    self.image_viewer.restore_annotations(records)
+
+        self.journal = Journal(path, self.image_viewer.store)
+        self.journal.start()
+        return recovered
+
+    def close_journal(self, wait=False):
+        if self.journal is None:
+            return
+        # Nothing left to recover, so leave no empty journal behind
+        self.journal.close(remove=not len(self.image_viewer.store), wait=wait)
+        if not wait:
+            self.retired_journals[self.journal.path] = self.journal
+        self.journal = None
+
+    def new_project(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "新建项目", "", f"LabelSP 项目 (*{PROJECT_SUFFIX})")
+        if not file_path:
+            return
+        if not file_path.lower().endswith(PROJECT_SUFFIX):
+            file_path += PROJECT_SUFFIX
+        folder = QFileDialog.getExistingDirectory(self, "选择项目图像文件夹")
+        paths = []
+        if folder:
+            paths = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                           if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif self.current_path is not None and not self.current_path.endswith(MOSAIC_SUFFIX):
+            paths = [self.current_path]
+        # Header reads only, but thousands of them still belong off the GUI thread
+        self.start_task("正在建立项目...", read_image_infos, paths,
+                        on_success=lambda infos: self._on_project_scanned(file_path, infos),
+                        error_prefix="建立项目失败: ")
+
+    def _on_project_scanned(self, file_path, infos):
+        try:
+            project = Project(file_path)
+            project.add_images(infos)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"建立项目失败: {str(e)}")
+            return
+        self.set_project(project)
 
-    def _load_image_after_delay(self, file_path, progress):
+    def open_project(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "打开项目", "", f"LabelSP 项目 (*{PROJECT_SUFFIX})")
+        if not file_path:
+            return
         try:
-            if self.image_viewer.load_image(file_path):
-                self.update_status_bar(f"已加载: {os.path.basename(file_path)}")
-                self.settings.setValue("last_image", file_path)
-                
-# Shaozetong produced
-                if file_path.lower().endswith(('.tif', '.tiff')) and self.image_viewer.transform is not None:
-                    crs_info = str(self.image_viewer.crs) if self.image_viewer.crs else "未知"
-                    self.update_status_bar(f"已加载: {os.path.basename(file_path)} (CRS: {crs_info})")
-        finally:
-            progress.close()
+            project = Project(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"打开项目失败: {str(e)}")
+            return
+        self.set_project(project)
+
+    def set_project(self, project):
+        self.close_project()
+        self.project = project
+        self.settings.setValue("last_project", project.path)
+        stats = project.stats()
+        files = [path for path in project.image_paths() if os.path.exists(path)]
+        self.update_status_bar(f"项目: {os.path.basename(project.path)} ({stats['images']} 张图像, "
+                               f"{stats['labelled_images']} 张已标注, {stats['points']} 个标注点)")
+        if files:
+            self.dataset_files = files
+            self.dataset_index = 0
+            if self.current_path in files:
+                self.dataset_index = files.index(self.current_path)
+                self.load_from_project(self.current_path, replace=False)
+            else:
+                self.load_image_with_progress(files[0])
+
+    def close_project(self):
+        if self.project is None:
+            return
+        self.save_project()
+        for path, snapshot in self.stashed_annotations.items():
+            self.save_to_project(path, snapshot)
+        self.project.close()
+        self.project = None
+
+    def save_to_project(self, path, snapshot):
+        """Write one image's points to the project in a single transaction"""
+        # Mosaic points have no single image to belong to
+        if self.project is None or path is None or path.endswith(MOSAIC_SUFFIX):
+            return False
+        try:
+            if self.project.image_id(path) is None:
+                self.project.add_image(read_image_info(path))
+            self.project.save_points(path, snapshot["xy"], snapshot["confirmed"], snapshot["wh"])
+        except Exception as e:
+            self.update_status_bar(f"保存到项目失败: {str(e)}")
+            return False
+        return True
+
+    def save_project(self):
+        if self.project is None:
+            self.update_status_bar("没有打开的项目")
+            return
+        if self.current_path is not None and self.image_viewer.has_image():
+            if self.save_to_project(self.current_path, self.image_viewer.snapshot_annotations()):
+                self.update_status_bar(f"已保存到项目: {os.path.basename(self.project.path)}")
+
+    def load_from_project(self, path, replace=False):
+        """Show the project's points for path unless the viewer already has points"""
+        if self.project is None or (len(self.image_viewer.store) and not replace):
+            return 0
+        xy, confirmed, wh = self.project.load_points(path)
+        if len(xy):
+            self.image_viewer.restore_annotations({"xy": xy, "confirmed": confirmed, "wh": wh})
+        return len(xy)
+
+    def open_mosaic(self):
+        folder = QFileDialog.getExistingDirectory(self, "打开拼接图文件夹")
+        if not folder:
+            return
+        files = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                       if name.lower().endswith(('.tif', '.tiff')))
+        if not files:
+            QMessageBox.warning(self, "警告", "文件夹中没有 GeoTIFF!")
+            return
+        # Only headers are read here, pixels load as rasters come into view
+        self.start_task("正在建立拼接图...", plan_mosaic, files,
+                        on_success=self._on_mosaic_planned, error_prefix="建立拼接图失败: ")
+
+    def _on_mosaic_planned(self, mosaic):
+        self.leave_current_image()
+        self.image_viewer.show_mosaic(mosaic)
+        self.current_path = mosaic.path
+        # Previous/next step through a folder of single images, not a mosaic
+        self.dataset_files = []
+        self.dataset_index = -1
+        stashed = self.stashed_annotations.pop(mosaic.path, None)
+        if stashed is not None:
+            self.image_viewer.restore_annotations(stashed)
+        recovered = self.open_journal(mosaic.path, recover=stashed is None)
+        message = f"拼接图: {len(mosaic.rasters)} 幅影像 (CRS: {mosaic.crs})"
+        if mosaic.skipped:
+            message += f" | {len(mosaic.skipped)} 幅没有地理参考, 已跳过"
+        if recovered:
+            message += f" | 已恢复 {recovered} 个标注点"
+        self.update_status_bar(message)
+
+    def open_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "打开文件夹")
+        if not folder:
+            return
+        files = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                       if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not files:
+            QMessageBox.warning(self, "警告", "文件夹中没有图像!")
+            return
+        self.dataset_files = files
+        self.dataset_index = 0
+        self.load_image_with_progress(files[0])
+
+    def show_dataset_image(self, index):
+        if not self.dataset_files:
+            self.update_status_bar("请先打开文件夹")
+            return
+        if not 0 <= index < len(self.dataset_files):
+            self.update_status_bar("已经是最后一张" if index > 0 else "已经是第一张")
+            return
+        self.dataset_index = index
+        self.load_image_with_progress(self.dataset_files[index])
+
+    def next_image(self):
+        self.show_dataset_image(self.dataset_index + 1)
+
+    def prev_image(self):
+        self.show_dataset_image(self.dataset_index - 1)
+
+    def prefetch_around(self, index):
+        # Decode the next images (and the previous one) before they are asked for
+        wanted = self.dataset_files[index + 1:index + 1 + self.prefetch_count]
+        if index > 0:
+            wanted.append(self.dataset_files[index - 1])
+        for path in wanted:
+            if path in self.image_cache or path in self.prefetching:
+                continue
+            self.prefetching.add(path)
+            self.prefetch_pool.start(PrefetchTask(path, self.prefetch_signals, self.pyramids))
+
+    def _on_prefetched(self, loaded):
+        self.prefetching.discard(loaded.path)
+        self.image_cache.put(loaded, keep=self.current_path)
+
+    def cache_pyramid(self, loaded):
+        """Queue building the pyramid of a large image that has none on disk yet"""
+        if loaded.cache_key is None or loaded.pyramid is not None or loaded.cache_key in self.pyramid_tasks:
+            return
+        if loaded.width * loaded.height < MIN_PIXELS:
+            return
+        if loaded.image is None and not isinstance(loaded.tile_source, TileSource):
+            return
+        task = PyramidTask(loaded, self.pyramids, self.pyramid_signals)
+        self.pyramid_tasks[loaded.cache_key] = task
+        self.pyramid_pool.start(task)
+
+    def _on_pyramid_built(self, path, key):
+        self.pyramid_tasks.pop(key, None)
+        loaded = self.image_cache.get(path)
+        if loaded is None or loaded.cache_key != key:
+            return
+        loaded.pyramid = self.pyramids.get(key)
+        # Coarse tiles of an open raster come from the new pyramid right away
+        if isinstance(loaded.tile_source, TileSource) and loaded.tile_source.pyramid is None:
+            loaded.tile_source.pyramid = loaded.pyramid
 
     def open_image(self):
         file_dialog = QFileDialog(self)
@@ -664,8 +2204,79 @@ class ImageAnnotationTool(QMainWindow):
             file_path = file_dialog.selectedFiles()[0]
             self.load_image_with_progress(file_path)
 
+    def adjust_display(self):
+        raster_item = self.image_viewer.raster_item
+        if raster_item is None or not isinstance(raster_item.source, TileSource):
+            self.update_status_bar("仅高位深、多波段或大幅 TIFF 支持波段与拉伸设置")
+            return
+        dialog = DisplayDialog(raster_item.source, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            overview = self.image_viewer.set_raster_display(dialog.bands(), dialog.percentiles())
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"更新显示失败: {str(e)}")
+            return
+        # Cached copies of this image must come back with the new look
+        self.image_cache.set_overview(self.current_path, overview)
+        bands = ",".join(str(band) for band in raster_item.source.bands)
+        self.update_status_bar(f"显示波段: {bands}")
+
+    def toggle_proposals(self):
+        if self.proposal_task is not None:
+            self.stop_proposals()
+            return
+        if not self.image_viewer.has_image() or self.current_path is None:
+            QMessageBox.warning(self, "警告", "请先加载图像!")
+            return
+        if self.current_path.endswith(MOSAIC_SUFFIX):
+            QMessageBox.warning(self, "警告", "拼接图模式下不支持自动提议, 请单独打开影像")
+            return
+        dialog = ProposeDialog(self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        task = ProposalTask(self.current_path, *dialog.parameters(), parent=self)
+        task.points_found.connect(lambda xy: self._on_proposals_found(task, xy))
+        task.progress_changed.connect(
+            lambda done, total: self.update_status_bar(f"自动提议: {done}/{total} 个图块, "
+                                                       f"{sum(map(len, self.proposal_ids))} 个候选点"))
+        task.failed.connect(lambda message: QMessageBox.warning(self, "错误", f"自动提议失败: {message}"))
+        task.finished.connect(lambda: self._on_proposals_finished(task))
+        self.proposal_task = task
+        self.proposal_ids = []
+        self.propose_button.setText("停止提议")
+        task.start()
+
+    def _on_proposals_found(self, task, xy):
+        # Batches still queued from a stopped detector are dropped
+        if self.proposal_task is not task:
+            return
+        # Unconfirmed, so they show as temporary points until confirmed
+        self.proposal_ids.append(self.image_viewer.store.add_many(xy, False))
+
+    def _on_proposals_finished(self, task):
+        if self.proposal_task is not task:
+            return
+        self.proposal_task = None
+        self.propose_button.setText("自动提议")
+        ids = self.image_viewer.history.adopt(np.concatenate(self.proposal_ids)) \
+            if self.proposal_ids else []
+        self.proposal_ids = []
+        state = "已停止" if task.cancelled else "完成"
+        self.update_status_bar(f"自动提议{state}: {len(ids)} 个候选点, 检查后点击确认标注")
+        task.deleteLater()
+
+    def stop_proposals(self):
+        """Cancel the detector; proposals already shown stay as one undo step"""
+        task = self.proposal_task
+        if task is None:
+            return
+        task.cancel()
+        task.wait()
+        self._on_proposals_finished(task)
+
     def import_annotations(self):
-        if not self.image_viewer.pixmap_item.pixmap() or self.image_viewer.pixmap_item.pixmap().isNull():
+        if not self.image_viewer.has_image():
             QMessageBox.warning(self, "警告", "请先加载图像!")
             return
         
@@ -675,130 +2286,190 @@ class ImageAnnotationTool(QMainWindow):
         
         if file_dialog.exec_():
             file_path = file_dialog.selectedFiles()[0]
-            try:
-                if file_path.lower().endswith('.xlsx'):
-                    self.import_from_xlsx(file_path)
-                elif file_path.lower().endswith('.csv'):
-                    self.import_from_csv(file_path)
-            except Exception as e:
-                QMessageBox.warning(self, "错误", f"导入失败: {str(e)}")
+            geo = self.ask_geo_columns(file_path)
+            if geo is False:
+                return
+            if geo is not None:
+                viewer = self.image_viewer
+                columns, crs = geo
+                self.start_task("正在导入标注...", read_geo_boxes, file_path, columns, crs,
+                                viewer.transform, viewer.crs, viewer.image_width, viewer.image_height,
+                                on_success=lambda result: self._on_geo_points_imported(file_path, crs, *result),
+                                error_prefix="导入失败: ")
+                return
+            # Parse on a worker thread, then insert everything in one batch
+            self.start_task("正在导入标注...", read_boxes, file_path,
+                            on_success=lambda boxes: self._on_points_imported(file_path, *boxes),
+                            error_prefix="导入失败: ")
+
+    def ask_geo_columns(self, file_path):
+        """((x column, y column), CRS) to import a file by coordinates, None for pixels, False if cancelled
+
+        Only asked on georeferenced images, for files that do not start with
+        the pixel X/Y headers this tool writes.
+        """
+        viewer = self.image_viewer
+        if viewer.transform is None or not viewer.crs:
+            return None
+        try:
+            headers = read_headers(file_path)
+        except Exception as e:
+            print(f"Warning: Could not read headers of {file_path}: {str(e)}")
+            return None
+        # Files exported here start with pixel X/Y; their lon/lat columns are derived
+        if [header.strip().lower() for header in headers[:2]] == ["x", "y"]:
+            return None
+        detected = find_geo_columns(headers)
+        current = "EPSG:4326" if detected is not None and detected[2] == "lonlat" else viewer.crs.to_string()
+        dialog = GeoImportDialog(headers, detected, self.crs_choices(), current, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return False
+        if not dialog.is_geo():
+            return None
+        return dialog.columns(), dialog.crs_text()
+
+    def _on_geo_points_imported(self, file_path, crs, xy, wh, dropped):
+        with profiler.span("import insert"):
+            self.image_viewer.replace_annotations(xy, wh=wh)
+        message = f"从{os.path.basename(file_path)}导入 {len(self.image_viewer.store)} 个标注点 ({crs})"
+        if dropped:
+            message += f", {dropped} 个点在图像范围外或坐标无效, 已跳过"
+        self.update_status_bar(message)
+
+    def _on_points_imported(self, file_path, xy, wh=None):
+        with profiler.span("import insert"):
+            self.image_viewer.replace_annotations(xy, wh=wh)
+        source = "Excel" if file_path.lower().endswith('.xlsx') else "CSV"
+        self.update_status_bar(f"从{source}导入 {len(self.image_viewer.store)} 个标注点")
 
+# Shaozetong produced
     def import_from_xlsx(self, file_path):
-        wb = openpyxl.load_workbook(file_path)
-        ws = wb.active
-# Shaozetong produced       
-        self.image_viewer.clear_annotations()
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):  # Skip header
-            if len(row) >= 2:
-                x, y = row[0], row[1]
-                if isinstance(x, (int, float)) and isinstance(y, (int, float)):
-                    point = AnnotationPoint(QPointF(x, y))
-                    self.image_viewer.scene.addItem(point)
-                    self.image_viewer.annotations.append(point)
-        
-        self.update_status_bar(f"从Excel导入 {len(self.image_viewer.annotations)} 个标注点")
+        with profiler.span("read_points"):
+            xy, wh = read_boxes(file_path)
+        self._on_points_imported(file_path, xy, wh)
 
     def import_from_csv(self, file_path):
-        self.image_viewer.clear_annotations()
-        
-        with open(file_path, 'r') as csvfile:
-            reader = csv.reader(csvfile)
-            next(reader)  # Skip header
-            for row in reader:
-                if len(row) >= 2:
-                    try:
-                        x, y = float(row[0]), float(row[1])
-                        point = AnnotationPoint(QPointF(x, y))
-                        self.image_viewer.scene.addItem(point)
-                        self.image_viewer.annotations.append(point)
-                    except ValueError:
-                        continue
-        
-        self.update_status_bar(f"从CSV导入 {len(self.image_viewer.annotations)} 个标注点")
+        with profiler.span("read_points"):
+            xy, wh = read_boxes(file_path)
+        self._on_points_imported(file_path, xy, wh)
 
     def export_annotations(self):
-        if not self.image_viewer.get_annotations():
+        if not len(self.image_viewer.store):
             QMessageBox.warning(self, "警告", "没有标注可导出!")
             return
         
+        filters = ["Excel Files (*.xlsx)", "CSV Files (*.csv)", "NumPy Files (*.npy)", "YOLO Files (*.txt)"]
+        if has_arrow():
+            filters.extend(["Parquet Files (*.parquet)", "Feather Files (*.feather)"])
+        if self.image_viewer.transform is not None and self.image_viewer.crs:
+            filters.extend(["GeoPackage (*.gpkg)", "GeoJSON (*.geojson)"])
+        
         file_dialog = QFileDialog(self)
         file_dialog.setWindowTitle("导出标注")
         file_dialog.setAcceptMode(QFileDialog.AcceptSave)
-        file_dialog.setNameFilter("Excel Files (*.xlsx)")
+        file_dialog.setNameFilters(filters)
         file_dialog.setDefaultSuffix("xlsx")
         
         if file_dialog.exec_():
             file_path = file_dialog.selectedFiles()[0]
+            # Follow the chosen filter when the name has no extension of its own
+            suffix = re.search(r'\*(\.\w+)', file_dialog.selectedNameFilter()).group(1)
+            root, extension = os.path.splitext(file_path)
+            if extension.lower() not in ('.xlsx', '.csv', '.npy', '.txt', '.parquet', '.feather') + VECTOR_EXTENSIONS:
+                file_path = root + suffix
+            if file_path.lower().endswith('.txt'):
+                self.export_to_yolo(file_path)
+                return
+            if file_path.lower().endswith(VECTOR_EXTENSIONS):
+                self.export_to_vector(file_path)
+                return
+            headers, columns = self.annotation_table()
+            self.start_task("正在导出标注...", write_table, file_path, headers, columns,
+                            on_success=lambda _: self.update_status_bar(
+                                f"标注已导出: {os.path.basename(file_path)}"),
+                            error_prefix="导出失败: ")
+
+    def export_to_yolo(self, file_path):
+        xy, wh = self.image_viewer.get_boxes()
+        # All boxes are computed at once on this thread, only the writing is handed off
+        rows = points_to_yolo(xy, self.image_viewer.image_width, self.image_viewer.image_height,
+                              self.box_size_box.value(), 0, wh)
+        self.start_task("正在导出标注...", write_yolo, file_path, rows,
+                        on_success=lambda _: self.update_status_bar(
+                            f"标注已导出为YOLO: {os.path.basename(file_path)} ({len(rows)} 个框)"),
+                        error_prefix="导出失败: ")
+
+    def crs_choices(self):
+        """(label, CRS) entries offered for vector export: the image's, its UTM zone and WGS84"""
+        viewer = self.image_viewer
+        source = viewer.crs.to_string()
+        choices = [(f"图像坐标系 ({source})", source)]
+        lonlat = viewer.lonlat_at(viewer.image_width / 2, viewer.image_height / 2)
+        if lonlat is not None:
+            utm = utm_crs(*lonlat)
+            if utm != source:
+                choices.append((f"UTM 分带 ({utm})", utm))
+        if source != "EPSG:4326":
+            choices.append(("WGS84 经纬度 (EPSG:4326)", "EPSG:4326"))
+        return choices
+
+    def export_to_vector(self, file_path):
+        viewer = self.image_viewer
+        if viewer.transform is None or not viewer.crs:
+            QMessageBox.warning(self, "警告", "当前图像没有地理参考信息, 无法导出矢量点!")
+            return
+        dialog = CrsDialog(self.crs_choices(), self.settings.value("vector_crs", "", type=str), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        target = dialog.crs_text()
+        self.settings.setValue("vector_crs", target)
+        xy, wh = viewer.get_boxes()
+        # Geometry carries the coordinates, so the table has no lon/lat columns
+        headers, columns = annotation_table(xy, viewer.image_width, viewer.image_height, None, wh)
+        self.start_task("正在导出标注...", write_vector, file_path, headers, columns,
+                        viewer.transform, viewer.crs, target,
+                        on_success=lambda count: self.update_status_bar(
+                            f"标注已导出: {os.path.basename(file_path)} ({count} 个点, {target})"),
+                        error_prefix="导出失败: ")
+
+    def annotation_table(self):
+        xy, wh = self.image_viewer.get_boxes()
+        # Add lon/lat if available, converted for all points at once
+        lonlat = None
+        if self.image_viewer.transform is not None:
             try:
-                self.export_to_xlsx(file_path)
+                lonlat = self.image_viewer.pixels_to_lonlat(xy[:, 0], xy[:, 1])
             except Exception as e:
-                QMessageBox.warning(self, "错误", f"导出失败: {str(e)}")
+                print(f"Error converting coordinates: {str(e)}")
+        return annotation_table(xy, self.image_viewer.image_width, self.image_viewer.image_height, lonlat, wh)
+
 # Shaozetong produced
     def export_to_xlsx(self, file_path):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Annotations"
-        
-        header_font = Font(bold=True)
-        header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-        header_alignment = Alignment(horizontal="center")
-        thin_border = Border(left=Side(style='thin'),
-                             right=Side(style='thin'),
-                             top=Side(style='thin'),
-                             bottom=Side(style='thin'))
-        
-        # Write headers
-        headers = ["X", "Y", "Normalized X", "Normalized Y"]
-        if self.image_viewer.transform is not None:
-            headers.extend(["Longitude", "Latitude"])
-        
-        for col, header in enumerate(headers, start=1):
-            ws.cell(row=1, column=col, value=header)
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_alignment
-            cell.border = thin_border
-        
-        # Write data
-        img_width = self.image_viewer.pixmap_item.pixmap().width()
-        img_height = self.image_viewer.pixmap_item.pixmap().height()
-        
-        for i, point in enumerate(self.image_viewer.get_annotations(), start=2):
-            pos = point.pos()
-            x, y = pos.x(), pos.y()
-            norm_x = x / img_width
-            norm_y = y / img_height
-            
-            ws.cell(row=i, column=1, value=x)
-            ws.cell(row=i, column=2, value=y)
-            ws.cell(row=i, column=3, value=norm_x)
-            ws.cell(row=i, column=4, value=norm_y)
-            
-            # Add lon/lat if available
-            if self.image_viewer.transform is not None:
-                try:
-                    lon, lat = self.image_viewer.pixel_to_coords(x, y)
-                    if self.image_viewer.transformer is not None:
-                        # Convert to WGS84 if not already
-                        lon, lat = self.image_viewer.transformer.transform(lon, lat)
-                    ws.cell(row=i, column=5, value=lon)
-                    ws.cell(row=i, column=6, value=lat)
-                except Exception as e:
-                    print(f"Error converting coordinates: {str(e)}")
-            
-            # Apply border to data cells
-            for col in range(1, len(headers)+1):
-                ws.cell(row=i, column=col).border = thin_border
-        
-        # Auto-size columns
-        for col in range(1, len(headers)+1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
-        
-        wb.save(file_path)
+        with profiler.span("export xlsx"):
+            headers, columns = self.annotation_table()
+            write_xlsx(file_path, headers, columns)
         self.update_status_bar(f"标注已导出为Excel: {os.path.basename(file_path)}")
 
+    def toggle_profiling(self):
+        profiler.enabled = not profiler.enabled
+        self.image_viewer.profiler_overlay.set_active(profiler.enabled)
+        self.update_status_bar("性能分析已开启 (Shift+F12 导出 trace)" if profiler.enabled else "性能分析已关闭")
+
+    def dump_profile_trace(self):
+        if not profiler.events:
+            self.update_status_bar("没有性能数据, 请先按 F12 开启性能分析")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出性能 trace", "labelsp-trace.json",
+                                                   "Chrome Trace (*.json)")
+        if not file_path:
+            return
+        try:
+            count = profiler.dump_trace(file_path)
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"导出失败: {str(e)}")
+            return
+        self.update_status_bar(f"已导出 {count} 条性能记录: {os.path.basename(file_path)}")
+
     def update_status_bar(self, message):
         self.status_label.setText(message)
 
@@ -808,26 +2479,64 @@ class ImageAnnotationTool(QMainWindow):
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Z and event.modifiers() == Qt.ControlModifier:
             self.image_viewer.undo_annotation()
+        elif (event.key() == Qt.Key_Y and event.modifiers() == Qt.ControlModifier) or \
+                (event.key() == Qt.Key_Z and event.modifiers() == Qt.ControlModifier | Qt.ShiftModifier):
+            self.image_viewer.redo_annotation()
         else:
             super().keyPressEvent(event)
 
     def closeEvent(self, event):
-        if self.image_viewer.get_annotations():
+        if self.project is None and (len(self.image_viewer.store) or self.stashed_annotations):
             reply = QMessageBox.question(
                 self, "退出",
-                "您有未保存的标注。确定要退出吗?",
+                "标注已自动保存, 但尚未导出。确定要退出吗?",
                 QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             
             if reply == QMessageBox.No:
                 event.ignore()
                 return
         
-        if self.image_viewer.tif_file is not None:
-            self.image_viewer.tif_file.close()
+        if self.active_task is not None:
+            self.active_task.cancel()
+            self.active_task.wait()
+        self.stop_proposals()
+        self.prefetch_pool.clear()
+        self.prefetch_pool.waitForDone()
+        self.pyramid_pool.clear()
+        for task in self.pyramid_tasks.values():
+            task.cancel()
+        self.pyramid_pool.waitForDone()
+        self.close_project()
+        self.close_journal(wait=True)
+        for journal in self.retired_journals.values():
+            journal.wait()
+        self.image_viewer.close_image()
+        for loaded in self.image_cache.entries.values():
+            if loaded.tile_source is not None:
+                loaded.tile_source.close()
         
         event.accept()
 
-if __name__ == "__main__":
+def main():
+    if hasattr(Qt, 'AA_EnableHighDpiScaling'):
+        QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    if hasattr(Qt, 'AA_UseHighDpiPixmaps'):
+        QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+
+    app = QApplication(sys.argv)
+
+    # Show splash screen
+    splash_pix = QPixmap('1.jpg') if os.path.exists('1.jpg') else QPixmap(400, 300)
+    splash_pix = splash_pix.scaled(800, 600, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    splash = QSplashScreen(splash_pix, Qt.WindowStaysOnTopHint)
+    splash.show()
+    app.processEvents()
+
     window = ImageAnnotationTool()
     window.show()
-    sys.exit(app.exec_())# Shaozetong produced
\ No newline at end of file
+    splash.finish(window)
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(main())# Shaozetong produced
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""Qt-free building blocks used by the LabelSP annotation tool
+
+Everything here can be imported without a display, so the same code runs
+in the GUI, in scripts and in the ``python -m labelsp_core`` batch tool.
+"""
+
+from .detect import local_maxima, propose_points
+from .export import annotation_table, write_table
+from .geo import apply_affine, crs_to_pixels, crs_transformer, pixels_to_crs, pixels_to_lonlat, wgs84_transformer
+from .history import Change, History
+from .imageinfo import ImageInfo, read_image_info, read_image_infos
+from .importers import read_boxes, read_geo_boxes, read_points, read_table
+from .journal import Journal, read_journal
+from .mosaic import Mosaic, plan_mosaic
+from .project import Project
+from .store import AnnotationStore
+from .vector import write_vector
+from .yolo import points_to_yolo, write_yolo
+
+__all__ = [
+    "AnnotationStore",
+    "Change",
+    "History",
+    "ImageInfo",
+    "Journal",
+    "Mosaic",
+    "Project",
+    "annotation_table",
+    "apply_affine",
+    "crs_to_pixels",
+    "crs_transformer",
+    "local_maxima",
+    "pixels_to_crs",
+    "plan_mosaic",
+    "pixels_to_lonlat",
+    "points_to_yolo",
+    "propose_points",
+    "read_boxes",
+    "read_geo_boxes",
+    "read_image_info",
+    "read_image_infos",
+    "read_journal",
+    "read_points",
+    "read_table",
+    "wgs84_transformer",
+    "write_table",
+    "write_vector",
+    "write_yolo",
+]
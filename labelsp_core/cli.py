@@ -0,0 +1,262 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from .export import annotation_table, write_table
+from .geo import pixels_to_lonlat, wgs84_transformer
+from .imageinfo import TIFF_EXTENSIONS, read_image_info
+from .importers import read_boxes
+from .vector import VECTOR_EXTENSIONS, write_vector
+from .yolo import DEFAULT_BOX_SIZE, points_to_yolo, write_yolo
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+ANNOTATION_EXTENSIONS = ('.xlsx', '.csv')
+OUTPUTS = ('normalized', 'yolo', 'geo')
+
+
+def write_points(xy, info, out_path, output, box_size=DEFAULT_BOX_SIZE, class_id=0, wh=None, crs=None):
+    """Write the points of one image (described by an ImageInfo) in an output flavour
+
+    wh holds the box sizes of points drawn as boxes, NaN where box_size applies.
+    GeoJSON/GeoPackage outputs are point layers in crs (default: the image's).
+    """
+    if output == 'yolo':
+        write_yolo(out_path, points_to_yolo(xy, info.width, info.height, box_size, class_id, wh))
+        return len(xy)
+    if out_path.lower().endswith(VECTOR_EXTENSIONS):
+        headers, columns = annotation_table(xy, info.width, info.height, None, wh)
+        return write_vector(out_path, headers, columns, info.transform, info.crs, crs)
+
+    lonlat = None
+    if output == 'geo':
+        if info.transform is None or info.crs is None:
+            raise ValueError("图像没有地理参考信息")
+        lonlat = pixels_to_lonlat(info.transform, wgs84_transformer(info.crs), xy[:, 0], xy[:, 1])
+    headers, columns = annotation_table(xy, info.width, info.height, lonlat, wh)
+    write_table(out_path, headers, columns)
+    return len(xy)
+
+
+def convert_file(annotation_path, image_path, out_path, output, box_size=DEFAULT_BOX_SIZE, class_id=0, crs=None):
+    """Convert one point file using the pixel size (and georeferencing) of its image"""
+    xy, wh = read_boxes(annotation_path)
+    return write_points(xy, read_image_info(image_path), out_path, output, box_size, class_id, wh, crs)
+
+
+def _run_job(job):
+    try:
+        return job[0], convert_file(*job), None
+    except Exception as e:
+        return job[0], 0, str(e)
+
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _images_by_stem(paths):
+    images = {}
+    for path in sorted(paths):
+        # Prefer the GeoTIFF when a PNG/JPEG copy of the same image sits next to it
+        if _stem(path) not in images or path.lower().endswith(TIFF_EXTENSIONS):
+            images[_stem(path)] = path
+    return images
+
+
+def _list_images(image_dir):
+    return [os.path.join(image_dir, name) for name in sorted(os.listdir(image_dir))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def build_jobs(annotation_dir, image_dir, out_dir, output, out_format, box_size, class_id, crs=None):
+    """Pair every point file with the image of the same name"""
+    images = _images_by_stem(_list_images(image_dir))
+
+    extension = '.txt' if output == 'yolo' else '.' + out_format
+    jobs, missing = [], []
+    for name in sorted(os.listdir(annotation_dir)):
+        if not name.lower().endswith(ANNOTATION_EXTENSIONS):
+            continue
+        image_path = images.get(_stem(name))
+        if image_path is None:
+            missing.append(name)
+            continue
+        jobs.append((os.path.join(annotation_dir, name), image_path,
+                     os.path.join(out_dir, _stem(name) + extension), output, box_size, class_id, crs))
+    return jobs, missing
+
+
+def run_convert(args):
+    image_dir = args.images or args.annotations
+    os.makedirs(args.out, exist_ok=True)
+    jobs, missing = build_jobs(args.annotations, image_dir, args.out, args.to, args.format,
+                               args.box_size, args.class_id, args.crs)
+    for name in missing:
+        print(f"跳过 {name}: 找不到同名图像", file=sys.stderr)
+    if not jobs:
+        print("没有可转换的标注文件", file=sys.stderr)
+        return 1
+
+    workers = args.jobs or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (workers * 8))
+    done = points = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, count, error in pool.map(_run_job, jobs, chunksize=chunksize):
+            done += 1
+            points += count
+            if error is not None:
+                failed += 1
+                print(f"失败 {name}: {error}", file=sys.stderr)
+            if done % 1000 == 0:
+                print(f"{done}/{len(jobs)}", file=sys.stderr)
+    print(f"已转换 {done - failed}/{len(jobs)} 个文件, 共 {points} 个标注点")
+    return 1 if failed else 0
+
+
+def _pool_map(fn, items, jobs):
+    workers = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(fn, items, chunksize=max(1, len(items) // (workers * 8)))
+
+
+def _safe_image_info(path):
+    try:
+        return read_image_info(path), None
+    except Exception as e:
+        return None, f"{path}: {e}"
+
+
+def _safe_read_points(path):
+    try:
+        return read_boxes(path), None
+    except Exception as e:
+        return None, f"{path}: {e}"
+
+
+def run_project_add(args):
+    from .project import Project
+
+    paths = _list_images(args.images)
+    infos = []
+    for info, error in _pool_map(_safe_image_info, paths, args.jobs):
+        if error is not None:
+            print(f"跳过 {error}", file=sys.stderr)
+        else:
+            infos.append(info)
+    with Project(args.project) as project:
+        project.add_images(infos)
+        print(f"已加入 {len(infos)} 张图像, 项目共 {project.stats()['images']} 张")
+    return 0
+
+
+def run_project_import(args):
+    from .project import Project
+
+    with Project(args.project) as project:
+        images = _images_by_stem(project.image_paths())
+        pairs = []
+        for name in sorted(os.listdir(args.annotations)):
+            if name.lower().endswith(ANNOTATION_EXTENSIONS) and _stem(name) in images:
+                pairs.append((os.path.join(args.annotations, name), images[_stem(name)]))
+        points = 0
+        # Parse in worker processes, write from here: SQLite takes one writer at a time
+        results = _pool_map(_safe_read_points, [pair[0] for pair in pairs], args.jobs)
+        for (annotation_path, image_path), (boxes, error) in zip(pairs, results):
+            if error is not None:
+                print(f"失败 {error}", file=sys.stderr)
+                continue
+            xy, wh = boxes
+            points += project.save_points(image_path, xy, wh=wh)
+        print(f"已导入 {len(pairs)} 个标注文件, 共 {points} 个标注点")
+    return 0
+
+
+def run_project_stats(args):
+    from .project import Project
+
+    with Project(args.project) as project:
+        stats = project.stats()
+        print(f"图像: {stats['images']}  已标注: {stats['labelled_images']}  "
+              f"标注点: {stats['points']}  已确认: {stats['confirmed_points']}")
+        if args.unlabelled:
+            for path in project.unlabelled_images():
+                print(path)
+    return 0
+
+
+def run_project_export(args):
+    from .project import Project
+
+    os.makedirs(args.out, exist_ok=True)
+    extension = '.txt' if args.to == 'yolo' else '.' + args.format
+    done = points = failed = 0
+    with Project(args.project) as project:
+        for path, count in project.point_counts():
+            if not count:
+                continue
+            xy, confirmed, wh = project.load_points(path)
+            out_path = os.path.join(args.out, _stem(path) + extension)
+            try:
+                points += write_points(xy, project.image_info(path), out_path, args.to,
+                                       args.box_size, args.class_id, wh, args.crs)
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"失败 {path}: {e}", file=sys.stderr)
+    print(f"已导出 {done} 张图像, 共 {points} 个标注点")
+    return 1 if failed else 0
+
+
+def _add_output_arguments(parser):
+    parser.add_argument("--out", required=True, help="输出目录")
+    parser.add_argument("--to", choices=OUTPUTS, default="normalized",
+                        help="normalized: 像素+归一化坐标, yolo: YOLO txt, geo: 附加经纬度")
+    parser.add_argument("--format", choices=("csv", "xlsx", "npy", "parquet", "feather", "geojson", "gpkg"),
+                        default="csv", help="normalized/geo 的输出格式, geojson/gpkg 为矢量点图层")
+    parser.add_argument("--crs", help="geojson/gpkg 的目标坐标系, 如 EPSG:32650, 默认与图像相同")
+    parser.add_argument("--box-size", type=float, default=DEFAULT_BOX_SIZE, help="YOLO 框边长 (像素), 用于没有框大小的点")
+    parser.add_argument("--class-id", type=int, default=0, help="YOLO 类别编号")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="labelsp", description="LabelSP 无界面批处理工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="批量转换点标注文件 (xlsx/csv)")
+    convert.add_argument("annotations", help="标注文件所在目录")
+    convert.add_argument("--images", help="图像目录, 默认与标注目录相同")
+    _add_output_arguments(convert)
+    convert.add_argument("--jobs", type=int, default=0, help="进程数, 默认使用全部 CPU")
+    convert.set_defaults(func=run_convert)
+
+    project = commands.add_parser("project", help="项目文件 (SQLite) 管理")
+    project_commands = project.add_subparsers(dest="project_command", required=True)
+
+    add = project_commands.add_parser("add-images", help="把目录中的图像加入项目 (不存在则新建项目)")
+    add.add_argument("project", help="项目文件 (.lsproj)")
+    add.add_argument("images", help="图像目录")
+    add.add_argument("--jobs", type=int, default=0, help="进程数, 默认使用全部 CPU")
+    add.set_defaults(func=run_project_add)
+
+    imp = project_commands.add_parser("import", help="按文件名把 xlsx/csv 标注导入项目中的同名图像")
+    imp.add_argument("project", help="项目文件 (.lsproj)")
+    imp.add_argument("annotations", help="标注文件所在目录")
+    imp.add_argument("--jobs", type=int, default=0, help="进程数, 默认使用全部 CPU")
+    imp.set_defaults(func=run_project_import)
+
+    stats = project_commands.add_parser("stats", help="统计图像与标注数量")
+    stats.add_argument("project", help="项目文件 (.lsproj)")
+    stats.add_argument("--unlabelled", action="store_true", help="列出没有标注的图像")
+    stats.set_defaults(func=run_project_stats)
+
+    export = project_commands.add_parser("export", help="导出项目中所有已标注图像")
+    export.add_argument("project", help="项目文件 (.lsproj)")
+    _add_output_arguments(export)
+    export.set_defaults(func=run_project_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
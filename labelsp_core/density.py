@@ -0,0 +1,96 @@
+import numpy as np
+
+# Cells per side of the finest level
+MAX_CELLS = 1024
+
+
+class DensityGrid:
+    """Point counts per cell over an image, kept up to date incrementally
+
+    The finest level splits the image into at most ``max_cells`` square
+    cells per side. Adds and removes bin only the changed points, so an
+    update costs O(changed points) instead of a rescan of the store.
+    Coarser levels, with cells 2**level times larger, are summed from the
+    finest one on demand and cached; small updates are applied to the
+    cached levels as well, large ones drop them. Points outside the image
+    are not counted.
+    """
+
+    def __init__(self, width=0, height=0, max_cells=MAX_CELLS):
+        self.max_cells = max_cells
+        self.reset(width, height)
+
+    def reset(self, width, height):
+        self.width = float(width)
+        self.height = float(height)
+        self.cell = max(1.0, max(self.width, self.height) / self.max_cells)
+        self.columns = max(1, int(np.ceil(self.width / self.cell)))
+        self.rows = max(1, int(np.ceil(self.height / self.cell)))
+        self.counts = np.zeros((self.rows, self.columns), dtype=np.int64)
+        self.total = 0
+        self.levels = {}
+
+    def _cells(self, xy):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        inside = ((xy[:, 0] >= 0) & (xy[:, 0] < self.width) &
+                  (xy[:, 1] >= 0) & (xy[:, 1] < self.height))
+        cells = (xy[inside] // self.cell).astype(np.intp)
+        rows = np.minimum(cells[:, 1], self.rows - 1)
+        columns = np.minimum(cells[:, 0], self.columns - 1)
+        return rows, columns
+
+    def _update(self, xy, sign):
+        rows, columns = self._cells(xy)
+        if not len(rows):
+            return
+        if len(rows) < self.counts.size // 64:
+            # A few clicks: touching the cells beats a grid-sized bincount
+            for level, counts in self.levels.items():
+                if level:
+                    np.add.at(counts, (rows >> level, columns >> level), sign)
+            np.add.at(self.counts, (rows, columns), sign)
+        else:
+            self.counts.reshape(-1)[...] += sign * np.bincount(rows * self.columns + columns,
+                                                               minlength=self.counts.size)
+            self.levels.clear()
+        self.total += sign * len(rows)
+
+    def add(self, xy):
+        self._update(xy, 1)
+
+    def remove(self, xy):
+        self._update(xy, -1)
+
+    def clear(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.levels.clear()
+
+    def rebuild(self, xy):
+        self.clear()
+        self.add(xy)
+
+    def cell_size(self, level):
+        return self.cell * 2 ** level
+
+    def level_for(self, scale, min_cell_px):
+        """Finest level whose cells are at least min_cell_px on screen at scale"""
+        level = 0
+        while self.cell_size(level) * scale < min_cell_px and max(self.rows, self.columns) >> level > 1:
+            level += 1
+        return level
+
+    def level(self, level):
+        """Counts summed over blocks of 2**level x 2**level cells"""
+        counts = self.levels.get(level)
+        if counts is not None:
+            return counts
+        if level == 0:
+            counts = self.counts
+        else:
+            finer = self.level(level - 1)
+            rows, columns = finer.shape
+            finer = np.pad(finer, ((0, rows % 2), (0, columns % 2)))
+            counts = finer.reshape(finer.shape[0] // 2, 2, finer.shape[1] // 2, 2).sum(axis=(1, 3))
+        self.levels[level] = counts
+        return counts
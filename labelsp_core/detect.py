@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .imageinfo import read_image_info
+
+# Expected target radius in pixels; also the minimum distance between proposals
+DEFAULT_RADIUS = 6
+# Proposals must stand out this many robust standard deviations from the tile
+DEFAULT_SENSITIVITY = 4.0
+TILE_SIZE = 1024
+POLARITIES = ("bright", "dark")
+
+
+def _box_means(image, sizes):
+    """Means over size x size windows (sizes odd), all from one integral image"""
+    pad = max(sizes) // 2
+    padded = np.pad(image, pad, mode='reflect')
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+    np.cumsum(padded, axis=0, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    height, width = image.shape
+    means = []
+    for size in sizes:
+        a = pad - size // 2
+        b = a + size
+        window = (integral[b:b + height, b:b + width] - integral[a:a + height, b:b + width]
+                  - integral[b:b + height, a:a + width] + integral[a:a + height, a:a + width])
+        means.append((window / (size * size)).astype(np.float32))
+    return means
+
+
+def _max_filter(image, radius):
+    """Maximum over a (2 * radius + 1) square window, one axis at a time
+
+    Per axis, maxima over power-of-two runs are built by doubling, and the
+    window is covered by two overlapping runs: O(log radius) passes.
+    """
+    size = 2 * radius + 1
+    out = image
+    for axis in (0, 1):
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (radius, radius)
+        run = np.pad(out, pad, mode='edge')
+        length = 1
+        while length * 2 <= size:
+            count = run.shape[axis] - length
+            run = np.maximum(_slice(run, axis, 0, count), _slice(run, axis, length, length + count))
+            length *= 2
+        extent = out.shape[axis]
+        out = np.maximum(_slice(run, axis, 0, extent), _slice(run, axis, size - length, size - length + extent))
+    return out
+
+
+def _slice(array, axis, start, stop):
+    return array[start:stop] if axis == 0 else array[:, start:stop]
+
+
+def local_maxima(gray, radius=DEFAULT_RADIUS, polarity="bright", sensitivity=DEFAULT_SENSITIVITY):
+    """(rows, cols) of blob centres in a 2D array
+
+    A blob is a local maximum of the difference between a light blur and
+    the local background, with a contrast of at least ``sensitivity``
+    robust standard deviations of that difference over the array.
+    """
+    gray = np.asarray(gray, dtype=np.float32)
+    if polarity == "dark":
+        gray = -gray
+    blurred, background = _box_means(gray, (2 * (radius // 2) + 1, 4 * radius + 1))
+    response = blurred - background
+
+    # Median absolute deviation of a subsample is plenty for a threshold
+    sample = response[::4, ::4]
+    median = float(np.median(sample))
+    threshold = median + sensitivity * 1.4826 * float(np.median(np.abs(sample - median)))
+    peaks = (response == _max_filter(response, radius)) & (response > max(threshold, 0.0))
+    rows, cols = np.nonzero(peaks)
+
+    # Plateaus give several equal maxima, keep one per radius-sized cell
+    if len(rows):
+        cell = (rows // max(1, radius)) * (gray.shape[1] // max(1, radius) + 1) + cols // max(1, radius)
+        _, first = np.unique(cell, return_index=True)
+        rows, cols = rows[first], cols[first]
+    return rows, cols
+
+
+def tile_windows(width, height, tile_size=TILE_SIZE, margin=0):
+    """[(core, read)] tiles covering an image
+
+    core (x0, y0, x1, y1) is the part a tile reports points for, read
+    (x, y, w, h) adds a margin so filters near the core edges see real
+    neighbours and every point is found by exactly one tile.
+    """
+    windows = []
+    for y0 in range(0, height, tile_size):
+        for x0 in range(0, width, tile_size):
+            x1, y1 = min(width, x0 + tile_size), min(height, y0 + tile_size)
+            rx, ry = max(0, x0 - margin), max(0, y0 - margin)
+            rw, rh = min(width, x1 + margin) - rx, min(height, y1 + margin) - ry
+            windows.append(((x0, y0, x1, y1), (rx, ry, rw, rh)))
+    return windows
+
+
+# Datasets opened by this worker process, by path
+_datasets = {}
+
+
+def _read_gray(path, window):
+    import rasterio
+    from rasterio.errors import NotGeoreferencedWarning
+    from rasterio.windows import Window
+
+    ds = _datasets.get(path)
+    if ds is None:
+        # PNG/JPEG go through GDAL as well, just without georeferencing
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", NotGeoreferencedWarning)
+            ds = _datasets[path] = rasterio.open(path)
+    bands = list(range(1, min(ds.count, 3) + 1))
+    data = ds.read(bands, window=Window(*window), out_dtype=np.float32)
+    return data.mean(axis=0)
+
+
+def detect_tile(path, core, read, radius=DEFAULT_RADIUS, polarity="bright", sensitivity=DEFAULT_SENSITIVITY):
+    """Proposals of one tile as an (n, 2) array of image pixel coordinates"""
+    rows, cols = local_maxima(_read_gray(path, read), radius, polarity, sensitivity)
+    x = cols + read[0] + 0.5
+    y = rows + read[1] + 0.5
+    x0, y0, x1, y1 = core
+    inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+    return np.column_stack((x[inside], y[inside])).astype(np.float64)
+
+
+def propose_points(path, radius=DEFAULT_RADIUS, polarity="bright", sensitivity=DEFAULT_SENSITIVITY,
+                   tile_size=TILE_SIZE, jobs=0, cancelled=None):
+    """Detect point proposals tile by tile in worker processes
+
+    Yields (tiles done, tile count, xy) as each tile finishes, so callers
+    can show results while the rest of the image is still being searched.
+    Workers are spawned, never forked, so this is safe to call from a
+    process that runs Qt or other threads. Stops early once cancelled()
+    returns True.
+    """
+    if polarity not in POLARITIES:
+        raise ValueError(f"未知的目标类型: {polarity}")
+    info = read_image_info(path)
+    windows = tile_windows(info.width, info.height, tile_size, margin=4 * radius + 1)
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(windows)))
+    # Keep only a few tiles queued per worker, so cancelling is immediate
+    in_flight = 2 * workers
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        queued = iter(windows)
+        pending = set()
+        done = 0
+        while True:
+            for core, read in queued:
+                pending.add(pool.submit(detect_tile, path, core, read, radius, polarity, sensitivity))
+                if len(pending) >= in_flight:
+                    break
+            if not pending:
+                return
+            finished, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancelled is not None and cancelled():
+                return
+            for future in finished:
+                done += 1
+                yield done, len(windows), future.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,182 @@
+import csv
+import os
+
+import numpy as np
+
+CHUNK_ROWS = 65536
+BOX_HEADERS = ("Box Width", "Box Height")
+
+
+def _no_progress(percent, message=""):
+    pass
+
+
+def annotation_table(xy, width, height, lonlat=None, wh=None):
+    """Column headers and column arrays for an annotation export
+
+    Box sizes get their own columns when any point has one; points
+    without a box leave those cells empty.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    headers = ["X", "Y", "Normalized X", "Normalized Y"]
+    columns = [xy[:, 0], xy[:, 1], xy[:, 0] / width, xy[:, 1] / height]
+    if lonlat is not None:
+        headers.extend(["Longitude", "Latitude"])
+        columns.extend([np.asarray(lonlat[0], dtype=np.float64),
+                        np.asarray(lonlat[1], dtype=np.float64)])
+    if wh is not None and np.isfinite(wh).any():
+        wh = np.asarray(wh, dtype=np.float64).reshape(-1, 2)
+        headers.extend(BOX_HEADERS)
+        columns.extend([wh[:, 0], wh[:, 1]])
+    return headers, columns
+
+
+def _chunks(count, report):
+    for start in range(0, count, CHUNK_ROWS):
+        report(100 * start / max(count, 1), "正在导出...")
+        yield start, min(start + CHUNK_ROWS, count)
+
+
+def _rows(columns, start, stop):
+    # Rows as Python lists with NaN turned into None (empty cells)
+    block = np.column_stack([column[start:stop] for column in columns])
+    missing = np.isnan(block)
+    block = block.astype(object)
+    block[missing] = None
+    return block.tolist()
+
+
+def write_xlsx(path, headers, columns, progress=None):
+    """Stream rows into a write-only workbook, styling only the header"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    report = progress or _no_progress
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Annotations")
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 15
+
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+    header_alignment = Alignment(horizontal="center")
+    thin_border = Border(left=Side(style='thin'),
+                         right=Side(style='thin'),
+                         top=Side(style='thin'),
+                         bottom=Side(style='thin'))
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+        header_row.append(cell)
+    ws.append(header_row)
+
+    for start, stop in _chunks(len(columns[0]), report):
+        for row in _rows(columns, start, stop):
+            ws.append(row)
+    report(100, "正在保存...")
+    wb.save(path)
+
+
+def write_csv(path, headers, columns, progress=None):
+    report = progress or _no_progress
+    if has_arrow():
+        _write_csv_arrow(path, headers, columns, report)
+        return
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for start, stop in _chunks(len(columns[0]), report):
+            writer.writerows(_rows(columns, start, stop))
+
+
+def _write_csv_arrow(path, headers, columns, report):
+    # pyarrow formats floats in C++, several times faster than the csv module
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    schema = pa.schema([(header, pa.float64()) for header in headers])
+    with open(path, 'w', newline='') as csvfile:
+        csv.writer(csvfile).writerow(headers)
+    with open(path, 'ab') as sink:
+        options = pa_csv.WriteOptions(include_header=False)
+        with pa_csv.CSVWriter(sink, schema, write_options=options) as writer:
+            for start, stop in _chunks(len(columns[0]), report):
+                # from_pandas turns NaN into nulls, written as empty fields
+                writer.write_batch(pa.record_batch(
+                    [pa.array(column[start:stop], from_pandas=True) for column in columns], schema=schema))
+
+
+def write_npy(path, headers, columns, progress=None):
+    """Write a structured .npy array with one field per column"""
+    report = progress or _no_progress
+    dtype = np.dtype([(header, np.float64) for header in headers])
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(len(columns[0]),))
+    for start, stop in _chunks(len(columns[0]), report):
+        for header, column in zip(headers, columns):
+            out[header][start:stop] = column[start:stop]
+    out.flush()
+    del out
+
+
+def write_arrow(path, headers, columns, progress=None):
+    """Write Parquet or Feather (by extension) one record batch per chunk"""
+    import pyarrow as pa
+
+    report = progress or _no_progress
+    schema = pa.schema([(header, pa.float64()) for header in headers])
+    parquet = path.lower().endswith('.parquet')
+    if parquet:
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema)
+    else:
+        sink = pa.OSFile(path, 'wb')
+        writer = pa.ipc.new_file(sink, schema)
+    try:
+        for start, stop in _chunks(len(columns[0]), report):
+            batch = pa.record_batch([pa.array(column[start:stop]) for column in columns], schema=schema)
+            if parquet:
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+    finally:
+        writer.close()
+        if not parquet:
+            sink.close()
+
+
+def has_arrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+WRITERS = {
+    '.xlsx': write_xlsx,
+    '.csv': write_csv,
+    '.npy': write_npy,
+    '.parquet': write_arrow,
+    '.feather': write_arrow,
+}
+
+
+def write_table(path, headers, columns, progress=None):
+    """Write an annotation table in the format given by the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    writer = WRITERS.get(extension)
+    if writer is None:
+        raise ValueError(f"不支持的导出格式: {extension}")
+    try:
+        writer(path, headers, columns, progress)
+    except BaseException:
+        # Don't leave a truncated file behind after a failure or cancel
+        if os.path.exists(path):
+            os.remove(path)
+        raise
@@ -0,0 +1,100 @@
+import functools
+
+import numpy as np
+
+
+def apply_affine(transform, x, y):
+    """Apply an affine pixel->CRS transform to whole coordinate arrays"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return (transform.a * x + transform.b * y + transform.c,
+            transform.d * x + transform.e * y + transform.f)
+
+
+def is_north_up(transform):
+    """Whether an affine transform maps pixel rows straight down and columns straight east"""
+    return transform.b == 0 and transform.d == 0 and transform.a > 0 and transform.e < 0
+
+
+def pixels_to_crs(transform, transformer, x, y):
+    """Convert pixel coordinate arrays to a target CRS
+
+    transformer is the pyproj Transformer from the raster CRS to the target,
+    or None when they are the same. Points pyproj cannot convert come back
+    as inf and are returned as NaN.
+    """
+    x, y = apply_affine(transform, x, y)
+    if transformer is not None:
+        x, y = transformer.transform(x, y)
+        x = np.where(np.isfinite(x), x, np.nan)
+        y = np.where(np.isfinite(y), y, np.nan)
+    return x, y
+
+
+def crs_to_pixels(transform, transformer, x, y):
+    """Inverse of pixels_to_crs: map coordinate arrays in a source CRS to pixels
+
+    transformer goes from the source CRS to the raster CRS, None when they
+    are the same. Points that cannot be converted come back as NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if transformer is not None:
+        x, y = transformer.transform(x, y)
+        x = np.where(np.isfinite(x), x, np.nan)
+        y = np.where(np.isfinite(y), y, np.nan)
+    return apply_affine(~transform, x, y)
+
+
+def pixels_to_lonlat(transform, transformer, x, y):
+    """Convert pixel coordinate arrays to lon/lat, transformer as from wgs84_transformer"""
+    return pixels_to_crs(transform, transformer, x, y)
+
+
+def parse_crs(value):
+    """A rasterio CRS from a CRS, an EPSG code or any string GDAL understands
+
+    Raises ValueError for input that names no CRS.
+    """
+    from rasterio.crs import CRS
+    from rasterio.errors import CRSError
+
+    if isinstance(value, CRS):
+        return value
+    try:
+        return CRS.from_user_input(value.strip() if isinstance(value, str) else value)
+    except CRSError as e:
+        raise ValueError(f"无法识别的坐标系: {value}") from e
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_transformer(source_wkt, target_wkt):
+    import pyproj
+
+    return pyproj.Transformer.from_crs(pyproj.CRS.from_wkt(source_wkt), pyproj.CRS.from_wkt(target_wkt),
+                                       always_xy=True)
+
+
+def crs_transformer(source, target):
+    """pyproj Transformer from source to target CRS, None if they are equal
+
+    Transformers are cached per CRS pair, building one costs far more than
+    transforming a few thousand points with it.
+    """
+    source, target = parse_crs(source), parse_crs(target)
+    if source == target:
+        return None
+    return _cached_transformer(source.to_wkt(), target.to_wkt())
+
+
+def wgs84_transformer(crs):
+    """pyproj Transformer from a projected CRS to WGS84, None if crs is geographic"""
+    if not crs or crs.is_geographic:
+        return None
+    return crs_transformer(crs, "EPSG:4326")
+
+
+def utm_crs(lon, lat):
+    """EPSG code of the WGS84 UTM zone containing lon/lat, as "EPSG:<code>" """
+    zone = min(60, max(1, int((lon + 180) // 6) + 1))
+    return f"EPSG:{(32600 if lat >= 0 else 32700) + zone}"
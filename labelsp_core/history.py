@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class Change:
+    """One undoable step, stored as the points it removed, added and confirmed
+
+    Points are kept as ``AnnotationStore.take`` records, so a bulk delete or an
+    import of any size is a single entry of a few arrays and undoing it is a
+    single store call in each direction.
+    """
+
+    def __init__(self, label, removed=None, added=None, confirmed_ids=None):
+        self.label = label
+        self.removed = removed
+        self.added = added
+        self.confirmed_ids = confirmed_ids
+
+    def __len__(self):
+        """Number of points the change touched"""
+        if self.confirmed_ids is not None:
+            return len(self.confirmed_ids)
+        return max(len(records["ids"]) for records in (self.removed, self.added) if records is not None)
+
+    def undo(self, store):
+        if self.added is not None:
+            store.remove_ids(self.added["ids"])
+        if self.confirmed_ids is not None:
+            store.set_confirmed(self.confirmed_ids, False)
+        if self.removed is not None:
+            store.add_many(self.removed["xy"], self.removed["confirmed"], self.removed["ids"],
+                           self.removed.get("wh"))
+
+    def redo(self, store):
+        if self.removed is not None:
+            store.remove_ids(self.removed["ids"])
+        if self.confirmed_ids is not None:
+            store.set_confirmed(self.confirmed_ids, True)
+        if self.added is not None:
+            store.add_many(self.added["xy"], self.added["confirmed"], self.added["ids"], self.added.get("wh"))
+
+
+class History:
+    """Undo/redo stack for edits made to an AnnotationStore
+
+    Edits that should be undoable go through the methods here instead of the
+    store. Undo and redo replay changes with their original ids, so later
+    entries keep referring to the right points.
+    """
+
+    def __init__(self, store, limit=200):
+        self.store = store
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def _push(self, change):
+        self.undo_stack.append(change)
+        del self.undo_stack[:-self.limit]
+        self.redo_stack.clear()
+        return change
+
+    def reset(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def add_points(self, xy, confirmed=False, label="add", wh=None):
+        ids = self.store.add_many(xy, confirmed, wh=wh)
+        if len(ids):
+            self._push(Change(label, added=self.store.take(self.store.rows_of(ids))))
+        return ids
+
+    def add_point(self, x, y, confirmed=False):
+        return int(self.add_points(np.array([[x, y]]), confirmed)[0])
+
+    def adopt(self, ids, label="propose"):
+        """Record points that were added to the store directly as one entry
+
+        For points that arrive in batches, e.g. streamed detector results,
+        which should still be undone in one step. Ids that were removed
+        in the meantime are skipped.
+        """
+        added = self.store.take(self.store.rows_of(ids))
+        if len(added["ids"]):
+            self._push(Change(label, added=added))
+        return added["ids"]
+
+    def remove(self, ids, label="delete"):
+        removed = self.store.remove_ids(ids)
+        if len(removed["ids"]):
+            self._push(Change(label, removed=removed))
+        return removed
+
+    def confirm_all(self):
+        confirmed = self.store.confirm_all()
+        if len(confirmed["ids"]):
+            self._push(Change("confirm", confirmed_ids=confirmed["ids"]))
+        return confirmed
+
+    def clear(self):
+        return self.remove(self.store.ids, label="clear")
+
+    def replace(self, xy, confirmed=True, label="import", wh=None):
+        """Swap every point for xy (boxes of size wh) as a single entry"""
+        removed = self.store.remove_ids(self.store.ids)
+        ids = self.store.add_many(xy, confirmed, wh=wh)
+        added = self.store.take(self.store.rows_of(ids))
+        self._push(Change(label, removed=removed, added=added))
+        return ids
+
+    def undo(self):
+        if not self.undo_stack:
+            return None
+        change = self.undo_stack.pop()
+        change.undo(self.store)
+        self.redo_stack.append(change)
+        return change
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        change = self.redo_stack.pop()
+        change.redo(self.store)
+        self.undo_stack.append(change)
+        return change
@@ -0,0 +1,92 @@
+import struct
+import warnings
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+class ImageInfo:
+    """Pixel size and georeferencing of an image, read from its header"""
+
+    def __init__(self, path, width, height, transform=None, crs=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.transform = transform
+        self.crs = crs
+
+
+def _png_size(f):
+    header = f.read(24)
+    if header[:8] != b'\x89PNG\r\n\x1a\n' or header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def _bmp_size(f):
+    header = f.read(26)
+    if header[:2] != b'BM':
+        return None
+    width, height = struct.unpack('<ii', header[18:26])
+    return width, abs(height)
+
+
+def _jpeg_size(f):
+    if f.read(2) != b'\xff\xd8':
+        return None
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = f.read(1)
+        while marker == b'\xff':
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        # Standalone markers carry no length
+        if code == 0x01 or 0xd0 <= code <= 0xd9:
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        # SOFn frames, except DHT/JPG/DAC which share the range
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _raster_info(path):
+    import rasterio
+    from rasterio.errors import NotGeoreferencedWarning
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+        with rasterio.open(path) as ds:
+            return ImageInfo(path, ds.width, ds.height, ds.transform, ds.crs)
+
+
+def read_image_info(path):
+    """Read size (and georeferencing for TIFFs) without decoding pixels"""
+    if path.lower().endswith(TIFF_EXTENSIONS):
+        return _raster_info(path)
+    with open(path, 'rb') as f:
+        for reader in (_png_size, _jpeg_size, _bmp_size):
+            f.seek(0)
+            size = reader(f)
+            if size is not None:
+                return ImageInfo(path, size[0], size[1])
+    return _raster_info(path)
+
+
+def read_image_infos(paths, progress=None):
+    """ImageInfo for every readable image in paths, unreadable ones are skipped"""
+    infos = []
+    for i, path in enumerate(paths):
+        if progress is not None and i % 64 == 0:
+            progress(100 * i / max(len(paths), 1), "正在读取图像信息...")
+        try:
+            infos.append(read_image_info(path))
+        except Exception as e:
+            print(f"Warning: Could not read image info from {path}: {str(e)}")
+    return infos
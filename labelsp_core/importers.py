@@ -0,0 +1,197 @@
+import csv
+import itertools
+import os
+import warnings
+
+import numpy as np
+
+from .export import BOX_HEADERS
+from .geo import crs_to_pixels, crs_transformer
+
+CHUNK_ROWS = 65536
+# Lower-case header names recognized as geographic / projected coordinates
+LON_HEADERS = ("longitude", "lon", "lng", "long", "经度")
+LAT_HEADERS = ("latitude", "lat", "纬度")
+EASTING_HEADERS = ("easting", "east", "e", "x坐标", "东坐标")
+NORTHING_HEADERS = ("northing", "north", "n", "y坐标", "北坐标")
+
+
+def _no_progress(percent, message=""):
+    pass
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _csv_headers(line):
+    # Excel writes "CSV UTF-8" files with a byte order mark in front of the first header
+    headers = next(csv.reader([line]), [])
+    if headers:
+        headers[0] = headers[0].lstrip('\ufeff')
+    return headers
+
+
+def _parse_csv_chunk(lines, width):
+    # Fast path: numpy's C parser on the whole chunk
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            block = np.loadtxt(lines, delimiter=',', ndmin=2, dtype=np.float64)
+        if block.shape[1] == width:
+            return block
+    except ValueError:
+        pass
+    # Blank cells, text or ragged rows: parse this chunk row by row
+    block = np.full((len(lines), width), np.nan)
+    for i, row in enumerate(csv.reader(lines)):
+        values = [_to_float(value) for value in row[:width]]
+        block[i, :len(values)] = values
+    return block
+
+
+def read_csv_table(path, progress=None):
+    """Read a CSV annotation file as (headers, float array), NaN for non-numbers"""
+    report = progress or _no_progress
+    total = max(os.path.getsize(path), 1)
+    chunks = []
+    with open(path, 'r', newline='') as csvfile:
+        header_line = csvfile.readline()
+        headers = _csv_headers(header_line)
+        width = max(len(headers), 2)
+        done = len(header_line)
+        while True:
+            lines = list(itertools.islice(csvfile, CHUNK_ROWS))
+            if not lines:
+                break
+            done += sum(len(line) for line in lines)
+            lines = [line for line in lines if line.strip()]
+            if lines:
+                chunks.append(_parse_csv_chunk(lines, width))
+            report(100 * done / total, "正在读取CSV...")
+    data = np.concatenate(chunks) if chunks else np.empty((0, width))
+    return headers, data
+
+
+def read_xlsx_table(path, progress=None):
+    """Read the active sheet of a workbook as (headers, float array)"""
+    import openpyxl
+
+    report = progress or _no_progress
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = [str(value) if value is not None else "" for value in next(rows, ())]
+        width = max(len(headers), 2)
+        total = max((ws.max_row or 0) - 1, 1)
+        chunks = []
+        done = 0
+        while True:
+            batch = list(itertools.islice(rows, CHUNK_ROWS))
+            if not batch:
+                break
+            block = np.full((len(batch), width), np.nan)
+            for i, row in enumerate(batch):
+                for j, value in enumerate(row[:width]):
+                    if isinstance(value, (int, float)):
+                        block[i, j] = value
+            chunks.append(block)
+            done += len(batch)
+            report(100 * done / total, "正在读取Excel...")
+    finally:
+        wb.close()
+    data = np.concatenate(chunks) if chunks else np.empty((0, width))
+    return headers, data
+
+
+def read_table(path, progress=None):
+    if path.lower().endswith('.xlsx'):
+        return read_xlsx_table(path, progress)
+    if path.lower().endswith('.csv'):
+        return read_csv_table(path, progress)
+    raise ValueError(f"不支持的导入格式: {os.path.splitext(path)[1]}")
+
+
+def read_headers(path):
+    """Column headers of a CSV or Excel annotation file, without reading the rows"""
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', newline='') as csvfile:
+            return _csv_headers(csvfile.readline())
+    if path.lower().endswith('.xlsx'):
+        import openpyxl
+
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            row = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+        finally:
+            wb.close()
+        return [str(value) if value is not None else "" for value in row]
+    raise ValueError(f"不支持的导入格式: {os.path.splitext(path)[1]}")
+
+
+def _find_column(headers, names):
+    for i, header in enumerate(headers):
+        if header.strip().lower() in names:
+            return i
+    return None
+
+
+def find_geo_columns(headers):
+    """(x column, y column, "lonlat" or "projected") of recognized geo headers, or None"""
+    for xs, ys, kind in ((LON_HEADERS, LAT_HEADERS, "lonlat"), (EASTING_HEADERS, NORTHING_HEADERS, "projected")):
+        x, y = _find_column(headers, xs), _find_column(headers, ys)
+        if x is not None and y is not None:
+            return x, y, kind
+    return None
+
+
+def read_points(path, progress=None):
+    """Pixel X/Y from the first two columns, rows without both numbers dropped"""
+    headers, data = read_table(path, progress)
+    xy = data[:, :2]
+    return xy[np.isfinite(xy).all(axis=1)]
+
+
+def read_boxes(path, progress=None):
+    """Like read_points, plus the box sizes as (xy, wh)
+
+    wh comes from the "Box Width"/"Box Height" columns written by the
+    exporter and is NaN for points without a box or files without them.
+    """
+    headers, data = read_table(path, progress)
+    valid = np.isfinite(data[:, :2]).all(axis=1)
+    wh = np.full((len(data), 2), np.nan)
+    for i, name in enumerate(BOX_HEADERS):
+        if name in headers:
+            wh[:, i] = data[:, headers.index(name)]
+    return data[valid, :2], wh[valid]
+
+
+def read_geo_boxes(path, columns, source_crs, transform, raster_crs, width, height, progress=None):
+    """Points of a file with geographic or projected coordinates, mapped to pixels
+
+    columns are the (x, y) column indices, in source_crs; lon/lat columns
+    are x = longitude. The whole coordinate arrays go through one pyproj
+    transform into raster_crs and one inverse affine transform, then points
+    outside the width x height raster are dropped in one mask. Returns
+    (xy, wh, dropped), wh as in read_boxes.
+    """
+    headers, data = read_table(path, progress)
+    coords = data[:, list(columns)]
+    valid = np.isfinite(coords).all(axis=1)
+    coords = coords[valid]
+    wh = np.full((len(data), 2), np.nan)
+    for i, name in enumerate(BOX_HEADERS):
+        if name in headers:
+            wh[:, i] = data[:, headers.index(name)]
+    wh = wh[valid]
+
+    if progress is not None:
+        progress(100, "正在转换坐标...")
+    x, y = crs_to_pixels(transform, crs_transformer(source_crs, raster_crs), coords[:, 0], coords[:, 1])
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    return np.column_stack((x[inside], y[inside])), wh[inside], int(len(data) - inside.sum())
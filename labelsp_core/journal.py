@@ -0,0 +1,323 @@
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+JOURNAL_SUFFIX = ".labelsp.journal"
+MAGIC = b"LSPJ\x01\x00\x00\x00"
+
+OP_ADD = 1
+OP_REMOVE = 2
+OP_CONFIRM = 3
+OP_CLEAR = 4
+# An OP_ADD whose points also carry a box size
+OP_ADD_BOX = 5
+
+# op, point count, crc32 of the payload
+RECORD_HEADER = struct.Struct("<BII")
+# Bytes per point in the payload of each op
+POINT_BYTES = {OP_ADD: 8 + 16 + 1, OP_REMOVE: 8, OP_CONFIRM: 8 + 1, OP_CLEAR: 0, OP_ADD_BOX: 8 + 16 + 1 + 16}
+
+
+def journal_path(image_path):
+    return image_path + JOURNAL_SUFFIX
+
+
+def _encode(op, ids=None, xy=None, confirmed=None, wh=None):
+    parts = []
+    count = 0
+    if ids is not None:
+        count = len(ids)
+        parts.append(np.ascontiguousarray(ids, dtype='<i8').tobytes())
+    if xy is not None:
+        parts.append(np.ascontiguousarray(xy, dtype='<f8').tobytes())
+    if confirmed is not None:
+        parts.append(np.ascontiguousarray(confirmed, dtype=np.uint8).tobytes())
+    if wh is not None:
+        parts.append(np.ascontiguousarray(wh, dtype='<f8').tobytes())
+    payload = b"".join(parts)
+    return RECORD_HEADER.pack(op, count, zlib.crc32(payload)) + payload
+
+
+def _encode_add(records):
+    # Plain points keep the smaller OP_ADD records, and old journals stay readable
+    wh = records.get("wh")
+    if wh is not None and np.isfinite(wh).any():
+        return _encode(OP_ADD_BOX, records["ids"], records["xy"], records["confirmed"], wh)
+    return _encode(OP_ADD, records["ids"], records["xy"], records["confirmed"])
+
+
+def encode_event(event, records):
+    """Journal record for an AnnotationStore listener event, None if not journaled"""
+    if event == "add":
+        return _encode_add(records)
+    if event == "remove":
+        return _encode(OP_REMOVE, records["ids"])
+    if event == "confirm":
+        return _encode(OP_CONFIRM, records["ids"], confirmed=records["confirmed"])
+    if event == "clear":
+        return _encode(OP_CLEAR)
+    return None
+
+
+def encode_snapshot(snapshot):
+    return MAGIC + _encode_add(snapshot)
+
+
+def _last_per_id(ids, seq):
+    """Unique ids and, for each, the index of its entry with the highest seq"""
+    order = np.lexsort((seq, ids))
+    ids = ids[order]
+    last = np.flatnonzero(np.append(ids[1:] != ids[:-1], True))
+    return ids[last], order[last]
+
+
+def _gather(buf, starts, lengths):
+    """Concatenate the byte ranges [start, start + length) of buf"""
+    total = int(lengths.sum())
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return buf[shift + np.arange(total)]
+
+
+def _resolve(ids, seq, base_ids):
+    """Positions in base_ids of the latest entry per id, restricted to known ids"""
+    ids, rows = _last_per_id(ids, seq)
+    pos = np.searchsorted(base_ids, ids)
+    hit = pos < len(base_ids)
+    hit[hit] = base_ids[pos[hit]] == ids[hit]
+    return pos[hit], rows[hit]
+
+
+def read_journal(path):
+    """Replay a journal into the points it leaves behind
+
+    Returns (records, next_id, ops) with records shaped like
+    ``AnnotationStore.take``. Reading stops at the first truncated or
+    corrupt record, which is where a crash interrupted the last write.
+    Instead of applying ops one by one, every point is tagged with the
+    sequence number of its op and the final state is resolved with a few
+    sorts, so replay cost barely depends on how the edits were batched.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("不是有效的标注日志文件")
+
+    # The Python loop only validates and locates records
+    located = {OP_ADD: ([], [], []), OP_ADD_BOX: ([], [], []), OP_REMOVE: ([], [], []), OP_CONFIRM: ([], [], [])}
+    last_clear = -1
+    offset = len(MAGIC)
+    seq = 0
+    unpack = RECORD_HEADER.unpack_from
+    while offset + RECORD_HEADER.size <= len(data):
+        op, count, crc = unpack(data, offset)
+        start = offset + RECORD_HEADER.size
+        end = start + count * POINT_BYTES.get(op, 0)
+        if op not in POINT_BYTES or end > len(data) or zlib.crc32(data[start:end]) != crc:
+            break
+        if op == OP_CLEAR:
+            last_clear = seq
+        elif count:
+            starts, counts, seqs = located[op]
+            starts.append(start)
+            counts.append(count)
+            seqs.append(seq)
+        offset = end
+        seq += 1
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    def fields(op, *sizes):
+        starts, counts, seqs = (np.array(values, dtype=np.int64) for values in located[op])
+        point_seq = np.repeat(seqs, counts)
+        arrays = []
+        # Each payload holds its fields one after another, count values each
+        for skip, size in zip(np.cumsum((0,) + sizes[:-1]), sizes):
+            arrays.append(_gather(buf, starts + skip * counts, size * counts))
+        return point_seq, arrays
+
+    empty = {"ids": np.empty(0, dtype=np.int64), "xy": np.empty((0, 2)),
+             "confirmed": np.empty(0, dtype=bool), "wh": np.empty((0, 2))}
+    if not located[OP_ADD][0] and not located[OP_ADD_BOX][0]:
+        return empty, 0, seq
+
+    add_seq, (raw_ids, raw_xy, raw_flags) = fields(OP_ADD, 8, 16, 1)
+    raw_wh = np.full(len(add_seq) * 16, 0xff, dtype=np.uint8)
+    if located[OP_ADD_BOX][0]:
+        box_seq, box_fields = fields(OP_ADD_BOX, 8, 16, 1, 16)
+        add_seq = np.concatenate([add_seq, box_seq])
+        raw_ids, raw_xy, raw_flags, raw_wh = (np.concatenate(pair) for pair in
+                                              zip((raw_ids, raw_xy, raw_flags, raw_wh), box_fields))
+    add_ids = raw_ids.view('<i8').astype(np.int64)
+    next_id = int(add_ids.max()) + 1
+
+    ids, rows = _last_per_id(add_ids, add_seq)
+    added_at = add_seq[rows]
+    xy = raw_xy.view('<f8').reshape(-1, 2)[rows].astype(np.float64)
+    confirmed = raw_flags[rows].astype(bool)
+    # Points from plain adds were filled with all-ones bytes, a NaN
+    wh = raw_wh.view('<f8').reshape(-1, 2)[rows].astype(np.float64)
+
+    # A point survives if nothing removed it after it was last added
+    removed_at = np.full(len(ids), last_clear, dtype=np.int64)
+    if located[OP_REMOVE][0]:
+        remove_seq, (raw_ids,) = fields(OP_REMOVE, 8)
+        pos, rows = _resolve(raw_ids.view('<i8').astype(np.int64), remove_seq, ids)
+        removed_at[pos] = np.maximum(removed_at[pos], remove_seq[rows])
+
+    if located[OP_CONFIRM][0]:
+        confirm_seq, (raw_ids, raw_flags) = fields(OP_CONFIRM, 8, 1)
+        pos, rows = _resolve(raw_ids.view('<i8').astype(np.int64), confirm_seq, ids)
+        later = confirm_seq[rows] > added_at[pos]
+        confirmed[pos[later]] = raw_flags[rows[later]].astype(bool)
+
+    alive = added_at > removed_at
+    records = {"ids": ids[alive], "xy": xy[alive], "confirmed": confirmed[alive], "wh": wh[alive]}
+    return records, next_id, seq
+
+
+class Journal:
+    """Append-only log of an AnnotationStore's changes, written off the GUI thread
+
+    The store listener only encodes the change and queues it; a writer thread
+    appends, flushes whenever the queue runs dry and fsyncs at most once per
+    ``sync_interval`` seconds. Once the log has grown to ``compact_ratio``
+    times the size of a snapshot of the store, the next change queues a
+    snapshot and the writer rewrites the file from it. After a failed write
+    the log is incomplete, so the writer drops changes until the next
+    snapshot, which is retried every ``retry_interval`` seconds.
+    """
+
+    def __init__(self, path, store, sync_interval=1.0, compact_ratio=4, min_compact_bytes=1 << 20,
+                 retry_interval=5.0):
+        self.path = path
+        self.store = store
+        self.sync_interval = sync_interval
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+        self.retry_interval = retry_interval
+        self.queue = queue.Queue()
+        self.appended_bytes = 0
+        self.snapshot_bytes = 0
+        self.error = None
+        # Set by the writer when a write failed, cleared by the next snapshot
+        self.broken = False
+        self.last_compact = 0.0
+        self.thread = threading.Thread(target=self._run, name="labelsp-journal", daemon=True)
+
+    def start(self):
+        """Rewrite the journal from the store's current points and start logging"""
+        self._compact()
+        self.store.listeners.append(self.record)
+        self.thread.start()
+
+    def record(self, event, records):
+        data = encode_event(event, records)
+        if data is None:
+            return
+        self.queue.put(("append", data))
+        self.appended_bytes += len(data)
+        if self.appended_bytes > max(self.min_compact_bytes, self.compact_ratio * self.snapshot_bytes):
+            self._compact()
+        elif self.broken and time.monotonic() - self.last_compact > self.retry_interval:
+            self._compact()
+
+    def _compact(self):
+        snapshot = self.store.snapshot()
+        op = OP_ADD_BOX if np.isfinite(snapshot["wh"]).any() else OP_ADD
+        self.snapshot_bytes = len(MAGIC) + RECORD_HEADER.size + len(snapshot["ids"]) * POINT_BYTES[op]
+        self.appended_bytes = 0
+        self.last_compact = time.monotonic()
+        self.queue.put(("compact", snapshot))
+
+    def close(self, remove=False, wait=True):
+        """Stop logging; the writer then drains the queue, fsyncs and exits
+
+        With remove the file is deleted instead, for stores that ended up empty.
+        """
+        if self.record in self.store.listeners:
+            self.store.listeners.remove(self.record)
+        self.queue.put(("close", remove))
+        if wait:
+            self.wait()
+
+    def wait(self):
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _rewrite(self, snapshot):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_snapshot(snapshot))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return open(self.path, 'ab')
+
+    def _run(self):
+        f = None
+        dirty = False
+        last_sync = time.monotonic()
+        while True:
+            timeout = None
+            if dirty:
+                timeout = max(0.0, last_sync + self.sync_interval - time.monotonic())
+            try:
+                kind, value = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, value = "sync", None
+
+            try:
+                if kind == "append" and not self.broken:
+                    if f is None:
+                        # Images without points get no journal until the first edit
+                        f = open(self.path, 'wb')
+                        f.write(MAGIC)
+                    f.write(value)
+                    dirty = True
+                elif kind == "compact":
+                    self.broken = False
+                    if f is not None:
+                        f.close()
+                        f = None
+                    if len(value["ids"]):
+                        f = self._rewrite(value)
+                    elif os.path.exists(self.path):
+                        os.remove(self.path)
+                    dirty = False
+                elif kind == "close":
+                    if f is not None:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        f.close()
+                        f = None
+                    if value and os.path.exists(self.path):
+                        os.remove(self.path)
+                    return
+
+                if f is not None and dirty and self.queue.empty():
+                    # Hand the data to the OS right away, a crashed process
+                    # then loses nothing; fsync guards against power loss
+                    f.flush()
+                    if time.monotonic() - last_sync >= self.sync_interval:
+                        os.fsync(f.fileno())
+                        last_sync = time.monotonic()
+                        dirty = False
+            except OSError as e:
+                if self.error is None:
+                    print(f"Warning: Could not write annotation journal: {str(e)}")
+                self.error = e
+                self.broken = True
+                if f is not None:
+                    try:
+                        f.close()
+                    except OSError:
+                        pass
+                f = None
+                dirty = False
+                if kind == "close":
+                    return
@@ -0,0 +1,118 @@
+import hashlib
+import math
+import os
+import warnings
+
+import numpy as np
+
+# Name suffix of the path a mosaic's annotations are journaled under
+MOSAIC_SUFFIX = ".lsmosaic"
+
+
+def _no_progress(percent, message=""):
+    pass
+
+
+class MosaicRaster:
+    """One GeoTIFF of a mosaic and the rectangle it covers on the mosaic grid
+
+    width and height are the raster's own pixel size, after reprojection
+    when ``warp`` is set; rect (x, y, w, h) is in mosaic pixels.
+    """
+
+    def __init__(self, path, width, height, rect, warp=False):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rect = rect
+        self.warp = warp
+
+
+class Mosaic:
+    """Georeferenced rasters placed on one shared pixel grid
+
+    The grid is north-up in ``crs`` with the finest resolution of the
+    rasters, so a mosaic pixel position is a fixed affine function
+    (``transform``) of world coordinates, just like the pixels of a single
+    GeoTIFF. ``path`` names the mosaic for journaling, and changes with the
+    grid so points are never replayed onto a different layout.
+    """
+
+    def __init__(self, crs, transform, width, height, rasters, skipped=()):
+        self.crs = crs
+        self.transform = transform
+        self.width = width
+        self.height = height
+        self.rasters = rasters
+        self.skipped = list(skipped)
+        # x0, y0, x1, y1 of every raster, for vectorized intersection tests
+        self.bounds = np.array([(x, y, x + w, y + h) for x, y, w, h in (r.rect for r in rasters)],
+                               dtype=np.float64).reshape(-1, 4)
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(crs.to_wkt().encode())
+        digest.update(repr((tuple(transform)[:6], width, height)).encode())
+        folder = os.path.commonpath([os.path.dirname(os.path.abspath(r.path)) for r in rasters])
+        self.path = os.path.join(folder, f"mosaic-{digest.hexdigest()}{MOSAIC_SUFFIX}")
+
+    def rasters_in_rect(self, x0, y0, x1, y1):
+        """Indices of the rasters intersecting a rectangle of mosaic pixels"""
+        b = self.bounds
+        return np.flatnonzero((b[:, 0] < x1) & (b[:, 2] > x0) & (b[:, 1] < y1) & (b[:, 3] > y0))
+
+
+def plan_mosaic(paths, crs=None, progress=None):
+    """Read the headers of GeoTIFFs and lay them out on a shared grid
+
+    crs defaults to the CRS of the first georeferenced raster. Rasters in
+    another CRS, or not north-up, are placed by the transform of a warped
+    VRT into crs, which is also what their tiles are read through. Files
+    without georeferencing are listed in Mosaic.skipped.
+    """
+    import rasterio
+    from rasterio.errors import NotGeoreferencedWarning
+    from rasterio.vrt import WarpedVRT
+
+    from .geo import is_north_up, parse_crs
+
+    report = progress or _no_progress
+    target = None if crs is None else parse_crs(crs)
+    placed, skipped = [], []
+    for i, path in enumerate(paths):
+        report(100 * i / max(len(paths), 1), "正在读取地理参考...")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", NotGeoreferencedWarning)
+            with rasterio.open(path) as ds:
+                if ds.crs is None or ds.transform.is_identity:
+                    skipped.append(path)
+                    continue
+                if target is None:
+                    target = ds.crs
+                t = ds.transform
+                if ds.crs == target and is_north_up(t):
+                    placed.append((path, t, ds.width, ds.height, False))
+                    continue
+                with WarpedVRT(ds, crs=target) as vrt:
+                    placed.append((path, vrt.transform, vrt.width, vrt.height, True))
+    if not placed:
+        raise ValueError("没有带地理参考信息的 GeoTIFF")
+
+    from rasterio.transform import Affine
+
+    # Warped rasters get an approximate resolution, native ones set the grid when there are any
+    native = [t for _, t, _, _, warp in placed if not warp] or [t for _, t, _, _, _ in placed]
+    res_x = min(t.a for t in native)
+    res_y = min(-t.e for t in native)
+    min_x = min(t.c for _, t, _, _, _ in placed)
+    max_y = max(t.f for _, t, _, _, _ in placed)
+    max_x = max(t.c + w * t.a for _, t, w, _, _ in placed)
+    min_y = min(t.f + h * t.e for _, t, _, h, _ in placed)
+    transform = Affine(res_x, 0.0, min_x, 0.0, -res_y, max_y)
+    width = max(1, math.ceil((max_x - min_x) / res_x - 1e-6))
+    height = max(1, math.ceil((max_y - min_y) / res_y - 1e-6))
+
+    rasters = []
+    for path, t, w, h, warp in placed:
+        rect = ((t.c - min_x) / res_x, (max_y - t.f) / res_y, w * t.a / res_x, h * -t.e / res_y)
+        rasters.append(MosaicRaster(path, w, h, rect, warp))
+    report(100, "完成")
+    return Mosaic(target, transform, width, height, rasters, skipped)
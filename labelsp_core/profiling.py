@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Durations kept per span name for the rolling statistics
+HISTORY = 1024
+# Spans kept for the trace dump, oldest dropped first
+TRACE_EVENTS = 200_000
+
+
+class Profiler:
+    """Opt-in timing of named spans, cheap enough to leave in hot paths
+
+    Disabled, ``span`` hands out one shared no-op context manager. Enabled,
+    every span appends its end time and duration to a bounded per-name
+    history, from which percentiles and rates are computed on demand, and
+    to a bounded event buffer that dump_trace writes in the Chrome trace
+    format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, enabled=False, history=HISTORY, trace_events=TRACE_EVENTS):
+        self.enabled = enabled
+        self.history = history
+        self.origin = time.perf_counter()
+        self.samples = {}
+        self.events = deque(maxlen=trace_events)
+        self._null = _NullSpan()
+
+    def span(self, name):
+        if not self.enabled:
+            return self._null
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.history))
+        samples.append((end, end - start))
+        self.events.append((name, start, end - start, threading.get_ident()))
+
+    def stats(self, name):
+        """count, mean/p50/p95/max in milliseconds over the recent history of a span"""
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+        durations = np.array([duration for _, duration in list(samples)]) * 1000
+        p50, p95 = np.percentile(durations, (50, 95))
+        return {"count": len(durations), "mean_ms": float(durations.mean()), "p50_ms": float(p50),
+                "p95_ms": float(p95), "max_ms": float(durations.max())}
+
+    def rate(self, name, window=1.0):
+        """Spans per second that ended within the last window seconds"""
+        samples = self.samples.get(name)
+        if not samples:
+            return 0.0
+        since = time.perf_counter() - window
+        return sum(1 for end, _ in list(samples) if end >= since) / window
+
+    def summary(self):
+        return {name: self.stats(name) for name in sorted(self.samples)}
+
+    def reset(self):
+        self.samples.clear()
+        self.events.clear()
+
+    def dump_trace(self, path):
+        """Write the buffered spans as Chrome trace JSON, returns the number of events"""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - self.origin) * 1e6, "dur": duration * 1e6}
+                  for name, start, duration, tid in list(self.events)]
+        threads = {event["tid"] for event in events}
+        main = threading.main_thread().ident
+        for tid in threads:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": "main" if tid == main else f"worker {tid}"}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"summary": self.summary()}}, f)
+        return len(events) - len(threads)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _enabled_from_env():
+    return os.environ.get("LABELSP_PROFILE", "") not in ("", "0")
+
+
+# Shared by the GUI and the core modules; set LABELSP_PROFILE=1 to enable at startup
+profiler = Profiler(enabled=_enabled_from_env())
@@ -0,0 +1,231 @@
+import itertools
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from .geo import pixels_to_lonlat, wgs84_transformer
+from .imageinfo import ImageInfo
+
+PROJECT_SUFFIX = ".lsproj"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    crs TEXT,
+    transform TEXT,
+    west REAL, south REAL, east REAL, north REAL,
+    point_count INTEGER NOT NULL DEFAULT 0,
+    updated REAL
+);
+-- Clustered by image, so the points of one image are a single range scan
+-- and bulk writes append in key order without any secondary index
+CREATE TABLE IF NOT EXISTS points (
+    image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    confirmed INTEGER NOT NULL DEFAULT 1,
+    lon REAL,
+    lat REAL,
+    -- Box size of points drawn as boxes, NULL for plain points
+    w REAL,
+    h REAL,
+    PRIMARY KEY (image_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_point_count ON images(point_count);
+CREATE INDEX IF NOT EXISTS images_bounds ON images(west, east, south, north);
+"""
+
+
+def _footprint(info):
+    """(west, south, east, north) of a georeferenced image in WGS84"""
+    if info.transform is None or info.crs is None:
+        return None, None, None, None
+    x = np.array([0, info.width, info.width, 0], dtype=np.float64)
+    y = np.array([0, 0, info.height, info.height], dtype=np.float64)
+    lon, lat = pixels_to_lonlat(info.transform, wgs84_transformer(info.crs), x, y)
+    return float(np.nanmin(lon)), float(np.nanmin(lat)), float(np.nanmax(lon)), float(np.nanmax(lat))
+
+
+class Project:
+    """SQLite file holding the images of a dataset and all their points
+
+    Image paths are stored relative to the project file, so a project can be
+    moved together with its images. Points are replaced per image in a
+    single transaction, and ``images.point_count`` is kept up to date so
+    per-image counts and unlabelled images never scan the points table.
+    Region queries first narrow the images down by their WGS84 footprint.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.root = os.path.dirname(self.path)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(points)")}
+        if "w" not in columns:
+            # Projects written before boxes existed
+            with self.db:
+                self.db.execute("ALTER TABLE points ADD COLUMN w REAL")
+                self.db.execute("ALTER TABLE points ADD COLUMN h REAL")
+        # pyproj transformers by CRS, creating one costs more than using it
+        self.transformers = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _key(self, image_path):
+        return os.path.relpath(os.path.abspath(image_path), self.root).replace(os.sep, '/')
+
+    def _resolve(self, key):
+        return os.path.normpath(os.path.join(self.root, key))
+
+    def add_images(self, infos):
+        """Insert or update images (ImageInfo objects) in one transaction"""
+        rows = []
+        for info in infos:
+            transform = ",".join(repr(float(v)) for v in tuple(info.transform)[:6]) \
+                if info.transform is not None else None
+            crs = info.crs.to_wkt() if info.crs else None
+            rows.append((self._key(info.path), info.width, info.height, crs, transform) + _footprint(info))
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO images (path, width, height, crs, transform, west, south, east, north) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET width=excluded.width, height=excluded.height, "
+                "crs=excluded.crs, transform=excluded.transform, west=excluded.west, "
+                "south=excluded.south, east=excluded.east, north=excluded.north", rows)
+        return len(rows)
+
+    def add_image(self, info):
+        self.add_images([info])
+        return self.image_id(info.path)
+
+    def image_id(self, image_path):
+        row = self.db.execute("SELECT id FROM images WHERE path = ?", (self._key(image_path),)).fetchone()
+        return row[0] if row else None
+
+    def image_paths(self):
+        return [self._resolve(key) for key, in self.db.execute("SELECT path FROM images ORDER BY path")]
+
+    def image_info(self, image_path):
+        """ImageInfo from the stored metadata, without touching the image file"""
+        row = self.db.execute("SELECT width, height, crs, transform FROM images WHERE path = ?",
+                              (self._key(image_path),)).fetchone()
+        if row is None:
+            return None
+        width, height, crs, transform = row
+        if transform is not None:
+            from rasterio.transform import Affine
+
+            transform = Affine(*(float(v) for v in transform.split(",")))
+        if crs is not None:
+            from rasterio.crs import CRS
+
+            crs = CRS.from_wkt(crs)
+        return ImageInfo(image_path, width, height, transform, crs)
+
+    def _lonlat(self, info, xy):
+        if info.transform is None or info.crs is None:
+            return np.full(len(xy), np.nan), np.full(len(xy), np.nan)
+        key = info.crs.to_wkt()
+        if key not in self.transformers:
+            self.transformers[key] = wgs84_transformer(info.crs)
+        return pixels_to_lonlat(info.transform, self.transformers[key], xy[:, 0], xy[:, 1])
+
+    def save_points(self, image_path, xy, confirmed=True, wh=None):
+        """Replace the points of one image in a single transaction
+
+        Lon/lat are filled in from the stored georeferencing of the image,
+        wh gives the box sizes of points drawn as boxes (NaN for none).
+        """
+        image_id = self.image_id(image_path)
+        if image_id is None:
+            raise KeyError(f"图像不在项目中: {image_path}")
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        count = len(xy)
+        confirmed = np.broadcast_to(np.asarray(confirmed, dtype=bool), (count,)).astype(int)
+        wh = np.full((count, 2), np.nan) if wh is None else np.asarray(wh, dtype=np.float64).reshape(-1, 2)
+        lonlat = self._lonlat(self.image_info(image_path), xy)
+        # SQLite stores NaN as NULL, so points without lon/lat or box need no special case
+        rows = zip(itertools.repeat(image_id), range(count), xy[:, 0].tolist(), xy[:, 1].tolist(), confirmed.tolist(),
+                   np.asarray(lonlat[0], dtype=np.float64).tolist(),
+                   np.asarray(lonlat[1], dtype=np.float64).tolist(),
+                   wh[:, 0].tolist(), wh[:, 1].tolist())
+        with self.db:
+            self.db.execute("DELETE FROM points WHERE image_id = ?", (image_id,))
+            self.db.executemany("INSERT INTO points (image_id, seq, x, y, confirmed, lon, lat, w, h) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("UPDATE images SET point_count = ?, updated = ? WHERE id = ?",
+                            (count, time.time(), image_id))
+        return count
+
+    def load_points(self, image_path):
+        """(xy, confirmed, wh) of one image in insertion order"""
+        rows = self.db.execute(
+            "SELECT x, y, confirmed, w, h FROM points WHERE image_id = "
+            "(SELECT id FROM images WHERE path = ?) ORDER BY seq",
+            (self._key(image_path),)).fetchall()
+        # NULL comes back as None, which becomes NaN here
+        data = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        return data[:, :2], data[:, 2].astype(bool), data[:, 3:]
+
+    def points_in_rect(self, image_path, x0, y0, x1, y1):
+        rows = self.db.execute(
+            "SELECT x, y FROM points WHERE image_id = (SELECT id FROM images WHERE path = ?) "
+            "AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?",
+            (self._key(image_path), x0, x1, y0, y1)).fetchall()
+        return np.array(rows, dtype=np.float64).reshape(-1, 2)
+
+    def points_in_region(self, west, south, east, north):
+        """Points of all georeferenced images inside a lon/lat box
+
+        Returns (paths, xy, lonlat) with paths holding the image of each point.
+        """
+        rows = self.db.execute(
+            "SELECT images.id, x, y, lon, lat FROM images JOIN points ON points.image_id = images.id "
+            "WHERE images.west <= ? AND images.east >= ? AND images.south <= ? AND images.north >= ? "
+            "AND lon BETWEEN ? AND ? AND lat BETWEEN ? AND ?",
+            (east, west, north, south, west, east, south, north)).fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        image_ids, inverse = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+        keys = dict(self.db.execute("SELECT id, path FROM images"))
+        paths = np.array([self._resolve(keys[i]) for i in image_ids.tolist()], dtype=object)[inverse]
+        return paths, data[:, 1:3], (data[:, 3], data[:, 4])
+
+    def images_in_region(self, west, south, east, north):
+        rows = self.db.execute(
+            "SELECT path FROM images WHERE west <= ? AND east >= ? AND south <= ? AND north >= ? "
+            "ORDER BY path", (east, west, north, south))
+        return [self._resolve(key) for key, in rows]
+
+    def point_counts(self):
+        """[(image path, point count)] for every image"""
+        rows = self.db.execute("SELECT path, point_count FROM images ORDER BY path")
+        return [(self._resolve(key), count) for key, count in rows]
+
+    def unlabelled_images(self):
+        rows = self.db.execute("SELECT path FROM images WHERE point_count = 0 ORDER BY path")
+        return [self._resolve(key) for key, in rows]
+
+    def stats(self):
+        images, labelled, points = self.db.execute(
+            "SELECT COUNT(*), COUNT(NULLIF(point_count, 0)), COALESCE(SUM(point_count), 0) "
+            "FROM images").fetchone()
+        confirmed, = self.db.execute("SELECT COUNT(*) FROM points WHERE confirmed").fetchone()
+        return {"images": images, "labelled_images": labelled, "points": points,
+                "confirmed_points": confirmed}
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from .tiles import TILE_SIZE, TileGrid
+
+# Bytes hashed from each end of a file for its cache key
+HASH_BYTES = 1 << 20
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Pyramids of rasters larger than this start at the first level that fits,
+# finer levels keep coming from the file itself
+MAX_BASE_PIXELS = 4096 * 4096
+# Images smaller than this decode quickly enough without a cache
+MIN_PIXELS = 2048 * 2048
+STRIP_ROWS = 1024
+META_NAME = "pyramid.json"
+# Unfinished entries left behind by a crash are removed after this many seconds
+STALE_SECONDS = 24 * 3600
+VERSION = 1
+
+
+def default_cache_dir():
+    root = os.environ.get("LABELSP_CACHE_DIR")
+    if root:
+        return root
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "labelsp", "pyramids")
+
+
+def file_key(path):
+    """Cache key of a file from its size, mtime and the bytes at both ends
+
+    Hashing the ends instead of the whole file keeps the key cheap for
+    multi-gigabyte rasters, the size and mtime catch edits in between.
+    """
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(HASH_BYTES))
+        if stat.st_size > 2 * HASH_BYTES:
+            f.seek(-HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(HASH_BYTES))
+    return digest.hexdigest()
+
+
+def downsample(pixels):
+    """Halve an (h, w, bands) uint8 array by averaging 2x2 blocks
+
+    Works in strips to bound the temporary memory; odd edges are repeated.
+    """
+    height, width, bands = pixels.shape
+    out = np.empty(((height + 1) // 2, (width + 1) // 2, bands), dtype=np.uint8)
+    for row in range(0, height, STRIP_ROWS):
+        strip = pixels[row:row + STRIP_ROWS]
+        strip = np.pad(strip, ((0, len(strip) % 2), (0, width % 2), (0, 0)), mode='edge')
+        blocks = strip.reshape(len(strip) // 2, 2, strip.shape[1] // 2, 2, bands).astype(np.uint16)
+        out[row // 2:row // 2 + len(blocks)] = (blocks.sum(axis=(1, 3)) + 2) >> 2
+    return out
+
+
+def base_level(width, height, tile_size=TILE_SIZE, max_pixels=MAX_BASE_PIXELS):
+    """Finest level of a width x height raster that its pyramid stores"""
+    grid = TileGrid(width, height, tile_size)
+    level = 0
+    while level < grid.max_level and np.prod(grid.level_shape(level)) > max_pixels:
+        level += 1
+    return level
+
+
+class Pyramid:
+    """The cached levels of one image, memory-mapped read-only on first use"""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.width = meta["width"]
+        self.height = meta["height"]
+        self.tile_size = meta["tile_size"]
+        self.first_level = meta["first_level"]
+        self.max_level = meta["max_level"]
+        self.display = meta.get("display")
+        self.stretch = meta.get("stretch")
+        self._levels = {}
+
+    def has_level(self, level):
+        return self.first_level <= level <= self.max_level
+
+    def matches(self, display):
+        """Whether the levels were rendered with this display (TileSource.display_key)"""
+        return self.display == display
+
+    def level(self, level):
+        pixels = self._levels.get(level)
+        if pixels is None:
+            pixels = np.load(os.path.join(self.directory, f"level{level}.npy"), mmap_mode='r')
+            self._levels[level] = pixels
+        return pixels
+
+    def read_tile(self, level, tx, ty, tile_size):
+        rows = slice(ty * tile_size, (ty + 1) * tile_size)
+        columns = slice(tx * tile_size, (tx + 1) * tile_size)
+        return np.ascontiguousarray(self.level(level)[rows, columns])
+
+
+class PyramidSource(TileGrid):
+    """Tiles of an image served entirely from its cached pyramid
+
+    Stands in for decoding a plain image again. Has the read_tile/close
+    interface of TileSource, but no bands or stretch to change.
+    """
+
+    def __init__(self, path, pyramid):
+        super().__init__(pyramid.width, pyramid.height, pyramid.tile_size)
+        self.path = path
+        self.pyramid = pyramid
+
+    def read_tile(self, level, tx, ty):
+        return self.pyramid.read_tile(level, tx, ty, self.tile_size)
+
+    def close(self):
+        pass
+
+
+class PyramidCache:
+    """Directory of image pyramids keyed by file_key, bounded by max_bytes
+
+    Each entry is a directory of ``level<n>.npy`` arrays plus a JSON
+    description, written under a temporary name and renamed into place,
+    so readers never see half an entry. Lookups touch the description,
+    and storing evicts the least recently used entries over the cap.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        directory = os.path.join(self.root, key)
+        meta_path = os.path.join(directory, META_NAME)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != VERSION:
+            return None
+        return Pyramid(directory, meta)
+
+    def lookup(self, path):
+        """(key, pyramid) of an image file, pyramid None when nothing is cached"""
+        try:
+            key = file_key(path)
+        except OSError:
+            return None, None
+        return key, self.get(key)
+
+    def store(self, key, levels, meta, cancelled=None):
+        """Write an entry from (level, pixels) pairs, False if cancelled first"""
+        os.makedirs(self.root, exist_ok=True)
+        directory = os.path.join(self.root, key)
+        tmp = f"{directory}.tmp{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp)
+            for level, pixels in levels:
+                if cancelled is not None and cancelled():
+                    return False
+                np.save(os.path.join(tmp, f"level{level}.npy"), pixels)
+            with open(os.path.join(tmp, META_NAME), 'w', encoding='utf-8') as f:
+                json.dump(dict(meta, version=VERSION, created=time.time()), f)
+            try:
+                os.replace(tmp, directory)
+            except OSError:
+                # Another process cached the same file meanwhile
+                return os.path.isdir(directory)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=directory)
+        return True
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            directory = os.path.join(self.root, name)
+            try:
+                if ".tmp" in name:
+                    if time.time() - os.path.getmtime(directory) > STALE_SECONDS:
+                        shutil.rmtree(directory, ignore_errors=True)
+                    continue
+                used = os.path.getmtime(os.path.join(directory, META_NAME))
+                size = sum(entry.stat().st_size for entry in os.scandir(directory))
+            except OSError:
+                continue
+            entries.append((used, size, directory))
+        total = sum(size for _, size, _ in entries)
+        for _, size, directory in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if directory == keep:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+
+
+def build_pyramid(cache, key, base, first_level, width, height, tile_size=TILE_SIZE,
+                  display=None, stretch=None, cancelled=None):
+    """Cache base, the image at first_level, and every coarser level of it
+
+    Coarser levels are 2x2 averages of the previous one, down to the level
+    that fits a single tile.
+    """
+    max_level = TileGrid(width, height, tile_size).max_level
+
+    def levels():
+        pixels, level = base, first_level
+        while True:
+            yield level, pixels
+            if level >= max_level:
+                return
+            pixels, level = downsample(pixels), level + 1
+
+    meta = {"width": width, "height": height, "tile_size": tile_size, "first_level": first_level,
+            "max_level": max_level, "bands": int(base.shape[2]), "display": display, "stretch": stretch}
+    return cache.store(key, levels(), meta, cancelled)
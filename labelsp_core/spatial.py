@@ -0,0 +1,72 @@
+import numpy as np
+
+_MAX_CELL = 2 ** 31 - 1
+_ROW_STRIDE = 2 ** 31
+
+
+class PointGrid:
+    """Uniform grid index over the rows of an (n, 2) coordinate array
+
+    Rows are kept sorted by cell key (``cell_y * stride + cell_x``), so the
+    cells of one grid row form a contiguous run that two binary searches
+    find. Rows appended since the last rebuild are scanned directly until
+    there are more than ``max_pending`` of them; deletions and reorders call
+    ``invalidate`` and the next query rebuilds the index.
+    """
+
+    def __init__(self, cell_size=64.0, max_pending=4096):
+        self.cell_size = float(cell_size)
+        self.max_pending = max_pending
+        self.order = np.empty(0, dtype=np.intp)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.indexed = 0
+        self.dirty = False
+
+    def _cell(self, value):
+        return int(min(max(value // self.cell_size, 0), _MAX_CELL))
+
+    def _cell_keys(self, xy):
+        cells = np.floor_divide(xy, self.cell_size)
+        np.clip(cells, 0, _MAX_CELL, out=cells)
+        cells = cells.astype(np.int64)
+        return cells[:, 1] * _ROW_STRIDE + cells[:, 0]
+
+    def invalidate(self):
+        self.dirty = True
+
+    def rebuild(self, xy):
+        keys = self._cell_keys(xy)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.indexed = len(xy)
+        self.dirty = False
+
+    def query(self, xy, x0, y0, x1, y1):
+        """Sorted rows of xy inside the rectangle, edges included"""
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        count = len(xy)
+        if self.dirty or count < self.indexed or count - self.indexed > self.max_pending:
+            self.rebuild(xy)
+
+        cx0, cy0 = self._cell(x0), self._cell(y0)
+        cx1, cy1 = self._cell(x1), self._cell(y1)
+        if cy1 - cy0 + 1 > max(64, self.indexed // 16):
+            # Taller than the index is useful for, a straight scan is cheaper
+            candidates = np.arange(count)
+        else:
+            rows = np.arange(cy0, cy1 + 1, dtype=np.int64) * _ROW_STRIDE
+            lo = np.searchsorted(self.keys, rows + cx0, side="left")
+            hi = np.searchsorted(self.keys, rows + cx1, side="right")
+            parts = [self.order[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+            parts.append(np.arange(self.indexed, count))
+            candidates = np.concatenate(parts)
+
+        points = xy[candidates]
+        inside = ((points[:, 0] >= x0) & (points[:, 0] <= x1) &
+                  (points[:, 1] >= y0) & (points[:, 1] <= y1))
+        found = candidates[inside]
+        found.sort()
+        return found
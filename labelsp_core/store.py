@@ -0,0 +1,220 @@
+import numpy as np
+
+from .spatial import PointGrid
+
+
+class AnnotationStore:
+    """Point annotations held in contiguous NumPy arrays
+
+    Rows stay in insertion order and every point gets an id from a counter
+    that only goes up, so ``ids`` is always sorted and ids map back to rows
+    with a binary search. ``confirmed`` separates confirmed points from the
+    temporary ones added since the last confirm. ``wh`` holds the box size
+    of points drawn as boxes (dual-point mode) and NaN for plain points.
+
+    Listeners are called as ``listener(event, records)`` after every change,
+    with event one of "add", "remove", "confirm", "clear" and "select", and
+    records the affected points as returned by ``take`` (None for "clear").
+    """
+
+    COLUMNS = ("_xy", "_ids", "_confirmed", "_selected", "_wh")
+
+    def __init__(self, capacity=1024):
+        self._xy = np.empty((capacity, 2), dtype=np.float64)
+        self._wh = np.full((capacity, 2), np.nan)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._confirmed = np.zeros(capacity, dtype=bool)
+        self._selected = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.next_id = 0
+        # Largest box half-size ever stored, how far a box reaches past its centre
+        self.max_half = 0.0
+        self.selection = np.empty(0, dtype=np.intp)
+        self.grid = PointGrid()
+        self.listeners = []
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def xy(self):
+        return self._xy[:self.size]
+
+    @property
+    def ids(self):
+        return self._ids[:self.size]
+
+    @property
+    def confirmed(self):
+        return self._confirmed[:self.size]
+
+    @property
+    def selected(self):
+        return self._selected[:self.size]
+
+    @property
+    def wh(self):
+        return self._wh[:self.size]
+
+    def _notify(self, event, records=None):
+        for listener in list(self.listeners):
+            listener(event, records)
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, x, y, confirmed=False):
+        return int(self.add_many(np.array([[x, y]], dtype=np.float64), confirmed)[0])
+
+    def add_many(self, xy, confirmed=False, ids=None, wh=None):
+        """Append points and return their ids
+
+        Passing ids re-inserts previously removed points under their old ids,
+        wh gives the points box sizes.
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        count = len(xy)
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + count, dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+        if count == 0:
+            return ids
+
+        self._reserve(count)
+        start, stop = self.size, self.size + count
+        in_order = start == 0 or ids.min() > self._ids[start - 1]
+        self._xy[start:stop] = xy
+        self._ids[start:stop] = ids
+        self._confirmed[start:stop] = confirmed
+        self._selected[start:stop] = False
+        self._wh[start:stop] = np.nan if wh is None else wh
+        if wh is not None and np.isfinite(wh).any():
+            self.max_half = max(self.max_half, float(np.nanmax(wh)) / 2)
+        self.size = stop
+        self.next_id = max(self.next_id, int(ids.max()) + 1)
+
+        if not in_order or not np.all(ids[1:] > ids[:-1]):
+            # Restored ids fall between existing ones, put rows back in id order
+            order = np.argsort(self.ids, kind="stable")
+            self._reorder(order)
+            self._notify("add", self.take(self.rows_of(ids)))
+        else:
+            self._notify("add", self.take(slice(start, stop)))
+        return ids
+
+    def _reorder(self, order):
+        for name in self.COLUMNS:
+            array = getattr(self, name)
+            array[:self.size] = array[:self.size][order]
+        self.selection = np.flatnonzero(self.selected)
+        self.grid.invalidate()
+
+    def rows_of(self, ids):
+        """Sorted rows of the given ids, ids that are not stored are skipped"""
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        if not self.size or not len(ids):
+            return np.empty(0, dtype=np.intp)
+        rows = np.minimum(np.searchsorted(self.ids, ids), self.size - 1)
+        return np.unique(rows[self._ids[rows] == ids])
+
+    def take(self, rows):
+        """Copy of the given rows as a dict of arrays"""
+        return {"ids": self.ids[rows].copy(),
+                "xy": self.xy[rows].copy(),
+                "confirmed": self.confirmed[rows].copy(),
+                "wh": self.wh[rows].copy()}
+
+    def snapshot(self):
+        return self.take(slice(None))
+
+    def _remove_rows(self, rows):
+        removed = self.take(rows)
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        count = int(keep.sum())
+        for name in self.COLUMNS:
+            array = getattr(self, name)
+            array[:count] = array[:self.size][keep]
+        self.size = count
+        self.selection = np.flatnonzero(self.selected)
+        self.grid.invalidate()
+        self._notify("remove", removed)
+        return removed
+
+    def remove_ids(self, ids):
+        """Remove points by id in one pass and return what was removed"""
+        return self._remove_rows(self.rows_of(ids))
+
+    def remove_last(self):
+        """Remove the newest temporary point, or the newest point if all are confirmed"""
+        if not self.size:
+            return None
+        temp_rows = np.flatnonzero(~self.confirmed)
+        row = temp_rows[-1] if len(temp_rows) else self.size - 1
+        return self._remove_rows(np.array([row]))
+
+    def confirm_all(self):
+        return self._set_confirmed_rows(np.flatnonzero(~self.confirmed), True)
+
+    def set_confirmed(self, ids, confirmed=True):
+        """Confirm (or turn back into temporary) the points with the given ids"""
+        return self._set_confirmed_rows(self.rows_of(ids), confirmed)
+
+    def _set_confirmed_rows(self, rows, confirmed):
+        self._confirmed[rows] = confirmed
+        records = self.take(rows)
+        self._notify("confirm", records)
+        return records
+
+    def clear(self):
+        self.size = 0
+        self.max_half = 0.0
+        self.selection = np.empty(0, dtype=np.intp)
+        self.grid.invalidate()
+        self._notify("clear")
+
+    def query_rect(self, x0, y0, x1, y1):
+        """Rows of the points inside a rectangle"""
+        if not self.size:
+            return np.empty(0, dtype=np.intp)
+        return self.grid.query(self.xy, x0, y0, x1, y1)
+
+    def select_rows(self, rows):
+        """Make rows the selection and return the rows whose state changed"""
+        rows = np.asarray(rows, dtype=np.intp)
+        leaving = np.setdiff1d(self.selection, rows, assume_unique=True)
+        entering = np.setdiff1d(rows, self.selection, assume_unique=True)
+        self._selected[leaving] = False
+        self._selected[entering] = True
+        self.selection = rows
+        changed = np.concatenate([leaving, entering])
+        if len(changed):
+            self._notify("select", self.take(changed))
+        return changed
+
+    def select_rect(self, x0, y0, x1, y1):
+        return self.select_rows(self.query_rect(x0, y0, x1, y1))
+
+    def clear_selection(self):
+        return self.select_rows(np.empty(0, dtype=np.intp))
+
+    def selected_ids(self):
+        return self.ids[self.selection].copy()
+
+    def ordered_rows(self):
+        """Confirmed points first, then temporary ones, each in insertion order"""
+        confirmed = self.confirmed
+        return np.concatenate([np.flatnonzero(confirmed), np.flatnonzero(~confirmed)])
+
+    def ordered_xy(self):
+        return self.xy[self.ordered_rows()]
@@ -0,0 +1,307 @@
+import math
+import threading
+
+import numpy as np
+
+TILE_SIZE = 512
+
+# Rasters with more pixels than this are displayed tile by tile instead of
+# being decoded into a single in-memory image
+TILED_PIXEL_THRESHOLD = 8192 * 8192
+
+# Rasters that are not plain 8-bit get a percentile stretch by default
+DEFAULT_PERCENTILES = (2.0, 98.0)
+# Longest side of the decimated read that stretch statistics come from
+STATS_SIZE = 1024
+
+
+class Stretch:
+    """Linear mapping of each displayed band from [low, high] to 0..255
+
+    Integer data of up to 16 bits is mapped through a lookup table per band,
+    a single gather per tile; wider integers and floats are scaled in
+    float32. Nodata and non-finite values map to 0.
+    """
+
+    def __init__(self, low, high, dtype, nodata=None):
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.maximum(np.asarray(high, dtype=np.float64), self.low + 1e-9)
+        self.dtype = np.dtype(dtype)
+        self.nodata = nodata
+        self.luts = None
+        if self.dtype.kind in 'ui' and self.dtype.itemsize <= 2:
+            info = np.iinfo(self.dtype)
+            values = np.arange(info.min, info.max + 1, dtype=np.float64)
+            self.luts = np.stack([self._scale(values, low, high)
+                                  for low, high in zip(self.low, self.high)])
+            if nodata is not None and info.min <= nodata <= info.max and float(nodata).is_integer():
+                self.luts[:, int(nodata) - info.min] = 0
+
+    @staticmethod
+    def _scale(values, low, high):
+        values = (values - low) * (255.0 / (high - low))
+        return np.clip(values + 0.5, 0, 255).astype(np.uint8)
+
+    def apply(self, data):
+        """Map a (bands, h, w) block to a contiguous (h, w, bands) uint8 array"""
+        bands, height, width = data.shape
+        out = np.empty((height, width, bands), dtype=np.uint8)
+        for i in range(bands):
+            band = data[i]
+            if self.luts is not None:
+                if self.dtype.kind == 'i':
+                    # Flipping the sign bit turns signed values into LUT offsets
+                    unsigned = np.dtype(f'u{self.dtype.itemsize}')
+                    band = band.view(unsigned) ^ unsigned.type(1 << (8 * self.dtype.itemsize - 1))
+                out[..., i] = np.take(self.luts[i], band)
+                continue
+            scaled = band.astype(np.float32)
+            scaled -= self.low[i]
+            scaled *= 255.0 / (self.high[i] - self.low[i])
+            scaled += 0.5
+            np.clip(scaled, 0, 255, out=scaled)
+            np.nan_to_num(scaled, copy=False, nan=0.0)
+            if self.nodata is not None:
+                scaled[band == self.nodata] = 0
+            out[..., i] = scaled
+        return out
+
+
+def compute_stretch(ds, bands, percentiles=DEFAULT_PERCENTILES, size=STATS_SIZE):
+    """Percentile stretch of an open rasterio dataset from a decimated read
+
+    GDAL serves the read from an overview when the file has one, so the
+    cost does not grow with the size of the raster.
+    """
+    from rasterio.enums import Resampling
+
+    factor = max(1, math.ceil(max(ds.width, ds.height) / size))
+    out_shape = (len(bands), max(1, ds.height // factor), max(1, ds.width // factor))
+    data = ds.read(list(bands), out_shape=out_shape, resampling=Resampling.nearest)
+    low, high = [], []
+    for band in data:
+        values = band.ravel()
+        if values.dtype.kind == 'f':
+            values = values[np.isfinite(values)]
+        if ds.nodata is not None:
+            values = values[values != ds.nodata]
+        if values.size:
+            band_low, band_high = np.percentile(values, percentiles)
+        else:
+            band_low, band_high = 0.0, 1.0
+        low.append(band_low)
+        high.append(band_high)
+    return Stretch(low, high, ds.dtypes[0], ds.nodata)
+
+
+class TileGrid:
+    """Tile layout of a width x height image over a pyramid of levels
+
+    Level 0 is full resolution, every further level halves it. A tile always
+    has at most ``tile_size`` x ``tile_size`` output pixels, so a tile at
+    level ``n`` covers ``tile_size * 2 ** n`` source pixels per side.
+    """
+
+    def __init__(self, width, height, tile_size=TILE_SIZE):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        # The coarsest level fits into a single tile
+        self.max_level = max(0, math.ceil(math.log2(max(width, height, 1) / tile_size)))
+
+    def level_shape(self, level):
+        """(height, width) of a whole level in pixels"""
+        scale = 2 ** level
+        return max(1, math.ceil(self.height / scale)), max(1, math.ceil(self.width / scale))
+
+    def level_for_scale(self, scale):
+        """Pick the pyramid level matching a display scale (screen px per image px)"""
+        if scale <= 0 or scale >= 1:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1.0 / scale))))
+
+    def tile_span(self, level):
+        return self.tile_size * 2 ** level
+
+    def tiles_in_rect(self, level, x0, y0, x1, y1):
+        """Tile keys at a level covering an image-pixel rectangle"""
+        span = self.tile_span(level)
+        x0, y0 = max(0.0, x0), max(0.0, y0)
+        x1, y1 = min(float(self.width), x1), min(float(self.height), y1)
+        if x1 <= x0 or y1 <= y0:
+            return []
+        tx0, ty0 = int(x0 // span), int(y0 // span)
+        tx1, ty1 = int(math.ceil(x1 / span)), int(math.ceil(y1 / span))
+        return [(level, tx, ty) for ty in range(ty0, ty1) for tx in range(tx0, tx1)]
+
+    def tile_rect(self, level, tx, ty):
+        """Image-pixel rectangle (x, y, w, h) covered by a tile"""
+        span = self.tile_span(level)
+        x, y = tx * span, ty * span
+        return x, y, min(span, self.width - x), min(span, self.height - y)
+
+
+class TileSource(TileGrid):
+    """Windowed, decimated reads of a raster for tiled display
+
+    GDAL serves decimated reads from the file's overviews when it has them
+    and subsamples the full-resolution data otherwise. With a cached
+    ``pyramid`` (see labelsp_core.pyramid) of the current display, the
+    levels it holds are sliced from it instead, and its stored stretch
+    saves the statistics read on open. With a ``crs`` other than the
+    file's, or a file that is not north-up, reads go through a GDAL warped
+    VRT that reprojects on the fly, and the width, height and levels are
+    those of the warped raster.
+
+    Which bands are shown and how they are stretched to 8 bits is the
+    ``display`` pair, replaced as a whole by set_display so tile reads on
+    worker threads always see a consistent combination.
+    """
+
+    def __init__(self, path, tile_size=TILE_SIZE, pyramid=None, crs=None):
+        self.path = path
+        self.pyramid = pyramid
+        self.crs = crs
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+        handles = self._open()
+        ds = handles[-1]
+        try:
+            super().__init__(ds.width, ds.height, tile_size)
+            self.count = ds.count
+            self.dtype = ds.dtypes[0]
+            self.overviews = ds.overviews(1)
+            self.percentiles = None if self.dtype == 'uint8' else DEFAULT_PERCENTILES
+            bands = self._default_bands(ds)
+            stretch = None
+            if self.percentiles:
+                cached = pyramid.stretch if pyramid is not None and pyramid.matches(self.display_key(bands)) else None
+                if cached is not None:
+                    stretch = Stretch(cached["low"], cached["high"], self.dtype, ds.nodata)
+                else:
+                    stretch = compute_stretch(ds, bands, self.percentiles)
+            self.display = (bands, stretch)
+        finally:
+            for handle in reversed(handles):
+                handle.close()
+
+    def _open(self):
+        # [dataset] or [dataset, warped VRT on top of it], close in reverse order
+        import rasterio
+
+        from .geo import is_north_up
+
+        ds = rasterio.open(self.path)
+        if self.crs is None or (ds.crs == self.crs and is_north_up(ds.transform)):
+            return [ds]
+        from rasterio.vrt import WarpedVRT
+
+        try:
+            return [ds, WarpedVRT(ds, crs=self.crs)]
+        except Exception:
+            ds.close()
+            raise
+
+    @staticmethod
+    def _default_bands(ds):
+        from rasterio.enums import ColorInterp
+
+        if ds.count >= 3:
+            bands = [1, 2, 3]
+            # An alpha band is only meaningful as is in 8-bit data
+            if ds.count >= 4 and ds.colorinterp[3] == ColorInterp.alpha and ds.dtypes[0] == 'uint8':
+                bands.append(4)
+            return bands
+        return [1]
+
+    @property
+    def bands(self):
+        return self.display[0]
+
+    def display_key(self, bands=None):
+        """The display as plain data, what a cached pyramid was rendered with"""
+        bands = self.bands if bands is None else bands
+        percentiles = None if self.percentiles is None else [float(value) for value in self.percentiles]
+        return {"bands": [int(band) for band in bands], "percentiles": percentiles}
+
+    def stretch_values(self):
+        stretch = self.display[1]
+        if stretch is None:
+            return None
+        return {"low": stretch.low.tolist(), "high": stretch.high.tolist()}
+
+    def set_display(self, bands, percentiles=None):
+        """Show the given 1-based bands (1 for grey, 3 for RGB), stretched
+        between the given low/high percentiles, or unstretched for None"""
+        bands = [int(band) for band in bands]
+        stretch = None
+        if percentiles is not None:
+            stretch = compute_stretch(self._dataset(), bands, percentiles)
+        self.percentiles = percentiles
+        self.display = (bands, stretch)
+
+    def _dataset(self):
+        # rasterio datasets must not be shared between threads
+        ds = getattr(self._local, "dataset", None)
+        if ds is None or ds.closed:
+            handles = self._open()
+            ds = handles[-1]
+            self._local.dataset = ds
+            with self._lock:
+                self._handles.extend(handles)
+        return ds
+
+    def read_tile(self, level, tx, ty):
+        """Read one tile as an (h, w, bands) uint8 array"""
+        bands, stretch = self.display
+        pyramid = self.pyramid
+        if pyramid is not None and pyramid.has_level(level) and pyramid.matches(self.display_key(bands)):
+            return pyramid.read_tile(level, tx, ty, self.tile_size)
+        from rasterio.enums import Resampling
+        from rasterio.windows import Window
+
+        x, y, w, h = self.tile_rect(level, tx, ty)
+        scale = 2 ** level
+        out_w = max(1, math.ceil(w / scale))
+        out_h = max(1, math.ceil(h / scale))
+        data = self._dataset().read(
+            bands,
+            window=Window(x, y, w, h),
+            out_shape=(len(bands), out_h, out_w),
+            resampling=Resampling.nearest)
+        return to_display(data, stretch)
+
+    def close(self):
+        with self._lock:
+            for ds in reversed(self._handles):
+                ds.close()
+            self._handles = []
+
+
+def read_level(source, level, cancelled=None):
+    """A whole level of a tile source as one (h, w, bands) uint8 array
+
+    Returns None once cancelled() returns True.
+    """
+    height, width = source.level_shape(level)
+    size = source.tile_size
+    pixels = None
+    for _, tx, ty in source.tiles_in_rect(level, 0, 0, source.width, source.height):
+        if cancelled is not None and cancelled():
+            return None
+        tile = source.read_tile(level, tx, ty)
+        if pixels is None:
+            pixels = np.empty((height, width, tile.shape[2]), dtype=np.uint8)
+        pixels[ty * size:ty * size + tile.shape[0], tx * size:tx * size + tile.shape[1]] = tile
+    return pixels
+
+
+def to_display(data, stretch=None):
+    """Convert a (bands, h, w) raster block to a contiguous (h, w, bands) uint8 array"""
+    if stretch is not None:
+        return stretch.apply(data)
+    if data.dtype != np.uint8:
+        data = np.clip(data, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(np.moveaxis(data, 0, -1))
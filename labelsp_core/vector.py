@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from .geo import crs_transformer, parse_crs, pixels_to_crs
+
+VECTOR_EXTENSIONS = ('.geojson', '.gpkg')
+CHUNK_ROWS = 65536
+# GeoPackage binary header (magic, version, little-endian flags, srs_id)
+# followed by a little-endian WKB point
+GPKG_POINT = np.dtype([("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("srs_id", "<i4"),
+                       ("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+# srs_id of a target CRS without an EPSG code
+CUSTOM_SRS_ID = 100000
+
+
+def _no_progress(percent, message=""):
+    pass
+
+
+def _projected_chunks(columns, transform, transformer, report):
+    """(x, y, property columns) per chunk, with points that failed to reproject dropped
+
+    Reprojecting a chunk at a time keeps memory flat and lets the writers
+    stream, while pyproj still gets whole arrays to work on.
+    """
+    count = len(columns[0])
+    for start in range(0, count, CHUNK_ROWS):
+        report(100 * start / max(count, 1), "正在导出...")
+        stop = min(start + CHUNK_ROWS, count)
+        x, y = pixels_to_crs(transform, transformer, columns[0][start:stop], columns[1][start:stop])
+        valid = np.isfinite(x) & np.isfinite(y)
+        yield x[valid], y[valid], [np.asarray(column[start:stop])[valid] for column in columns]
+
+
+def _geojson_crs(crs):
+    epsg = crs.to_epsg()
+    if epsg == 4326 or epsg is None:
+        # RFC 7946 coordinates are WGS84 lon/lat and carry no crs member
+        return None
+    return {"type": "name", "properties": {"name": f"urn:ogc:def:crs:EPSG::{epsg}"}}
+
+
+def _write_geojson(path, headers, chunks, crs):
+    # A chunk of features is formatted by one string operation
+    head = {"type": "FeatureCollection", "name": os.path.splitext(os.path.basename(path))[0]}
+    member = _geojson_crs(crs)
+    if member is not None:
+        head["crs"] = member
+    properties = ", ".join(f"{json.dumps(header)}: %.10g" for header in headers)
+    feature = ('{"type": "Feature", "geometry": {"type": "Point", "coordinates": [%.12g, %.12g]}, '
+               '"properties": {' + properties + '}}')
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(head)[:-1] + ', "features": [\n')
+        for x, y, values in chunks:
+            if not len(x):
+                continue
+            block = np.column_stack([x, y] + values)
+            text = ",\n".join([feature] * len(block)) % tuple(block.ravel().tolist())
+            # Missing box sizes are NaN, null in JSON
+            f.write((",\n" if written else "") + text.replace(": nan", ": null"))
+            written += len(block)
+        f.write("\n]}\n")
+    return written
+
+
+def _gpkg_srs(crs):
+    epsg = crs.to_epsg()
+    if epsg is not None:
+        return epsg, "EPSG", epsg
+    return CUSTOM_SRS_ID, "NONE", CUSTOM_SRS_ID
+
+
+def _quote(name):
+    """An SQL identifier, with embedded double quotes doubled"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _write_gpkg(path, headers, chunks, crs):
+    # One executemany per chunk, the geometry blobs of a chunk packed by a
+    # structured NumPy array instead of a struct.pack per point
+    table = os.path.splitext(os.path.basename(path))[0]
+    srs_id, organization, code = _gpkg_srs(crs)
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    try:
+        db.executescript("""
+            PRAGMA application_id = 1196444487;
+            PRAGMA user_version = 10300;
+            CREATE TABLE gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+            CREATE TABLE gpkg_contents (
+                table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                description TEXT DEFAULT '', last_change DATETIME NOT NULL,
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE,
+                srs_id INTEGER REFERENCES gpkg_spatial_ref_sys(srs_id));
+            CREATE TABLE gpkg_geometry_columns (
+                table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+                srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                PRIMARY KEY (table_name, column_name));
+        """)
+        srs_rows = [("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+                    ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None)]
+        if srs_id != 4326:
+            srs_rows.append(("WGS 84 geodetic", 4326, "EPSG", 4326, parse_crs("EPSG:4326").to_wkt(), None))
+        srs_rows.append((crs.to_string() or "Custom", srs_id, organization, code, crs.to_wkt(), None))
+        db.executemany("INSERT OR REPLACE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", srs_rows)
+
+        quoted = ", ".join(f'{_quote(header)} REAL' for header in headers)
+        db.execute(f'CREATE TABLE {_quote(table)} (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, {quoted})')
+        db.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'POINT', ?, 0, 0)", (table, srs_id))
+        insert = f'INSERT INTO {_quote(table)} VALUES (NULL, ?{", ?" * len(headers)})'
+
+        bounds = [np.inf, np.inf, -np.inf, -np.inf]
+        written = 0
+        for x, y, values in chunks:
+            if not len(x):
+                continue
+            points = np.zeros(len(x), dtype=GPKG_POINT)
+            points["magic"] = b"GP"
+            points["flags"] = 1
+            points["srs_id"] = srs_id
+            points["order"] = 1
+            points["type"] = 1
+            points["x"] = x
+            points["y"] = y
+            blob = memoryview(points.tobytes())
+            size = GPKG_POINT.itemsize
+            blobs = [blob[i:i + size] for i in range(0, len(blob), size)]
+            # SQLite stores NaN as NULL, so missing box sizes need no special case
+            db.executemany(insert, zip(blobs, *[column.tolist() for column in values]))
+            bounds = [min(bounds[0], x.min()), min(bounds[1], y.min()),
+                      max(bounds[2], x.max()), max(bounds[3], y.max())]
+            written += len(x)
+        if not written:
+            bounds = [None] * 4
+        db.execute("INSERT INTO gpkg_contents VALUES (?, 'features', ?, '', ?, ?, ?, ?, ?, ?)",
+                   (table, table, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    *[None if value is None else float(value) for value in bounds], srs_id))
+        db.commit()
+    finally:
+        db.close()
+    return written
+
+
+WRITERS = {
+    '.geojson': _write_geojson,
+    '.gpkg': _write_gpkg,
+}
+
+
+def write_vector(path, headers, columns, transform, source_crs, target_crs=None, progress=None):
+    """Write points as a GeoJSON or GeoPackage point layer (by extension)
+
+    Geometries come from the pixel X/Y in the first two columns, mapped by
+    the raster's affine transform and reprojected from source_crs to
+    target_crs (default: source_crs). All columns become attributes.
+    Returns the number of points written; points that do not reproject
+    are left out.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    writer = WRITERS.get(extension)
+    if writer is None:
+        raise ValueError(f"不支持的导出格式: {extension}")
+    if transform is None or source_crs is None:
+        raise ValueError("图像没有地理参考信息")
+    report = progress or _no_progress
+    target = parse_crs(source_crs if target_crs is None else target_crs)
+    transformer = crs_transformer(source_crs, target)
+    try:
+        written = writer(path, headers, _projected_chunks(columns, transform, transformer, report), target)
+    except BaseException:
+        # Don't leave a truncated file behind after a failure or cancel
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    report(100, "导出完成")
+    return written
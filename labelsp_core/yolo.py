@@ -0,0 +1,49 @@
+import numpy as np
+
+DEFAULT_BOX_SIZE = 32.0
+# Rows formatted per string operation when writing
+CHUNK_ROWS = 65536
+ROW_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+
+
+def points_to_yolo(xy, width, height, box_size=DEFAULT_BOX_SIZE, class_id=0, wh=None):
+    """YOLO rows (class, cx, cy, w, h) for boxes centred on points
+
+    Points use their own box size from wh where it is set (boxes drawn in
+    dual-point mode) and a box_size square otherwise. Boxes are clipped to
+    the image, so points near the border get smaller, off-centre boxes.
+    All values are normalized by the image size.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    half = np.full((len(xy), 2), box_size / 2.0)
+    if wh is not None:
+        wh = np.asarray(wh, dtype=np.float64).reshape(-1, 2)
+        sized = np.isfinite(wh).all(axis=1)
+        half[sized] = wh[sized] / 2.0
+    x0 = np.clip(xy[:, 0] - half[:, 0], 0, width)
+    x1 = np.clip(xy[:, 0] + half[:, 0], 0, width)
+    y0 = np.clip(xy[:, 1] - half[:, 1], 0, height)
+    y1 = np.clip(xy[:, 1] + half[:, 1], 0, height)
+    rows = np.empty((len(xy), 5))
+    rows[:, 0] = class_id
+    rows[:, 1] = (x0 + x1) / (2.0 * width)
+    rows[:, 2] = (y0 + y1) / (2.0 * height)
+    rows[:, 3] = (x1 - x0) / width
+    rows[:, 4] = (y1 - y0) / height
+    # Points outside the image leave empty boxes behind
+    return rows[(rows[:, 3] > 0) & (rows[:, 4] > 0)]
+
+
+def write_yolo(path, rows, progress=None):
+    """Write YOLO rows as a txt label file
+
+    Each chunk is formatted by a single string operation instead of one
+    per row, which is most of the cost for large files.
+    """
+    rows = np.asarray(rows, dtype=np.float64).reshape(-1, 5)
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(rows), CHUNK_ROWS):
+            if progress is not None:
+                progress(100 * start / len(rows), "正在导出...")
+            block = rows[start:start + CHUNK_ROWS]
+            f.write(ROW_FORMAT * len(block) % tuple(block.ravel().tolist()))
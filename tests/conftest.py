@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import labelsp_core from the checkout, which is not an installed package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from labelsp_core.density import DensityGrid
+
+
+def test_points_on_cell_edges_and_outside():
+    # 100 x 60 image, 10 cells per side of the longer edge: 10 px cells
+    grid = DensityGrid(100, 60, max_cells=10)
+    assert (grid.rows, grid.columns, grid.cell) == (6, 10, 10.0)
+    grid.add([[0, 0], [9.999, 9.999], [10, 10], [10, 0], [99.999, 59.999],
+              # On the far image edges and beyond: not counted
+              [100, 30], [50, 60], [-0.001, 5], [5, -1], [np.nan, 5], [1e9, 1e9]])
+    expected = np.zeros((6, 10), dtype=int)
+    expected[0, 0] = 2
+    expected[1, 1] = 1
+    expected[0, 1] = 1
+    expected[5, 9] = 1
+    np.testing.assert_array_equal(grid.counts, expected)
+    assert grid.total == 5
+
+
+def test_partial_last_cell():
+    # 1030 px over at most 1024 cells: cells are wider than a pixel and the last one is partial
+    grid = DensityGrid(1030, 5)
+    assert grid.columns == 1024 and grid.rows == 5
+    grid.add([[1029.9, 4.9], [0, 0]])
+    assert grid.counts[-1, -1] == 1 and grid.counts[0, 0] == 1 and grid.total == 2
+
+
+@pytest.mark.parametrize("count", [10, 5000])
+def test_incremental_updates_match_a_rebuild(count):
+    # Small updates go through np.add.at, large ones through one bincount
+    rng = np.random.default_rng(count)
+    xy = rng.uniform(-50, 1050, (20000, 2))
+    grid = DensityGrid(1000, 800, max_cells=64)
+    grid.add(xy)
+    coarse = grid.level(2).copy()
+    changed = rng.uniform(0, 1000, (count, 2))
+    grid.add(changed)
+    grid.remove(xy[:count])
+
+    fresh = DensityGrid(1000, 800, max_cells=64)
+    fresh.rebuild(np.concatenate([xy[count:], changed]))
+    assert grid.total == fresh.total
+    np.testing.assert_array_equal(grid.counts, fresh.counts)
+    for level in range(4):
+        np.testing.assert_array_equal(grid.level(level), fresh.level(level))
+    assert not np.array_equal(coarse, grid.level(2))
+
+
+def test_levels_sum_blocks():
+    grid = DensityGrid(50, 30, max_cells=5)
+    grid.add([[x + 0.5, y + 0.5] for x in range(0, 50, 10) for y in range(0, 30, 10)])
+    np.testing.assert_array_equal(grid.level(0), np.ones((3, 5)))
+    # Odd edges are padded with empty cells
+    np.testing.assert_array_equal(grid.level(1), [[4, 4, 2], [2, 2, 1]])
+    np.testing.assert_array_equal(grid.level(3), [[15]])
+    assert grid.cell_size(1) == 20.0
+
+
+def test_level_for_scale():
+    grid = DensityGrid(1024, 1024, max_cells=256)
+    assert grid.level_for(1.0, 4) == 0
+    assert grid.level_for(0.5, 4) == 1
+    assert grid.level_for(0.1, 4) == 4
+    # Never coarser than one cell for the whole image
+    assert grid.level_for(1e-9, 4) == 8
+
+
+def test_clear_and_reset():
+    grid = DensityGrid(10, 10, max_cells=2)
+    grid.add([[1, 1]])
+    grid.level(1)
+    grid.clear()
+    assert grid.total == 0 and not grid.counts.any() and not grid.level(1).any()
+    grid.reset(40, 20)
+    assert grid.counts.shape == (1, 2)
@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+
+from labelsp_core.detect import local_maxima, propose_points, tile_windows
+
+SIZE = 300
+TILE = 128
+# Blob centres in pixel coordinates: inside tiles, on a vertical and a
+# horizontal seam, on a tile corner, straddling a seam and near the border
+BLOBS = [(40.5, 60.5), (200.5, 90.5), (128.0, 50.5), (70.5, 128.0), (128.0, 128.0),
+         (256.5, 200.5), (128.5, 260.5), (190.5, 256.0), (12.5, 285.5), (280.5, 20.5)]
+
+
+def blob_image(polarity, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:SIZE, 0:SIZE] + 0.5
+    image = rng.normal(0, 2, (SIZE, SIZE))
+    for bx, by in BLOBS:
+        image += 80 * np.exp(-((x - bx) ** 2 + (y - by) ** 2) / (2 * 2.0 ** 2))
+    if polarity == "dark":
+        image = -image
+    return np.clip(image + 120, 0, 255).astype(np.uint8)
+
+
+def write_image(path, image):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(path, 'w', driver='GTiff', width=SIZE, height=SIZE, count=1, dtype='uint8') as ds:
+            ds.write(image, 1)
+
+
+def assert_each_blob_once(xy):
+    blobs = np.array(BLOBS)
+    distance = np.hypot(*(xy[:, None, :] - blobs[None, :, :]).transpose(2, 0, 1))
+    # Every proposal sits on a blob and every blob got exactly one proposal
+    assert (distance.min(axis=1) <= 1.5).all(), xy[distance.min(axis=1) > 1.5]
+    assert np.bincount(distance.argmin(axis=1), minlength=len(blobs)).tolist() == [1] * len(blobs)
+
+
+@pytest.mark.parametrize("polarity", ["bright", "dark"])
+def test_local_maxima_finds_every_blob(polarity):
+    rows, cols = local_maxima(blob_image(polarity), polarity=polarity)
+    assert_each_blob_once(np.column_stack((cols + 0.5, rows + 0.5)))
+
+
+@pytest.mark.parametrize("polarity", ["bright", "dark"])
+def test_tiles_report_each_blob_once(tmp_path, polarity):
+    path = str(tmp_path / f"{polarity}.tif")
+    write_image(path, blob_image(polarity))
+    results = list(propose_points(path, polarity=polarity, tile_size=TILE, jobs=2))
+    assert [done for done, _, _ in results] == list(range(1, 10))
+    assert {count for _, count, _ in results} == {9}
+    assert_each_blob_once(np.concatenate([xy for _, _, xy in results]))
+
+
+def test_tile_windows_cover_the_image_once():
+    windows = tile_windows(300, 200, 128, margin=25)
+    covered = np.zeros((200, 300), dtype=int)
+    for (x0, y0, x1, y1), (rx, ry, rw, rh) in windows:
+        covered[y0:y1, x0:x1] += 1
+        assert rx <= x0 and ry <= y0 and rx + rw >= x1 and ry + rh >= y1
+        assert rx >= 0 and ry >= 0 and rx + rw <= 300 and ry + rh <= 200
+        assert x0 - rx in (0, 25) and y0 - ry in (0, 25)
+    assert (covered == 1).all()
+    assert len(windows) == 3 * 2
+
+
+def test_unknown_polarity_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        next(propose_points(str(tmp_path / "missing.tif"), polarity="grey"))
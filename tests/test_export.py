@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from labelsp_core.export import BOX_HEADERS, annotation_table, write_table
+from labelsp_core.importers import read_boxes, read_table
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 1000, (1000, 2))
+    wh = np.full((1000, 2), np.nan)
+    wh[::3] = rng.uniform(1, 50, (334, 2))
+    lonlat = (rng.uniform(-180, 180, 1000), rng.uniform(-90, 90, 1000))
+    headers, columns = annotation_table(xy, 1000, 500, lonlat, wh)
+    return xy, wh, headers, columns
+
+
+def read_back(path, headers):
+    """Columns of an exported file as an (n, len(headers)) array"""
+    if path.endswith('.npy'):
+        data = np.load(path)
+        assert list(data.dtype.names) == headers
+        return np.column_stack([data[name] for name in headers])
+    if path.endswith(('.parquet', '.feather')):
+        pytest.importorskip("pyarrow")
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            data = pq.read_table(path)
+        else:
+            import pyarrow.feather as feather
+            data = feather.read_table(path)
+        assert data.column_names == headers
+        return np.column_stack([data.column(name).to_numpy(zero_copy_only=False) for name in headers])
+    read_headers, data = read_table(path)
+    assert read_headers == headers
+    return data
+
+
+def test_table_columns(table):
+    xy, wh, headers, columns = table
+    assert headers == ["X", "Y", "Normalized X", "Normalized Y", "Longitude", "Latitude"] + list(BOX_HEADERS)
+    np.testing.assert_array_equal(columns[2], xy[:, 0] / 1000)
+    np.testing.assert_array_equal(columns[3], xy[:, 1] / 500)
+    # Plain points get no box columns
+    assert annotation_table(xy, 1000, 500)[0] == headers[:4]
+
+
+@pytest.mark.parametrize("extension", [".csv", ".xlsx", ".npy", ".parquet", ".feather"])
+def test_round_trip(tmp_path, table, extension):
+    if extension == ".xlsx":
+        pytest.importorskip("openpyxl")
+    if extension in (".parquet", ".feather"):
+        pytest.importorskip("pyarrow")
+    xy, wh, headers, columns = table
+    path = str(tmp_path / f"points{extension}")
+    write_table(path, headers, columns)
+
+    data = read_back(path, headers)
+    expected = np.column_stack(columns)
+    # NaN box sizes come back as empty cells / nulls, i.e. NaN again
+    np.testing.assert_allclose(data, expected, rtol=1e-12, equal_nan=True)
+
+    if extension in (".csv", ".xlsx"):
+        read_xy, read_wh = read_boxes(path)
+        np.testing.assert_allclose(read_xy, xy, rtol=1e-12)
+        np.testing.assert_allclose(read_wh, wh, rtol=1e-12, equal_nan=True)
+
+
+def test_csv_without_pyarrow(tmp_path, table, monkeypatch):
+    from labelsp_core import export
+
+    monkeypatch.setattr(export, "has_arrow", lambda: False)
+    xy, wh, headers, columns = table
+    path = str(tmp_path / "points.csv")
+    write_table(path, headers, columns)
+    np.testing.assert_allclose(read_back(path, headers), np.column_stack(columns), rtol=1e-12, equal_nan=True)
+
+
+def test_unknown_format_is_rejected(tmp_path, table):
+    xy, wh, headers, columns = table
+    with pytest.raises(ValueError):
+        write_table(str(tmp_path / "points.txt"), headers, columns)
+
+
+def test_failed_export_leaves_no_file(tmp_path, table):
+    xy, wh, headers, columns = table
+    path = tmp_path / "points.npy"
+
+    def cancel(percent, message=""):
+        if percent > 0:
+            raise KeyboardInterrupt
+
+    from labelsp_core import export
+    columns = [np.tile(column, 100) for column in columns]
+    assert len(columns[0]) > export.CHUNK_ROWS
+    with pytest.raises(KeyboardInterrupt):
+        write_table(str(path), headers, columns, progress=cancel)
+    assert not path.exists()
@@ -0,0 +1,101 @@
+import numpy as np
+
+from labelsp_core.history import History
+from labelsp_core.store import AnnotationStore
+
+
+def state(store):
+    return store.snapshot()
+
+
+def assert_state(store, expected):
+    for key, value in store.snapshot().items():
+        np.testing.assert_array_equal(value, expected[key], err_msg=key)
+
+
+def test_undo_and_redo_restore_ids():
+    store = AnnotationStore()
+    history = History(store)
+    history.add_points(np.arange(20, dtype=np.float64).reshape(10, 2))
+    history.add_points([[50.0, 50.0]], wh=[[6.0, 4.0]], label="box")
+    history.confirm_all()
+    history.add_point(60.0, 60.0)
+    states = [state(store)]
+
+    history.remove([2, 5, 10])
+    states.append(state(store))
+    history.clear()
+    states.append(state(store))
+    assert len(store) == 0
+
+    for expected in reversed(states[:-1]):
+        history.undo()
+        assert_state(store, expected)
+    for expected in states[1:]:
+        history.redo()
+        assert_state(store, expected)
+
+
+def test_undo_reaches_the_empty_store():
+    store = AnnotationStore()
+    history = History(store)
+    history.add_points(np.zeros((3, 2)))
+    history.confirm_all()
+    history.remove([1])
+    while history.can_undo():
+        history.undo()
+    assert len(store) == 0
+    while history.can_redo():
+        history.redo()
+    assert store.ids.tolist() == [0, 2]
+    assert store.confirmed.all()
+
+
+def test_new_edit_drops_redo():
+    store = AnnotationStore()
+    history = History(store)
+    history.add_point(1.0, 1.0)
+    history.undo()
+    assert history.can_redo()
+    history.add_point(2.0, 2.0)
+    assert not history.can_redo()
+    assert history.redo() is None
+    # The undone point's id is not reused
+    assert store.ids.tolist() == [1]
+
+
+def test_replace_is_one_step():
+    store = AnnotationStore()
+    history = History(store)
+    history.add_points([[1.0, 1.0], [2.0, 2.0]])
+    before = state(store)
+    ids = history.replace(np.ones((5, 2)), wh=np.full((5, 2), 3.0))
+    assert ids.tolist() == [2, 3, 4, 5, 6]
+    change = history.undo()
+    assert len(change) == 5
+    assert_state(store, before)
+    history.redo()
+    assert store.ids.tolist() == ids.tolist()
+    assert (store.wh == 3.0).all()
+
+
+def test_adopt_skips_removed_ids():
+    store = AnnotationStore()
+    history = History(store)
+    ids = store.add_many(np.zeros((4, 2)))
+    store.remove_ids(ids[:1])
+    assert history.adopt(ids, label="propose").tolist() == [1, 2, 3]
+    history.undo()
+    assert len(store) == 0
+
+
+def test_limit_drops_oldest_entries():
+    store = AnnotationStore()
+    history = History(store, limit=3)
+    for i in range(5):
+        history.add_point(float(i), float(i))
+    undone = 0
+    while history.undo() is not None:
+        undone += 1
+    assert undone == 3
+    assert store.ids.tolist() == [0, 1]
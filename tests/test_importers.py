@@ -0,0 +1,169 @@
+import csv
+
+import numpy as np
+import pytest
+
+from labelsp_core import importers
+from labelsp_core.importers import find_geo_columns, read_boxes, read_geo_boxes, read_headers, read_points
+
+MIXED_ROWS = [
+    "1.5,2.5",
+    "",
+    "3,4,extra,columns,here",
+    "text,5",
+    "6,",
+    "7",
+    "  ",
+    '"8.25","9.75"',
+    "1e3, 2E-1",
+    "10,11",
+    "x,y",
+    "12,13,,",
+    "-14.5,-15",
+]
+
+
+def per_row(path):
+    """The row loop import_from_csv used before the chunked parser"""
+    points = []
+    with open(path, 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for row in reader:
+            if len(row) >= 2:
+                try:
+                    points.append((float(row[0]), float(row[1])))
+                except ValueError:
+                    continue
+    return np.array(points, dtype=np.float64).reshape(-1, 2)
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 3, 65536])
+def test_mixed_csv_accepts_the_same_rows_as_the_row_loop(tmp_path, monkeypatch, chunk_rows):
+    # Small chunks mix clean chunks (fast path) with ones that need the fallback
+    monkeypatch.setattr(importers, "CHUNK_ROWS", chunk_rows)
+    path = tmp_path / "mixed.csv"
+    path.write_text("X,Y\n" + "\n".join(MIXED_ROWS) + "\n")
+    np.testing.assert_array_equal(read_points(str(path)), per_row(str(path)))
+
+
+def test_clean_csv_matches_the_row_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(importers, "CHUNK_ROWS", 1000)
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(-1e4, 1e4, (5000, 2))
+    path = tmp_path / "clean.csv"
+    np.savetxt(path, xy, delimiter=",", header="X,Y", comments="", fmt="%.17g")
+    np.testing.assert_array_equal(read_points(str(path)), per_row(str(path)))
+    np.testing.assert_array_equal(read_points(str(path)), xy)
+
+
+def test_ragged_rows_keep_their_columns(tmp_path):
+    path = tmp_path / "ragged.csv"
+    path.write_text("X,Y,Box Width,Box Height\n1,2,3,4\n5,6\n7,8,9,10,11\n")
+    headers, data = importers.read_csv_table(str(path))
+    assert headers == ["X", "Y", "Box Width", "Box Height"]
+    np.testing.assert_array_equal(data, [[1, 2, 3, 4], [5, 6, np.nan, np.nan], [7, 8, 9, 10]])
+    xy, wh = read_boxes(str(path))
+    np.testing.assert_array_equal(wh, [[3, 4], [np.nan, np.nan], [9, 10]])
+
+
+def test_header_only_and_empty_files(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("X,Y\n")
+    assert read_points(str(path)).shape == (0, 2)
+    path.write_text("")
+    assert read_points(str(path)).shape == (0, 2)
+
+
+def test_xlsx_skips_the_same_cells_as_the_row_loop(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in (["X", "Y"], [1, 2], [None, 3], ["4", 5], [6.5, 7.5, "note"], [8], [9, 10]):
+        ws.append(row)
+    path = str(tmp_path / "points.xlsx")
+    wb.save(path)
+    assert read_headers(path)[:2] == ["X", "Y"]
+    np.testing.assert_array_equal(read_points(path), [[1, 2], [6.5, 7.5], [9, 10]])
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        read_points(str(tmp_path / "points.txt"))
+
+
+
+def test_geo_columns():
+    assert find_geo_columns(["id", "Latitude", "Longitude"]) == (2, 1, "lonlat")
+    assert find_geo_columns(["lon", "lat"]) == (0, 1, "lonlat")
+    assert find_geo_columns(["经度", "纬度"]) == (0, 1, "lonlat")
+    assert find_geo_columns(["Easting", "Northing", "Box Width"]) == (0, 1, "projected")
+    # Pixel X/Y as written by the exporter are not coordinates
+    assert find_geo_columns(["X", "Y"]) is None
+
+
+def test_byte_order_mark_is_stripped(tmp_path):
+    path = tmp_path / "excel.csv"
+    path.write_bytes("\ufeffLongitude,Latitude\n15.1,9.2\n".encode("utf-8"))
+    assert read_headers(str(path)) == ["Longitude", "Latitude"]
+    assert find_geo_columns(read_headers(str(path))) == (0, 1, "lonlat")
+    path.write_bytes("\ufeffX,Y\n1,2\n".encode("utf-8"))
+    assert read_headers(str(path)) == ["X", "Y"]
+    headers, data = importers.read_csv_table(str(path))
+    assert headers == ["X", "Y"]
+    np.testing.assert_array_equal(data, [[1, 2]])
+
+
+RASTER_CRS = "EPSG:32633"
+
+
+@pytest.fixture
+def raster_transform():
+    pytest.importorskip("rasterio")
+    pytest.importorskip("pyproj")
+    from rasterio.transform import Affine
+
+    return Affine(10.0, 0, 500000.0, 0, -10.0, 1000000.0)
+
+
+def test_lonlat_points_map_to_pixels(tmp_path, raster_transform):
+    from labelsp_core.geo import crs_transformer, pixels_to_crs
+
+    pixels = np.array([[0.5, 0.5], [123.25, 456.75], [999.5, 10.0]])
+    lon, lat = pixels_to_crs(raster_transform, crs_transformer(RASTER_CRS, "EPSG:4326"), pixels[:, 0], pixels[:, 1])
+    path = tmp_path / "survey.csv"
+    rows = [f"{i},{a:.12f},{b:.12f}" for i, (a, b) in enumerate(zip(lat, lon))]
+    # One point far outside the raster
+    path.write_text("id,lat,lon\n" + "\n".join(rows) + "\n9,50.0,8.0\n")
+
+    columns = find_geo_columns(read_headers(str(path)))
+    assert columns == (2, 1, "lonlat")
+    xy, wh, dropped = read_geo_boxes(str(path), columns[:2], "EPSG:4326", raster_transform, RASTER_CRS,
+                                     1000, 1000)
+    np.testing.assert_allclose(xy, pixels, atol=1e-4)
+    assert np.isnan(wh).all()
+    assert dropped == 1
+
+
+def test_projected_xy_points_map_to_pixels(tmp_path, raster_transform):
+    path = tmp_path / "survey.csv"
+    path.write_text("x,y,Box Width,Box Height\n"
+                    "500005,999995,4,6\n501000,998000,,\n499000,1000500,,\ntext,5,,\n")
+    xy, wh, dropped = read_geo_boxes(str(path), (0, 1), RASTER_CRS, raster_transform, RASTER_CRS, 1000, 1000)
+    np.testing.assert_allclose(xy, [[0.5, 0.5], [100, 200]])
+    np.testing.assert_array_equal(wh, [[4, 6], [np.nan, np.nan]])
+    # One point outside the raster, one without numbers
+    assert dropped == 2
+
+
+def test_projected_points_in_another_crs(tmp_path, raster_transform):
+    from labelsp_core.geo import crs_transformer, pixels_to_crs
+
+    # The same points given in the neighbouring UTM zone
+    pixels = np.array([[10.5, 20.5], [700.0, 300.0]])
+    x, y = pixels_to_crs(raster_transform, crs_transformer(RASTER_CRS, "EPSG:32634"), pixels[:, 0], pixels[:, 1])
+    path = tmp_path / "survey.csv"
+    path.write_text("Easting,Northing\n" + "\n".join(f"{a:.6f},{b:.6f}" for a, b in zip(x, y)) + "\n")
+    xy, _, dropped = read_geo_boxes(str(path), (0, 1), "EPSG:32634", raster_transform, RASTER_CRS, 1000, 1000)
+    np.testing.assert_allclose(xy, pixels, atol=1e-3)
+    assert dropped == 0
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from labelsp_core.history import History
+from labelsp_core.journal import (MAGIC, OP_ADD, OP_ADD_BOX, POINT_BYTES, RECORD_HEADER, Journal,
+                                  read_journal)
+from labelsp_core.store import AnnotationStore
+
+
+def assert_same_points(records, store):
+    expected = store.snapshot()
+    for key in ("ids", "xy", "confirmed", "wh"):
+        np.testing.assert_array_equal(records[key], expected[key], err_msg=key)
+
+
+def random_edits(history, rng, steps):
+    store = history.store
+    for _ in range(steps):
+        action = rng.integers(8)
+        if action == 0 or not len(store):
+            wh = rng.uniform(1, 20, (3, 2)) if rng.random() < 0.3 else None
+            history.add_points(rng.uniform(0, 1000, (3, 2)), bool(rng.random() < 0.5), wh=wh)
+        elif action == 1:
+            history.add_point(*rng.uniform(0, 1000, 2))
+        elif action == 2:
+            history.remove(rng.choice(store.ids, size=min(len(store), 2), replace=False))
+        elif action == 3:
+            history.confirm_all()
+        elif action == 4:
+            history.undo()
+        elif action == 5:
+            history.redo()
+        elif action == 6:
+            history.clear()
+        else:
+            store.clear()
+            history.reset()
+
+
+def journaled(path, store, **kwargs):
+    journal = Journal(str(path), store, **kwargs)
+    journal.start()
+    return journal
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_replay_matches_store_after_random_edits(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    store = AnnotationStore()
+    history = History(store)
+    history.add_points(rng.uniform(0, 1000, (10, 2)))
+    path = tmp_path / "image.png.labelsp.journal"
+    journal = journaled(path, store)
+    random_edits(history, rng, 300)
+    journal.close()
+
+    if not len(store) and not path.exists():
+        return
+    records, next_id, _ = read_journal(str(path))
+    assert_same_points(records, store)
+    assert next_id <= store.next_id
+
+
+def test_torn_tail_stops_at_last_good_record(tmp_path):
+    store = AnnotationStore()
+    path = tmp_path / "image.png.labelsp.journal"
+    journal = journaled(path, store)
+    store.add_many(np.arange(20, dtype=np.float64).reshape(10, 2), confirmed=True)
+    store.remove_ids([2, 3])
+    journal.close()
+    good = store.snapshot()
+    data = path.read_bytes()
+
+    # A crash in the middle of appending the next record
+    store.add_many([[500.0, 500.0], [600.0, 600.0]])
+    with open(path, 'ab') as f:
+        f.write(RECORD_HEADER.pack(OP_ADD, 2, 0) + b"\x00" * 7)
+    records, _, _ = read_journal(str(path))
+    for key in good:
+        np.testing.assert_array_equal(records[key], good[key])
+
+    # A record whose payload no longer matches its checksum
+    payload = np.zeros(25, dtype=np.uint8).tobytes()
+    path.write_bytes(data + RECORD_HEADER.pack(OP_ADD, 1, 12345) + payload)
+    records, _, _ = read_journal(str(path))
+    for key in good:
+        np.testing.assert_array_equal(records[key], good[key])
+
+
+def test_not_a_journal_is_rejected(tmp_path):
+    path = tmp_path / "broken.journal"
+    path.write_bytes(b"not a journal")
+    with pytest.raises(ValueError):
+        read_journal(str(path))
+
+
+def test_compaction_keeps_the_points(tmp_path):
+    rng = np.random.default_rng(7)
+    store = AnnotationStore()
+    history = History(store)
+    path = tmp_path / "image.png.labelsp.journal"
+    # Compact after every few records
+    journal = journaled(path, store, compact_ratio=1, min_compact_bytes=0)
+    history.add_points(rng.uniform(0, 1000, (50, 2)))
+    random_edits(history, rng, 200)
+    history.add_points(rng.uniform(0, 1000, (5, 2)))
+    journal.close()
+
+    records, _, ops = read_journal(str(path))
+    assert_same_points(records, store)
+    # The file was rewritten from a snapshot instead of holding every edit
+    assert ops < 200
+
+
+def test_box_records_round_trip(tmp_path):
+    store = AnnotationStore()
+    path = tmp_path / "image.png.labelsp.journal"
+    journal = journaled(path, store)
+    store.add_many([[1.0, 2.0], [3.0, 4.0]])
+    box_ids = store.add_many([[10.0, 20.0], [30.0, 40.0]], confirmed=True, wh=[[4.0, 6.0], [8.0, 2.5]])
+    store.set_confirmed(box_ids[:1], False)
+    journal.close()
+
+    data = path.read_bytes()
+    ops = []
+    offset = len(MAGIC)
+    while offset < len(data):
+        op, count, _ = RECORD_HEADER.unpack_from(data, offset)
+        ops.append(op)
+        offset += RECORD_HEADER.size + count * POINT_BYTES[op]
+    assert ops[:2] == [OP_ADD, OP_ADD_BOX]
+
+    records, next_id, _ = read_journal(str(path))
+    assert_same_points(records, store)
+    assert next_id == 4
+    np.testing.assert_array_equal(records["wh"][2:], [[4.0, 6.0], [8.0, 2.5]])
+    assert np.isnan(records["wh"][:2]).all()
+
+
+def test_snapshot_with_boxes_round_trips(tmp_path):
+    store = AnnotationStore()
+    store.add_many([[1.0, 2.0]])
+    store.add_many([[5.0, 6.0]], wh=[[3.0, 3.0]])
+    path = tmp_path / "image.png.labelsp.journal"
+    # start() rewrites the file from a snapshot of the store
+    journaled(path, store).close()
+    records, _, ops = read_journal(str(path))
+    assert ops == 1
+    assert_same_points(records, store)
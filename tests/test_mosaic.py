@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import Affine
+
+from labelsp_core.mosaic import plan_mosaic
+from labelsp_core.tiles import TileSource
+
+CRS = "EPSG:32633"
+SIZE = 100
+
+
+def write_tif(path, transform, data):
+    with rasterio.open(path, 'w', driver='GTiff', width=data.shape[1], height=data.shape[0], count=1,
+                       dtype='uint8', crs=CRS, transform=transform) as ds:
+        ds.write(data, 1)
+
+
+def gradient():
+    rows, columns = np.mgrid[0:SIZE, 0:SIZE]
+    return ((rows * 2 + columns) % 256).astype(np.uint8)
+
+
+def test_south_up_tile_is_warped_onto_its_rect(tmp_path):
+    north = str(tmp_path / "north.tif")
+    south = str(tmp_path / "south.tif")
+    write_tif(north, Affine(1, 0, 500000, 0, -1, 1000100), np.zeros((SIZE, SIZE), np.uint8))
+    # Row 0 of a south-up raster is its southern edge, at y = 1000000
+    data = gradient()
+    write_tif(south, Affine(1, 0, 500100, 0, 1, 1000000), data)
+
+    mosaic = plan_mosaic([north, south])
+    assert (mosaic.width, mosaic.height) == (2 * SIZE, SIZE)
+    raster = mosaic.rasters[1]
+    assert raster.warp
+    assert raster.rect == pytest.approx((SIZE, 0, SIZE, SIZE))
+
+    source = TileSource(south, crs=mosaic.crs)
+    try:
+        assert (source.width, source.height) == (SIZE, SIZE)
+        tile = source.read_tile(0, 0, 0)
+    finally:
+        source.close()
+    np.testing.assert_array_equal(tile[..., 0], data[::-1])
+
+
+def test_north_up_tile_is_read_directly(tmp_path):
+    path = str(tmp_path / "north.tif")
+    data = gradient()
+    write_tif(path, Affine(1, 0, 500000, 0, -1, 1000100), data)
+
+    mosaic = plan_mosaic([path])
+    assert not mosaic.rasters[0].warp
+    assert mosaic.rasters[0].rect == pytest.approx((0, 0, SIZE, SIZE))
+    source = TileSource(path, crs=mosaic.crs)
+    try:
+        np.testing.assert_array_equal(source.read_tile(0, 0, 0)[..., 0], data)
+    finally:
+        source.close()
@@ -0,0 +1,133 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from labelsp_core.imageinfo import ImageInfo
+from labelsp_core.project import Project
+
+
+def geo_info(path, west, north, size=100, resolution=0.01):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import Affine
+
+    return ImageInfo(path, size, size, Affine(resolution, 0, west, 0, -resolution, north),
+                     rasterio.crs.CRS.from_epsg(4326))
+
+
+@pytest.fixture
+def project(tmp_path):
+    with Project(str(tmp_path / "data.lsproj")) as project:
+        yield project
+
+
+def test_points_and_boxes_round_trip(tmp_path, project):
+    image = str(tmp_path / "images" / "a.png")
+    project.add_image(ImageInfo(image, 640, 480))
+    xy = np.array([[1.5, 2.5], [3.0, 4.0], [5.0, 6.0]])
+    confirmed = np.array([True, False, True])
+    wh = np.array([[np.nan, np.nan], [10.0, 12.0], [np.nan, np.nan]])
+    assert project.save_points(image, xy, confirmed, wh) == 3
+
+    loaded_xy, loaded_confirmed, loaded_wh = project.load_points(image)
+    np.testing.assert_array_equal(loaded_xy, xy)
+    np.testing.assert_array_equal(loaded_confirmed, confirmed)
+    np.testing.assert_array_equal(loaded_wh, wh)
+
+    # Saving again replaces the points instead of appending
+    project.save_points(image, xy[:1])
+    assert len(project.load_points(image)[0]) == 1
+    np.testing.assert_array_equal(project.points_in_rect(image, 0, 0, 2, 3), xy[:1])
+
+
+def test_paths_are_relative_to_the_project(tmp_path, project):
+    image = str(tmp_path / "images" / "a.png")
+    project.add_image(ImageInfo(image, 10, 10))
+    key, = project.db.execute("SELECT path FROM images").fetchone()
+    assert key == "images/a.png"
+    assert project.image_paths() == [image]
+    info = project.image_info(image)
+    assert (info.width, info.height, info.transform, info.crs) == (10, 10, None, None)
+
+
+def test_unknown_image_is_rejected(tmp_path, project):
+    with pytest.raises(KeyError):
+        project.save_points(str(tmp_path / "missing.png"), [[1.0, 2.0]])
+
+
+def test_old_project_gains_box_columns(tmp_path):
+    path = str(tmp_path / "old.lsproj")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE images (
+            id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, width INTEGER NOT NULL,
+            height INTEGER NOT NULL, crs TEXT, transform TEXT,
+            west REAL, south REAL, east REAL, north REAL,
+            point_count INTEGER NOT NULL DEFAULT 0, updated REAL);
+        CREATE TABLE points (
+            image_id INTEGER NOT NULL REFERENCES images(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL, x REAL NOT NULL, y REAL NOT NULL,
+            confirmed INTEGER NOT NULL DEFAULT 1, lon REAL, lat REAL,
+            PRIMARY KEY (image_id, seq)) WITHOUT ROWID;
+        INSERT INTO images (id, path, width, height, point_count) VALUES (1, 'a.png', 10, 10, 2);
+        INSERT INTO points (image_id, seq, x, y, confirmed) VALUES (1, 0, 1, 2, 1), (1, 1, 3, 4, 0);
+    """)
+    db.commit()
+    db.close()
+
+    with Project(path) as project:
+        image = str(tmp_path / "a.png")
+        xy, confirmed, wh = project.load_points(image)
+        np.testing.assert_array_equal(xy, [[1, 2], [3, 4]])
+        np.testing.assert_array_equal(confirmed, [True, False])
+        assert np.isnan(wh).all()
+        project.save_points(image, [[5.0, 6.0]], wh=[[2.0, 3.0]])
+        np.testing.assert_array_equal(project.load_points(image)[2], [[2.0, 3.0]])
+
+    # Opening a migrated project again leaves it alone
+    with Project(path) as project:
+        np.testing.assert_array_equal(project.load_points(str(tmp_path / "a.png"))[2], [[2.0, 3.0]])
+
+
+def test_stats_and_unlabelled_images(tmp_path, project):
+    paths = [str(tmp_path / name) for name in ("a.png", "b.png", "c.png")]
+    project.add_images([ImageInfo(path, 100, 100) for path in paths])
+    assert project.unlabelled_images() == paths
+
+    project.save_points(paths[0], np.zeros((4, 2)), [True, True, False, True])
+    project.save_points(paths[2], np.ones((2, 2)))
+    assert project.point_counts() == [(paths[0], 4), (paths[1], 0), (paths[2], 2)]
+    assert project.unlabelled_images() == [paths[1]]
+    assert project.stats() == {"images": 3, "labelled_images": 2, "points": 6, "confirmed_points": 5}
+
+    # Emptying an image makes it unlabelled again
+    project.save_points(paths[2], np.empty((0, 2)))
+    assert project.unlabelled_images() == paths[1:]
+    assert project.stats()["points"] == 4
+
+
+def test_region_queries(tmp_path, project):
+    # Two 1 x 1 degree images side by side and one far away
+    west = geo_info(str(tmp_path / "west.tif"), 10.0, 51.0)
+    east = geo_info(str(tmp_path / "east.tif"), 11.0, 51.0)
+    far = geo_info(str(tmp_path / "far.tif"), 100.0, 1.0)
+    plain = ImageInfo(str(tmp_path / "plain.png"), 100, 100)
+    project.add_images([west, east, far, plain])
+
+    # Pixel (50, 50) is the centre of an image, (10, 90) its south-west part
+    for info in (west, east, far, plain):
+        project.save_points(info.path, [[50.0, 50.0], [10.0, 90.0]])
+
+    assert project.images_in_region(10.2, 50.2, 10.8, 50.8) == [west.path]
+    assert project.images_in_region(10.5, 50.0, 11.5, 51.0) == [east.path, west.path]
+
+    paths, xy, (lon, lat) = project.points_in_region(10.4, 50.0, 11.6, 50.6)
+    order = np.lexsort((lon, paths.astype(str)))
+    assert list(paths[order]) == [east.path, east.path, west.path]
+    np.testing.assert_allclose(lon[order], [11.1, 11.5, 10.5])
+    np.testing.assert_allclose(lat[order], [50.1, 50.5, 50.5])
+    np.testing.assert_array_equal(xy[order], [[10, 90], [50, 50], [50, 50]])
+
+    paths, xy, _ = project.points_in_region(-180, -90, 180, 90)
+    assert len(paths) == 6
+    assert plain.path not in set(paths)
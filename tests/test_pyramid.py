@@ -0,0 +1,142 @@
+import os
+
+import numpy as np
+import pytest
+
+from labelsp_core.pyramid import PyramidCache, base_level, build_pyramid, downsample, file_key
+
+TILE = 128
+
+
+def test_key_follows_the_file_content(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(b"a" * 5000)
+    key = file_key(str(path))
+    assert file_key(str(path)) == key
+
+    # Same size and mtime, different bytes
+    stat = os.stat(path)
+    path.write_bytes(b"b" * 5000)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert file_key(str(path)) != key
+
+    changed = file_key(str(path))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert file_key(str(path)) != changed
+
+
+def test_downsample_averages_blocks():
+    pixels = np.arange(5 * 3, dtype=np.uint8).reshape(5, 3, 1) * 10
+    out = downsample(pixels)
+    assert out.shape == (3, 2, 1)
+    # Odd edges are repeated before averaging
+    assert out[0, 0, 0] == round((0 + 10 + 30 + 40) / 4)
+    assert out[0, 1, 0] == round((20 + 20 + 50 + 50) / 4)
+    assert out[2, 1, 0] == 140
+
+
+def store_entry(cache, key, size=64):
+    pixels = np.zeros((size, size, 1), dtype=np.uint8)
+    assert build_pyramid(cache, key, pixels, 0, size, size, tile_size=size)
+
+
+def set_used(cache, key, seconds):
+    os.utime(os.path.join(cache.root, key, "pyramid.json"), (seconds, seconds))
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = PyramidCache(str(tmp_path / "cache"))
+    for key in ("a", "b"):
+        store_entry(cache, key)
+    entry = sum(e.stat().st_size for e in os.scandir(os.path.join(cache.root, "a")))
+    set_used(cache, "a", 1000)
+    set_used(cache, "b", 2000)
+    # Looking an entry up makes it the most recently used
+    assert cache.get("a") is not None
+
+    cache.max_bytes = 2 * entry + entry // 2
+    store_entry(cache, "c")
+    assert sorted(os.listdir(cache.root)) == ["a", "c"]
+
+    # The entry just stored is kept even when it alone is over the cap
+    cache.max_bytes = 1
+    store_entry(cache, "d")
+    assert os.listdir(cache.root) == ["d"]
+
+
+def test_cancelled_store_leaves_nothing(tmp_path):
+    cache = PyramidCache(str(tmp_path / "cache"))
+    pixels = np.zeros((64, 64, 1), dtype=np.uint8)
+    assert not build_pyramid(cache, "a", pixels, 0, 64, 64, tile_size=64, cancelled=lambda: True)
+    assert os.listdir(cache.root) == []
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def raster(tmp_path):
+    rasterio = pytest.importorskip("rasterio")
+    from rasterio.transform import Affine
+
+    path = str(tmp_path / "image.tif")
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, (3, 700, 900), dtype=np.uint8)
+    with rasterio.open(path, 'w', driver='GTiff', width=900, height=700, count=3, dtype='uint8',
+                       crs="EPSG:32633", transform=Affine(1, 0, 0, 0, -1, 700)) as ds:
+        ds.write(data)
+    return path
+
+
+def cache_raster(cache, path, max_pixels):
+    from labelsp_core.tiles import TileSource, read_level
+
+    source = TileSource(path, tile_size=TILE)
+    try:
+        first = base_level(source.width, source.height, TILE, max_pixels)
+        key = file_key(path)
+        build_pyramid(cache, key, read_level(source, first), first, source.width, source.height, TILE,
+                      display=source.display_key(), stretch=source.stretch_values())
+    finally:
+        source.close()
+    return cache.get(key)
+
+
+def test_cached_tiles_match_the_file(tmp_path, raster):
+    from labelsp_core.tiles import TileSource
+
+    pyramid = cache_raster(PyramidCache(str(tmp_path / "cache")), raster, max_pixels=500 * 500)
+    assert pyramid.first_level == 1
+    assert not pyramid.has_level(0) and pyramid.has_level(pyramid.max_level)
+
+    plain = TileSource(raster, tile_size=TILE)
+    cached = TileSource(raster, tile_size=TILE, pyramid=pyramid)
+    try:
+        assert pyramid.matches(cached.display_key())
+        for _, tx, ty in plain.tiles_in_rect(1, 0, 0, plain.width, plain.height):
+            np.testing.assert_array_equal(cached.read_tile(1, tx, ty), plain.read_tile(1, tx, ty))
+        # Coarser levels are averages, but of the same shape as the file's
+        for level in range(2, plain.max_level + 1):
+            assert cached.read_tile(level, 0, 0).shape == plain.read_tile(level, 0, 0).shape
+    finally:
+        plain.close()
+        cached.close()
+
+
+def test_other_display_reads_the_file(tmp_path, raster):
+    from labelsp_core.tiles import TileSource
+
+    pyramid = cache_raster(PyramidCache(str(tmp_path / "cache")), raster, max_pixels=500 * 500)
+    # Poison the cached level, so any read served from it shows
+    level = np.load(os.path.join(pyramid.directory, "level1.npy"), mmap_mode='r+')
+    level[:] = 0
+    level.flush()
+    del level
+
+    source = TileSource(raster, tile_size=TILE, pyramid=pyramid)
+    try:
+        assert not source.read_tile(1, 0, 0).any()
+        source.set_display([2])
+        assert not pyramid.matches(source.display_key())
+        tile = source.read_tile(1, 0, 0)
+        assert tile.shape[2] == 1 and tile.any()
+    finally:
+        source.close()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from labelsp_core.spatial import PointGrid
+
+
+def brute_force(xy, x0, y0, x1, y1):
+    x0, x1 = sorted((x0, x1))
+    y0, y1 = sorted((y0, y1))
+    return np.flatnonzero((xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_queries_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # Some points off the image, where cells are clamped
+    xy = rng.uniform(-200, 5000, (20000, 2))
+    xy[:50] = np.round(xy[:50] / 64) * 64
+    grid = PointGrid(max_pending=100)
+    for _ in range(200):
+        x0, y0 = rng.uniform(-300, 5000, 2)
+        w, h = rng.exponential(300, 2)
+        if rng.random() < 0.2:
+            w, h = -w, -h
+        np.testing.assert_array_equal(grid.query(xy, x0, y0, x0 + w, y0 + h),
+                                      brute_force(xy, x0, y0, x0 + w, y0 + h))
+
+
+def test_points_on_cell_edges_are_found():
+    xy = np.array([[64.0, 64.0], [128.0, 0.0], [63.999, 64.0]])
+    grid = PointGrid(cell_size=64)
+    assert grid.query(xy, 64, 64, 128, 128).tolist() == [0]
+    assert grid.query(xy, 0, 0, 128, 64).tolist() == [0, 1, 2]
+
+
+def test_appended_and_removed_points():
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(0, 1000, (1000, 2))
+    grid = PointGrid(max_pending=50)
+    grid.query(xy, 0, 0, 1, 1)
+
+    # Appended rows are scanned until there are too many of them
+    for extra in (10, 100):
+        xy = np.concatenate([xy, rng.uniform(0, 1000, (extra, 2))])
+        np.testing.assert_array_equal(grid.query(xy, 100, 100, 600, 400), brute_force(xy, 100, 100, 600, 400))
+    assert grid.indexed == len(xy)
+
+    xy = xy[::2]
+    grid.invalidate()
+    np.testing.assert_array_equal(grid.query(xy, 100, 100, 600, 400), brute_force(xy, 100, 100, 600, 400))
+
+
+def test_empty_and_tall_queries():
+    grid = PointGrid()
+    assert len(grid.query(np.empty((0, 2)), 0, 0, 10, 10)) == 0
+    xy = np.column_stack([np.zeros(100), np.arange(100) * 1000.0])
+    np.testing.assert_array_equal(grid.query(xy, -1, 0, 1, 1e6), np.arange(100))
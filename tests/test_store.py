@@ -0,0 +1,87 @@
+import numpy as np
+
+from labelsp_core.store import AnnotationStore
+
+
+def test_ids_are_stable_across_edits():
+    store = AnnotationStore(capacity=4)
+    ids = store.add_many(np.arange(20, dtype=np.float64).reshape(10, 2))
+    np.testing.assert_array_equal(ids, np.arange(10))
+    xy = dict(zip(ids.tolist(), store.xy.tolist()))
+
+    store.remove_ids([0, 3, 9, 42])
+    assert store.ids.tolist() == [1, 2, 4, 5, 6, 7, 8]
+    # Removed ids are never handed out again
+    assert store.add(100.0, 100.0) == 10
+    store.set_confirmed([2, 4])
+    for i, point in zip(store.ids.tolist(), store.xy.tolist()):
+        assert point == xy.get(i, [100.0, 100.0])
+    np.testing.assert_array_equal(store.confirmed, [False, True, True, False, False, False, False, False])
+    np.testing.assert_array_equal(store.rows_of([4, 10, 3, 2]), [1, 2, 7])
+
+
+def test_readding_old_ids_keeps_rows_sorted():
+    store = AnnotationStore()
+    store.add_many(np.arange(12, dtype=np.float64).reshape(6, 2), wh=np.full((6, 2), 2.0))
+    removed = store.remove_ids([1, 4])
+    store.add_many(removed["xy"], removed["confirmed"], removed["ids"], removed["wh"])
+    assert store.ids.tolist() == list(range(6))
+    np.testing.assert_array_equal(store.xy, np.arange(12).reshape(6, 2))
+    assert (store.wh == 2.0).all()
+    assert store.next_id == 6
+
+
+def test_confirm_all_and_remove_last():
+    store = AnnotationStore()
+    store.add_many([[0.0, 0.0], [1.0, 1.0]], confirmed=True)
+    store.add_many([[2.0, 2.0], [3.0, 3.0]])
+    assert store.remove_last()["ids"].tolist() == [3]
+    assert store.confirm_all()["ids"].tolist() == [2]
+    assert store.confirmed.all()
+    # With nothing temporary left, the newest point goes
+    assert store.remove_last()["ids"].tolist() == [2]
+    assert store.ordered_xy().tolist() == [[0.0, 0.0], [1.0, 1.0]]
+
+
+def test_ordered_rows_put_confirmed_first():
+    store = AnnotationStore()
+    store.add_many([[0.0, 0.0]])
+    store.add_many([[1.0, 1.0]], confirmed=True)
+    store.add_many([[2.0, 2.0]])
+    assert store.ordered_rows().tolist() == [1, 0, 2]
+
+
+def test_clear_keeps_the_id_counter():
+    store = AnnotationStore()
+    store.add_many(np.zeros((3, 2)), wh=np.full((3, 2), 8.0))
+    assert store.max_half == 4.0
+    store.clear()
+    assert len(store) == 0 and store.max_half == 0.0
+    assert store.add(1.0, 1.0) == 3
+
+
+def test_listeners_see_every_change():
+    store = AnnotationStore()
+    events = []
+    store.listeners.append(lambda event, records: events.append(
+        (event, None if records is None else records["ids"].tolist())))
+    store.add_many(np.zeros((3, 2)))
+    store.remove_ids([1])
+    store.set_confirmed([0])
+    store.select_rows(np.array([1]))
+    store.clear()
+    assert events == [("add", [0, 1, 2]), ("remove", [1]), ("confirm", [0]), ("select", [2]), ("clear", None)]
+
+
+def test_selection_follows_queries_and_removals():
+    store = AnnotationStore()
+    store.add_many([[10.0, 10.0], [20.0, 20.0], [300.0, 300.0]])
+    changed = store.select_rect(0, 0, 50, 50)
+    assert changed.tolist() == [0, 1]
+    assert store.selected_ids().tolist() == [0, 1]
+    store.remove_ids([0])
+    assert store.selected_ids().tolist() == [1]
+    assert store.select_rect(250, 250, 350, 350).tolist() == [0, 1]
+    assert store.selected_ids().tolist() == [2]
+    store.clear_selection()
+    assert not store.selected.any()
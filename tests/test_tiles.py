@@ -0,0 +1,67 @@
+import numpy as np
+
+from labelsp_core.tiles import Stretch, TileGrid, to_display
+
+
+def reference(values, low, high, nodata=None):
+    scaled = np.clip((values.astype(np.float64) - low) * 255 / (high - low) + 0.5, 0, 255)
+    scaled = np.nan_to_num(scaled, nan=0.0).astype(np.uint8)
+    if nodata is not None:
+        scaled[values == nodata] = 0
+    return scaled
+
+
+def test_int16_with_negative_values():
+    values = np.arange(-32768, 32768, 7, dtype=np.int16)
+    stretch = Stretch([-1000.0], [3000.0], 'int16')
+    assert stretch.luts is not None
+    out = stretch.apply(values.reshape(1, 1, -1))
+    np.testing.assert_array_equal(out[0, :, 0], reference(values, -1000, 3000))
+    assert out[0, values.tolist().index(-32768), 0] == 0
+
+
+def test_uint16_with_nodata():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 65536, (2, 50, 60)).astype(np.uint16)
+    values[:, ::7, ::3] = 500
+    stretch = Stretch([100.0, 200.0], [40000.0, 60000.0], 'uint16', nodata=500)
+    out = stretch.apply(values)
+    assert out.shape == (50, 60, 2)
+    for band, (low, high) in enumerate(((100, 40000), (200, 60000))):
+        np.testing.assert_array_equal(out[..., band], reference(values[band], low, high, nodata=500))
+    assert not out[::7, ::3].any()
+
+
+def test_float32_with_nan_and_nodata():
+    rng = np.random.default_rng(1)
+    values = rng.normal(0, 10, (1, 40, 40)).astype(np.float32)
+    values[0, ::5, ::5] = np.nan
+    values[0, 1, :] = -9999.0
+    stretch = Stretch([-15.0], [25.0], 'float32', nodata=-9999.0)
+    assert stretch.luts is None
+    out = stretch.apply(values)
+    expected = reference(values[0], -15.0, 25.0, nodata=-9999.0)
+    # float32 arithmetic may round a value right at a step the other way
+    assert np.abs(out[..., 0].astype(int) - expected).max() <= 1
+    assert not out[::5, ::5].any() and not out[1].any()
+
+
+def test_flat_range_does_not_divide_by_zero():
+    stretch = Stretch([5.0], [5.0], 'float32')
+    out = stretch.apply(np.array([[[4.0, 5.0, 6.0]]], dtype=np.float32))
+    assert out[0, :, 0].tolist() == [0, 0, 255]
+
+
+def test_to_display_without_stretch_clips():
+    data = np.array([[[-5, 100, 300]]], dtype=np.int16)
+    assert to_display(data).tolist() == [[[0], [100], [255]]]
+
+
+def test_tile_grid_levels_and_rects():
+    grid = TileGrid(1000, 600, 256)
+    assert grid.max_level == 2
+    assert grid.level_shape(1) == (300, 500)
+    assert grid.level_for_scale(1.0) == 0 and grid.level_for_scale(0.3) == 1 and grid.level_for_scale(0.01) == 2
+    assert grid.tile_rect(0, 3, 2) == (768, 512, 232, 88)
+    assert grid.tiles_in_rect(1, 600, 0, 2000, 10) == [(1, 1, 0)]
+    assert grid.tiles_in_rect(0, 2000, 0, 3000, 10) == []
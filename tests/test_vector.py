@@ -0,0 +1,120 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+pytest.importorskip("rasterio")
+pytest.importorskip("pyproj")
+from rasterio.transform import Affine
+
+from labelsp_core.export import annotation_table
+from labelsp_core.vector import GPKG_POINT, write_vector
+
+CRS = "EPSG:32633"
+TRANSFORM = Affine(0.5, 0, 500000.0, 0, -0.5, 1000000.0)
+
+
+@pytest.fixture
+def table():
+    xy = np.array([[0.0, 0.0], [10.0, 20.0], [100.0, 50.0]])
+    # The second point is a box, the others have no size
+    wh = np.array([[np.nan, np.nan], [4.0, 6.0], [np.nan, np.nan]])
+    headers, columns = annotation_table(xy, 200, 100, wh=wh)
+    return xy, wh, headers, columns
+
+
+def test_gpkg(tmp_path, table):
+    xy, wh, headers, columns = table
+    path = str(tmp_path / 'a"b.gpkg')
+    assert write_vector(path, headers, columns, TRANSFORM, CRS) == 3
+
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("PRAGMA application_id").fetchone()[0] == 1196444487
+        table_name, srs_id, *bounds = db.execute(
+            "SELECT table_name, srs_id, min_x, min_y, max_x, max_y FROM gpkg_contents").fetchone()
+        assert (table_name, srs_id) == ('a"b', 32633)
+        assert bounds == pytest.approx([500000.0, 999975.0, 500050.0, 1000000.0])
+        assert db.execute("SELECT srs_id FROM gpkg_geometry_columns").fetchone()[0] == 32633
+        assert db.execute("SELECT organization FROM gpkg_spatial_ref_sys WHERE srs_id = 32633").fetchone()[0] == "EPSG"
+
+        rows = db.execute('SELECT geom, "X", "Y", "Box Width", "Box Height" FROM "a""b" ORDER BY fid').fetchall()
+    finally:
+        db.close()
+    assert len(rows) == 3
+    points = np.frombuffer(b"".join(row[0] for row in rows), dtype=GPKG_POINT)
+    assert (points["magic"] == b"GP").all()
+    assert (points["srs_id"] == 32633).all()
+    assert (points["type"] == 1).all()
+    np.testing.assert_allclose(points["x"], 500000.0 + xy[:, 0] * 0.5)
+    np.testing.assert_allclose(points["y"], 1000000.0 - xy[:, 1] * 0.5)
+    np.testing.assert_array_equal([row[1:3] for row in rows], xy)
+    assert [row[3:] for row in rows] == [(None, None), (4.0, 6.0), (None, None)]
+
+
+def test_gpkg_quotes_headers(tmp_path):
+    headers = ["X", "Y", 'say "hi"']
+    columns = [np.array([1.0]), np.array([2.0]), np.array([3.0])]
+    path = str(tmp_path / "points.gpkg")
+    assert write_vector(path, headers, columns, TRANSFORM, CRS) == 1
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute('SELECT "say ""hi""" FROM points').fetchone()[0] == 3.0
+    finally:
+        db.close()
+
+
+def test_geojson_in_another_crs(tmp_path, table):
+    xy, wh, headers, columns = table
+    path = str(tmp_path / "points.geojson")
+    assert write_vector(path, headers, columns, TRANSFORM, CRS, "EPSG:4326") == 3
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["type"] == "FeatureCollection"
+    # WGS84 output carries no crs member
+    assert "crs" not in data
+    features = data["features"]
+    assert len(features) == 3
+    lon, lat = np.array([feature["geometry"]["coordinates"] for feature in features]).T
+    # UTM 33N is centred on 15 degrees east
+    assert ((lon > 14) & (lon < 16)).all() and ((lat > 8) & (lat < 10)).all()
+    properties = [feature["properties"] for feature in features]
+    assert [p["Box Width"] for p in properties] == [None, 4.0, None]
+    assert [p["Box Height"] for p in properties] == [None, 6.0, None]
+    assert properties[1]["X"] == 10.0 and properties[1]["Normalized Y"] == 0.2
+
+
+def test_geojson_in_a_projected_crs(tmp_path, table):
+    xy, wh, headers, columns = table
+    path = str(tmp_path / "points.geojson")
+    write_vector(path, headers, columns, TRANSFORM, CRS)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["crs"]["properties"]["name"] == "urn:ogc:def:crs:EPSG::32633"
+    coordinates = np.array([feature["geometry"]["coordinates"] for feature in data["features"]])
+    np.testing.assert_allclose(coordinates, [[500000, 1000000], [500005, 999990], [500050, 999975]])
+
+
+def test_empty_export_is_valid(tmp_path):
+    headers = ["X", "Y"]
+    columns = [np.empty(0), np.empty(0)]
+    path = str(tmp_path / "points.geojson")
+    assert write_vector(path, headers, columns, TRANSFORM, CRS) == 0
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["features"] == []
+    path = str(tmp_path / "points.gpkg")
+    assert write_vector(path, headers, columns, TRANSFORM, CRS) == 0
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute("SELECT min_x FROM gpkg_contents").fetchone()[0] is None
+    finally:
+        db.close()
+
+
+def test_rejects_unknown_format_and_ungeoreferenced_images(tmp_path, table):
+    xy, wh, headers, columns = table
+    with pytest.raises(ValueError):
+        write_vector(str(tmp_path / "points.shp"), headers, columns, TRANSFORM, CRS)
+    with pytest.raises(ValueError):
+        write_vector(str(tmp_path / "points.gpkg"), headers, columns, None, None)